@@ -1,8 +1,28 @@
 import json
 import os
+import logging
 from enum import Enum
 from qfluentwidgets import QConfig, OptionsConfigItem, OptionsValidator
 
+# 转换结果缓存大小上限的可选值（MB）及显示文本
+CACHE_SIZE_OPTIONS = {
+    0: "不缓存",
+    512: "512 MB",
+    1024: "1 GB",
+    2048: "2 GB",
+    4096: "4 GB",
+    8192: "8 GB",
+}
+
+# 日志级别的可选值及显示文本
+LOG_LEVEL_OPTIONS = {
+    "DEBUG": "调试",
+    "INFO": "信息",
+    "WARNING": "警告",
+    "ERROR": "错误",
+    "CRITICAL": "严重错误",
+}
+
 class ThemeMode(Enum):
     LIGHT = "浅色主题"
     DARK = "深色主题"
@@ -33,6 +53,20 @@ class Config(QConfig):
             False,
             OptionsValidator([True, False])
         )
+        
+        # 日志级别
+        self.log_level = OptionsConfigItem(
+            "Log", "Level",
+            "WARNING",
+            OptionsValidator(list(LOG_LEVEL_OPTIONS))
+        )
+        
+        # 转换结果缓存的大小上限（MB），0 表示不缓存
+        self.cache_size = OptionsConfigItem(
+            "Cache", "MaxSizeMB",
+            2048,
+            OptionsValidator(list(CACHE_SIZE_OPTIONS))
+        )
 
     def _ensure_config_exists(self):
         """确保配置文件存在"""
@@ -63,5 +97,24 @@ class Config(QConfig):
         self.autostart.value = enabled
         self.save()
 
+    def get_log_level(self):
+        """获取日志级别"""
+        return self.log_level.value
+
+    def set_log_level(self, level: str):
+        """设置日志级别，立即生效并保存"""
+        self.log_level.value = level
+        logging.getLogger().setLevel(level)
+        self.save()
+
+    def get_cache_size(self):
+        """获取转换结果缓存的大小上限（MB），0 表示不缓存"""
+        return self.cache_size.value
+
+    def set_cache_size(self, size_mb: int):
+        """设置转换结果缓存的大小上限，下次启动时生效"""
+        self.cache_size.value = size_mb
+        self.save()
+
 # 创建全局配置管理器实例
 config_manager = Config() 
\ No newline at end of file
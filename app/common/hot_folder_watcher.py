@@ -0,0 +1,78 @@
+from typing import Iterable
+
+from PySide6.QtCore import QObject, QThread, QTimer, QFileSystemWatcher, Signal, Slot
+
+from ..core.hot_folder import HotFolder, DEFAULT_SETTLE_SECONDS
+
+
+class _HotFolderWorker(QObject):
+    """ 在后台线程中列出目录、检查文件是否写入完成，HotFolder 只在该线程中访问 """
+
+    filesReady = Signal(list)
+
+    def __init__(self, hot_folder: HotFolder, interval_ms: int, batch_limit: int):
+        super().__init__()
+        self.hot_folder = hot_folder
+        self.interval_ms = interval_ms
+        self.batch_limit = batch_limit
+        self._watcher = None
+        self._timer = None
+
+    @Slot()
+    def start(self):
+        # 在工作线程中创建，目录变化的通知和定时器都由该线程的事件循环处理
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.hot_folder.mark_dirty)
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.interval_ms)
+        self._timer.timeout.connect(self.tick)
+        self.tick()
+        self._timer.start()
+
+    @Slot()
+    def tick(self):
+        """列出有变化的目录，发出已稳定的文件，并监视新发现的子目录"""
+        ready = self.hot_folder.tick(self.batch_limit)
+        new_directories = self.hot_folder.new_directories()
+        if new_directories:
+            self._watcher.addPaths(new_directories)
+        if ready:
+            self.filesReady.emit(ready)
+
+
+class HotFolderWatcher(QObject):
+    """ 用 QFileSystemWatcher 监视文件夹，按固定间隔批量发出已写入完成的新文件
+
+    目录变化的通知只把目录标记为有变化，定时器每个间隔才重新列出这些目录，
+    大量文件同时放入时的成千上万次通知合并为少数几次列出；每批最多发出 batch_limit 个文件，
+    其余留到下一个间隔，避免一次创建过多任务卡片阻塞界面。
+    列出目录和检查文件大小都在后台线程中进行，界面线程只接收 filesReady。
+    """
+
+    filesReady = Signal(list)  # [(源文件, 相对路径)]
+
+    def __init__(self, folder: str, target_format: str, exclude: Iterable[str] = (),
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS, interval_ms: int = 1000,
+                 batch_limit: int = 200, parent=None):
+        super().__init__(parent)
+        hot_folder = HotFolder(folder, [target_format], exclude, settle_seconds)
+        self._folder = hot_folder.root
+        self._thread = QThread(self)
+        self._worker = _HotFolderWorker(hot_folder, interval_ms, batch_limit)
+        self._worker.moveToThread(self._thread)
+        self._worker.filesReady.connect(self.filesReady)
+        self._thread.started.connect(self._worker.start)
+        self._thread.finished.connect(self._worker.deleteLater)
+
+    @property
+    def folder(self) -> str:
+        return self._folder
+
+    def start(self):
+        """开始监视，文件夹中已有的文件也会在稳定后发出"""
+        self._thread.start()
+
+    def stop(self):
+        """停止监视，等待正在进行的一次检查结束，定时器和目录监视随线程的事件循环一起停止"""
+        self._thread.quit()
+        self._thread.wait()
@@ -0,0 +1,45 @@
+import threading
+from typing import Dict
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+class ProgressHub(QObject):
+    """ 汇总所有工作线程的进度，按固定间隔向界面发送一次批量更新
+
+    工作线程只在锁内写入每个任务的最新进度，不发送信号，也不会因界面繁忙而阻塞；
+    界面线程的定时器每个间隔取走一次，同一任务在间隔内的多次更新只保留最后一次。
+    """
+
+    progressBatch = Signal(object)  # dict: 任务ID -> 最新进度
+
+    def __init__(self, interval_ms: int = 33, parent=None):
+        super().__init__(parent)
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def watch(self, job):
+        """订阅任务的进度"""
+        job.add_progress_listener(self.report)
+
+    def report(self, job, value: int):
+        """记录任务的最新进度，可在任意线程调用"""
+        with self._lock:
+            self._pending[job.job_id] = value
+
+    def flush(self):
+        """发送间隔内累积的进度，在界面线程中调用"""
+        with self._lock:
+            if not self._pending:
+                return
+            batch = self._pending
+            self._pending = {}
+        self.progressBatch.emit(batch)
+
+    def stop(self):
+        self._timer.stop()
+        self.flush()
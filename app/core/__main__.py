@@ -0,0 +1,11 @@
+"""
+命令行入口：python -m app.core
+"""
+import sys
+import multiprocessing
+
+from app.core.cli import main
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
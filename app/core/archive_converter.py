@@ -0,0 +1,327 @@
+"""
+压缩文件转换模块
+
+逐个读取源压缩文件（zip、tar、tar.gz）中的成员，以固定大小的缓冲区直接写入目标压缩文件，
+不解压到临时目录，磁盘上只多出目标文件本身。成员的修改时间和权限随之保留。
+
+解压后的总大小、压缩比和成员数量都有上限，防止解压炸弹耗尽磁盘和时间。
+"""
+import os
+import copy
+import stat
+import time
+import logging
+import tarfile
+import zipfile
+from typing import Callable, Iterator, Optional, Tuple, IO
+
+logger = logging.getLogger(__name__)
+
+# 复制成员内容时的缓冲区大小
+COPY_BUFFER = 1024 * 1024
+
+# 默认上限：解压后的总大小、解压后与压缩后大小之比、成员数量
+DEFAULT_MAX_TOTAL_MB = 10 * 1024
+DEFAULT_MAX_RATIO = 200
+DEFAULT_MAX_ENTRIES = 100000
+
+# 解压后不足该大小时不检查压缩比，避免小文件（例如全是空格的文本）误判
+RATIO_FLOOR = 16 * 1024 * 1024
+
+# ZIP 只能记录 1980 年及以后的时间
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# 没有权限信息（例如在 Windows 上创建的 zip）时使用的权限
+DEFAULT_FILE_MODE = 0o644
+DEFAULT_DIR_MODE = 0o755
+
+
+class ArchiveLimitError(ValueError):
+    """源压缩文件超过解压上限"""
+
+
+class ArchiveLimits:
+    """ 解压上限，按实际复制的字节数计算，不信任压缩文件头中声明的大小
+
+    options 中的 archive_max_mb、archive_max_ratio、archive_max_entries 覆盖默认值。
+    """
+
+    def __init__(self, compressed_size: int, options: dict = None):
+        options = options or {}
+        self.compressed_size = max(compressed_size, 1)
+        self.max_bytes = int(options.get('archive_max_mb') or DEFAULT_MAX_TOTAL_MB) * 1024 * 1024
+        self.max_ratio = float(options.get('archive_max_ratio') or DEFAULT_MAX_RATIO)
+        self.max_entries = int(options.get('archive_max_entries') or DEFAULT_MAX_ENTRIES)
+        self.total = 0
+        self.entries = 0
+
+    def add_entry(self):
+        self.entries += 1
+        if self.entries > self.max_entries:
+            raise ArchiveLimitError(f"压缩文件的成员超过 {self.max_entries} 个，已停止转换")
+
+    def add_bytes(self, count: int):
+        self.total += count
+        if self.total > self.max_bytes:
+            raise ArchiveLimitError(f"解压后超过 {self.max_bytes // (1024 * 1024)} MB，已停止转换")
+        if self.total > RATIO_FLOOR and self.total > self.compressed_size * self.max_ratio:
+            raise ArchiveLimitError(f"压缩比超过 {self.max_ratio:g}:1，可能是解压炸弹，已停止转换")
+
+
+def archive_format(path: str) -> str:
+    """由扩展名判断压缩格式：'zip'、'tar' 或 'tar.gz'"""
+    lower = path.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith('.tar'):
+        return 'tar'
+    if lower.endswith(('.gz', '.tgz')):
+        return 'tar.gz'
+    raise ValueError(f"不支持的压缩格式: {os.path.basename(path)}")
+
+
+def safe_member_name(name: str) -> Optional[str]:
+    """去掉开头的 / 和驱动器号，包含 .. 的成员名返回 None，根目录（"./"）返回空字符串"""
+    name = name.replace('\\', '/')
+    if len(name) > 1 and name[1] == ':':
+        name = name[2:]
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+def zip_member_name(info: zipfile.ZipInfo) -> str:
+    """
+    未设置 UTF-8 标志的成员名由 zipfile 按 cp437 解码；Info-ZIP 实际写入的多是 UTF-8，
+    Windows 中文系统创建的多是 GBK，依次尝试，都不是时保持原样
+    """
+    name = info.filename
+    if info.flag_bits & 0x800 or name.isascii():
+        return name
+    raw = name.encode('cp437')
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return name
+
+
+def copy_stream(source: IO[bytes], target: IO[bytes], limits: ArchiveLimits,
+                on_bytes: Callable[[int], None] = None) -> int:
+    """以 COPY_BUFFER 大小的块复制，每块都检查解压上限"""
+    copied = 0
+    while True:
+        chunk = source.read(COPY_BUFFER)
+        if not chunk:
+            return copied
+        limits.add_bytes(len(chunk))
+        target.write(chunk)
+        copied += len(chunk)
+        if on_bytes:
+            on_bytes(len(chunk))
+
+
+class _Member:
+    """源成员的统一描述，open() 返回内容的读取流"""
+
+    def __init__(self, name: str, kind: str, size: int, mtime: float, mode: int,
+                 opener: Callable[[], IO[bytes]] = None, tarinfo: tarfile.TarInfo = None):
+        self.name = name
+        self.kind = kind  # 'file'、'dir' 或 'link'（符号链接、硬链接等只有 tar 能保存的成员）
+        self.size = size
+        self.mtime = mtime
+        self.mode = mode
+        self.open = opener
+        self.tarinfo = tarinfo
+
+
+def _zip_members(zf: zipfile.ZipFile) -> Iterator[_Member]:
+    for info in zf.infolist():
+        name = zip_member_name(info)
+        mode = info.external_attr >> 16 if info.create_system == 3 else 0
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        if info.is_dir():
+            yield _Member(name, 'dir', 0, mtime, stat.S_IMODE(mode) or DEFAULT_DIR_MODE)
+        elif stat.S_ISLNK(mode):
+            # unix 上的 zip 工具把符号链接的目标保存为成员内容
+            with zf.open(info) as f:
+                link = f.read(4096).decode('utf-8', 'replace')
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.type = tarfile.SYMTYPE
+            tarinfo.linkname = link
+            tarinfo.mode = stat.S_IMODE(mode)
+            tarinfo.mtime = mtime
+            yield _Member(name, 'link', 0, mtime, stat.S_IMODE(mode), tarinfo=tarinfo)
+        else:
+            yield _Member(name, 'file', info.file_size, mtime,
+                          stat.S_IMODE(mode) or DEFAULT_FILE_MODE,
+                          opener=lambda info=info: zf.open(info))
+
+
+def _tar_members(tf: tarfile.TarFile) -> Iterator[_Member]:
+    for info in tf:
+        if info.isdir():
+            yield _Member(info.name, 'dir', 0, info.mtime, info.mode)
+        elif info.isreg():
+            yield _Member(info.name, 'file', info.size, info.mtime, info.mode,
+                          opener=lambda info=info: tf.extractfile(info), tarinfo=info)
+        else:
+            yield _Member(info.name, 'link', 0, info.mtime, info.mode, tarinfo=info)
+
+
+class _ZipWriter:
+    def __init__(self, path: str):
+        self.zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def add(self, member: _Member, limits: ArchiveLimits, on_bytes: Callable[[int], None]) -> bool:
+        if member.kind == 'link':
+            return False
+        name = member.name + '/' if member.kind == 'dir' else member.name
+        info = zipfile.ZipInfo(name, max(time.localtime(member.mtime)[:6], ZIP_EPOCH))
+        info.create_system = 3
+        info.external_attr = (member.mode & 0xFFFF) << 16
+        if member.kind == 'dir':
+            info.external_attr |= (stat.S_IFDIR << 16) | 0x10
+            self.zf.writestr(info, b'')
+            return True
+        info.external_attr |= stat.S_IFREG << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # 声明的大小可能不准，接近 4 GB 时预先写入 ZIP64 扩展字段
+        force_zip64 = member.size >= zipfile.ZIP64_LIMIT // 2
+        with member.open() as source, self.zf.open(info, 'w', force_zip64=force_zip64) as target:
+            copy_stream(source, target, limits, on_bytes)
+        return True
+
+    def close(self):
+        self.zf.close()
+
+
+class _TarWriter:
+    def __init__(self, path: str, compressed: bool):
+        self.tf = tarfile.open(path, 'w:gz' if compressed else 'w', format=tarfile.PAX_FORMAT)
+
+    def add(self, member: _Member, limits: ArchiveLimits, on_bytes: Callable[[int], None]) -> bool:
+        if member.tarinfo is not None:
+            info = copy.copy(member.tarinfo)
+        else:
+            info = tarfile.TarInfo()
+            info.type = tarfile.DIRTYPE if member.kind == 'dir' else tarfile.REGTYPE
+            info.mode = member.mode
+            info.mtime = member.mtime
+        info.name = member.name
+        if member.kind != 'file':
+            info.size = 0
+            self.tf.addfile(info)
+            return True
+        # tar 头部先写入大小，内容按声明的大小复制；zip 的读取流在声明的大小处结束并校验 CRC
+        info.size = member.size
+        with member.open() as source:
+            self.tf.addfile(info, _LimitedReader(source, limits, on_bytes))
+        return True
+
+    def close(self):
+        self.tf.close()
+
+
+class _LimitedReader:
+    """tarfile.addfile 读取内容时检查解压上限"""
+
+    def __init__(self, source: IO[bytes], limits: ArchiveLimits, on_bytes: Callable[[int], None]):
+        self.source = source
+        self.limits = limits
+        self.on_bytes = on_bytes
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(min(size, COPY_BUFFER) if size and size > 0 else COPY_BUFFER)
+        self.limits.add_bytes(len(chunk))
+        if self.on_bytes:
+            self.on_bytes(len(chunk))
+        return chunk
+
+
+def _open_writer(target: str):
+    fmt = archive_format(target)
+    if fmt == 'zip':
+        return _ZipWriter(target)
+    return _TarWriter(target, compressed=fmt == 'tar.gz')
+
+
+def convert_archive(source: str, target: str, options: dict = None,
+                    progress_callback: Callable[[int], None] = None,
+                    is_cancelled: Callable[[], bool] = None) -> Tuple[int, int]:
+    """
+    把 source 中的成员逐个写入 target，不解压到磁盘
+
+    tar 到 tar 原样保留符号链接、硬链接和属主；写入 zip 时跳过链接等 zip 无法表示的成员。
+    超过解压上限时抛出 ArchiveLimitError；is_cancelled 在每个成员和每块内容之前检查，
+    返回 True 时抛出异常停止转换。未完成的 target 由调用方删除。
+
+    Returns:
+        (写入的成员数, 跳过的成员数)
+    """
+    if archive_format(source) == 'zip' or zipfile.is_zipfile(source):
+        reader_type = 'zip'
+    elif tarfile.is_tarfile(source):
+        reader_type = 'tar'
+    else:
+        raise ValueError(f"无法识别的压缩文件: {os.path.basename(source)}")
+
+    compressed_size = os.path.getsize(source)
+    limits = ArchiveLimits(compressed_size, options)
+    written = skipped = 0
+    last_progress = -1
+
+    with open(source, 'rb') as raw:
+        if reader_type == 'zip':
+            archive = zipfile.ZipFile(raw)
+            declared = sum(info.file_size for info in archive.infolist())
+            members = _zip_members(archive)
+        else:
+            archive = tarfile.open(fileobj=raw, mode='r:*')
+            declared = 0
+            members = _tar_members(archive)
+
+        def report(count: int = 0):
+            # 每复制一块内容和每写完一个成员时调用，同时检查是否已取消；
+            # zip 按声明的解压后大小计算进度，tar 按源文件已读取的位置计算
+            nonlocal last_progress
+            if is_cancelled and is_cancelled():
+                raise Exception("转换被用户取消")
+            if not progress_callback:
+                return
+            if declared:
+                value = limits.total * 100 // declared
+            else:
+                value = raw.tell() * 100 // compressed_size
+            value = min(value, 99)
+            if value != last_progress:
+                last_progress = value
+                progress_callback(value)
+
+        writer = _open_writer(target)
+        try:
+            for member in members:
+                report()
+                limits.add_entry()
+                name = safe_member_name(member.name)
+                if name == '':
+                    continue
+                if name is None:
+                    logger.warning(f"跳过路径不安全的成员: {member.name}")
+                    skipped += 1
+                    continue
+                member.name = name
+                if writer.add(member, limits, report):
+                    written += 1
+                else:
+                    logger.info(f"目标格式无法保存链接，已跳过: {member.name}")
+                    skipped += 1
+        finally:
+            writer.close()
+            archive.close()
+
+    if progress_callback:
+        progress_callback(100)
+    return written, skipped
@@ -0,0 +1,332 @@
+"""
+命令行批量转换模块
+
+不导入 PySide6 和 qfluentwidgets，可在没有显示器的构建机、渲染机上运行。
+进度和结果以 JSON Lines 的形式输出到标准输出，每行一个事件。
+
+用法示例：
+    python -m app.core -t mp4 -j 4 videos/*.mkv
+    python -m app.core -t mp4 --profile fastest videos/*.mov
+    python -m app.core -t mp4,webm,mp3 talk.mkv
+    python -m app.core -t webp -o out "photos/**/*.png"
+    python -m app.core -t jpg --max-size 1280 -o previews photos/*.jpg
+    python -m app.core -t webp --image-profile small --strip-metadata photos/*.jpg
+    python -m app.core -t webp,jpg --sizes 1920,1280,640,320 -o web photos/*.jpg
+    python -m app.core -t ico --sizes 256,48,32,16 logo.png
+    python -m app.core -t mp4 --cache videos/*.mkv
+    python -m app.core -t webp --incremental -o out "photos/**/*.png"
+    python -m app.core -t mp4 --watch -o done inbox
+    cat jobs.jsonl | python -m app.core -
+
+标准输入中的每行是一个 JSON 对象：
+    {"source": "a.mkv", "target": "out/a.mp4"}
+    {"source": "b.png", "format": "webp", "output_dir": "out"}
+    {"source": "c.mkv", "format": "mp4", "options": {"segmented": true, "profile": "archival"}}
+    {"source": "d.mkv", "targets": ["out/d.mp4", "out/d.mp3"]}
+
+同一源文件的多个音视频目标合并为一个任务，由一次 ffmpeg 调用输出，源文件只解码一次；
+同一图片的多个目标格式和 --sizes 的各个尺寸也由一个任务输出，较小的尺寸由较大的中间结果缩小。
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from .converter import FormatConverter
+from .scheduler import ConvertJob, JobScheduler, JobState
+from .image_pool import ImageProcessPool
+from .image_converter import parse_max_size, parse_sizes
+from .large_image import DEFAULT_MEMORY_LIMIT_MB
+from .encoding_profiles import ENCODING_PROFILES, IMAGE_PROFILES
+from .job_log import LOG_LEVEL_ENV, LOG_LEVELS, configure_logging
+from .result_cache import DEFAULT_CACHE_SIZE_MB, ResultCache
+from .archive_converter import DEFAULT_MAX_TOTAL_MB
+from .hot_folder import DEFAULT_SETTLE_SECONDS, HotFolder
+
+
+class JsonLinesReporter:
+    """ 以 JSON Lines 输出任务事件，供其他程序解析 """
+
+    def __init__(self, stream=None, log_lines: int = 20):
+        self.stream = stream or sys.stdout
+        # 失败事件附带的任务日志行数
+        self.log_lines = log_lines
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields):
+        line = json.dumps(dict(event=event, **fields), ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def watch(self, job: ConvertJob):
+        """订阅任务的状态和进度，只在进度整数值变化时输出"""
+        last_progress = [-1]
+
+        def on_progress(_job, value):
+            if value != last_progress[0]:
+                last_progress[0] = value
+                fields = {key: _job.stats[key] for key in ('fps', 'speed') if _job.stats.get(key) is not None}
+                self.emit('progress', job=_job.job_id, progress=value, **fields)
+
+        def on_state(_job):
+            fields = {}
+            if _job.state == JobState.FAILED:
+                # 只在失败时格式化任务日志
+                fields['log'] = _job.log.tail(self.log_lines)
+            if len(_job.targets) > 1:
+                fields['targets'] = _job.targets
+            if _job.cached:
+                fields['cached'] = True
+            self.emit('state', job=_job.job_id, source=_job.source_file, target=_job.target_file,
+                      state=_job.state.value, error=_job.error, **fields)
+
+        job.add_progress_listener(on_progress)
+        job.add_state_listener(on_state)
+
+
+def build_target(source: str, target_format: str, output_dir: str = None) -> str:
+    """根据目标格式和输出目录生成目标文件路径，默认与源文件同目录"""
+    save_dir = output_dir or os.path.dirname(os.path.abspath(source))
+    source_name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(save_dir, f"{source_name}.{target_format.lower().lstrip('.')}")
+
+
+def split_formats(value: str) -> List[str]:
+    """把 "mp4,webm,mp3" 拆成目标格式列表"""
+    return [fmt.strip() for fmt in value.split(',') if fmt.strip()]
+
+
+def expand_inputs(patterns: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+    """展开文件和通配符，返回 (路径, 是否存在)"""
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                yield pattern, False
+            for match in matches:
+                if os.path.isfile(match):
+                    yield match, True
+        else:
+            yield pattern, os.path.isfile(pattern)
+
+
+def build_options(args) -> dict:
+    """根据命令行参数生成转换选项"""
+    options = {}
+    if args.segmented:
+        options['segmented'] = True
+    if args.profile:
+        options['profile'] = args.profile
+    if args.max_size:
+        options['max_size'] = args.max_size
+    if args.sizes:
+        options['sizes'] = parse_sizes(args.sizes)
+    if args.memory_limit:
+        options['memory_limit_mb'] = args.memory_limit
+    if args.archive_max_size:
+        options['archive_max_mb'] = args.archive_max_size
+    if args.image_profile:
+        options['image_profile'] = args.image_profile
+    if args.strip_metadata:
+        options['strip_metadata'] = True
+    if args.incremental:
+        options['incremental'] = True
+    return options
+
+
+def read_job_stream(stream, args) -> Iterator[Tuple[str, List[str], dict]]:
+    """从 JSON Lines 任务流中读取 (源文件, 目标文件列表, 转换选项)，options 字段覆盖命令行选项"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+            source = item['source']
+            targets = list(item.get('targets') or [])
+            if item.get('target'):
+                targets.insert(0, item['target'])
+            if not targets:
+                target_format = item.get('format') or args.to
+                if not target_format:
+                    raise ValueError("缺少 target、targets 或 format")
+                output_dir = item.get('output_dir') or args.output_dir
+                targets = [build_target(source, fmt, output_dir) for fmt in split_formats(target_format)]
+            options = dict(build_options(args), **item.get('options', {}))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"第 {line_number} 行任务无效: {e}")
+        yield source, targets, options
+
+
+def watch_folders(args, reporter: JsonLinesReporter, submit_targets: Callable[[str, List[str], dict], None]):
+    """
+    监视模式：按固定间隔检查各文件夹，把写入完成的新文件加入队列，直到按下 Ctrl+C
+
+    只重新列出修改时间变化过的目录；文件夹中已有的文件也会加入队列，输出已是最新的由增量模式跳过。
+    """
+    formats = split_formats(args.to)
+    options = dict(build_options(args), incremental=True)
+    folders = [HotFolder(path, formats, [args.output_dir], args.settle) for path in args.inputs]
+    for folder in folders:
+        reporter.emit('watching', folder=folder.root, formats=formats)
+    try:
+        while True:
+            for folder in folders:
+                for source, _ in folder.poll():
+                    submit_targets(source, [build_target(source, fmt, args.output_dir) for fmt in formats], options)
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        # 停止监视，已加入队列的任务继续转换，再次按下 Ctrl+C 时取消
+        reporter.emit('watch_stopped', pending=sum(folder.tracker.pending_count for folder in folders))
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m app.core',
+        description='无界面批量格式转换，进度和结果以 JSON Lines 输出到标准输出'
+    )
+    parser.add_argument('inputs', nargs='*',
+                        help="源文件或通配符（支持 **），'-' 表示从标准输入读取 JSON Lines 任务流")
+    parser.add_argument('-t', '--to', metavar='FORMAT',
+                        help='目标格式，例如 mp4、webp；多个格式用逗号分隔，例如 mp4,webm,mp3')
+    parser.add_argument('-o', '--output-dir', metavar='DIR', help='输出目录，默认与源文件相同')
+    parser.add_argument('-j', '--jobs', type=int, default=None, metavar='N',
+                        help='同时运行的任务数上限，默认按CPU核心数')
+    parser.add_argument('--segmented', action='store_true',
+                        help='视频分段并行编码，适合单个较长的视频')
+    parser.add_argument('--profile', choices=list(ENCODING_PROFILES),
+                        help='音视频编码预设：fastest 最快、balanced 均衡（默认）、archival 高质量、smallest 最小体积')
+    parser.add_argument('--max-size', metavar='SIZE',
+                        help='图片输出尺寸上限，1280 表示最长边，1280x720 表示宽高边界，只缩小不放大')
+    parser.add_argument('--sizes', metavar='EDGES',
+                        help='图片按多个最长边输出，例如 1280,640,320 输出 name-1280.webp 等文件；'
+                             'ICO 目标为图标尺寸，超过 256 的边长忽略，默认 256 到 16')
+    parser.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+                        help=f'单个图片任务的解码内存上限（MB），超过时 TIFF 按条带处理，默认 {DEFAULT_MEMORY_LIMIT_MB}')
+    parser.add_argument('--archive-max-size', type=int, default=None, metavar='MB',
+                        help=f'压缩文件解压后的总大小上限（MB），超过时停止转换，默认 {DEFAULT_MAX_TOTAL_MB}')
+    parser.add_argument('--image-profile', choices=list(IMAGE_PROFILES),
+                        help='图片编码预设：default 默认、fast 编码最快、small 文件最小')
+    parser.add_argument('--strip-metadata', action='store_true',
+                        help='图片输出时移除 EXIF、ICC、XMP 等元数据，默认保留')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量转换：输出已由相同内容的源文件以相同设置生成且未被改动时跳过，'
+                             '记录保存在输出目录的 .gsgc-index.db 中')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视输入的文件夹，新放入的文件写入完成后自动转换，按 Ctrl+C 停止；自动启用 --incremental')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, metavar='SECONDS',
+                        help=f'监视模式下文件大小和修改时间保持不变多少秒后才转换，默认 {DEFAULT_SETTLE_SECONDS:g}')
+    parser.add_argument('--poll-interval', type=float, default=1.0, metavar='SECONDS',
+                        help='监视模式下检查文件夹的间隔，默认 1')
+    parser.add_argument('--cache', action='store_true',
+                        help='启用转换结果缓存，相同的源文件以相同设置转换时直接复用上次的结果')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='转换结果缓存目录，指定时即启用缓存，默认 ~/.gsgc/cache')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB, metavar='MB',
+                        help=f'转换结果缓存的大小上限（MB），超出时淘汰最久未使用的结果，默认 {DEFAULT_CACHE_SIZE_MB}')
+    parser.add_argument('--image-processes', action='store_true',
+                        help='图片任务交给子进程池执行')
+    parser.add_argument('--log-level', default=None, choices=LOG_LEVELS,
+                        help=f'输出到标准错误的日志级别，默认读取环境变量 {LOG_LEVEL_ENV}，未设置时为 WARNING')
+    args = parser.parse_args(argv)
+    if not args.inputs:
+        parser.error('需要至少一个输入文件、通配符或 -')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs 必须大于 0')
+    if args.memory_limit is not None and args.memory_limit < 1:
+        parser.error('--memory-limit 必须大于 0')
+    if args.archive_max_size is not None and args.archive_max_size < 1:
+        parser.error('--archive-max-size 必须大于 0')
+    if args.cache_size < 1:
+        parser.error('--cache-size 必须大于 0')
+    try:
+        parse_max_size(args.max_size)
+    except ValueError:
+        parser.error(f'无效的 --max-size: {args.max_size}')
+    try:
+        parse_sizes(args.sizes)
+    except ValueError:
+        parser.error(f'无效的 --sizes: {args.sizes}')
+    if '-' not in args.inputs and not args.to:
+        parser.error('从文件或通配符转换时需要 --to 指定目标格式')
+    if args.watch and not all(os.path.isdir(path) for path in args.inputs):
+        parser.error('--watch 的输入必须是文件夹')
+    if args.settle < 0 or args.poll_interval <= 0:
+        parser.error('--settle 不能小于 0，--poll-interval 必须大于 0')
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+
+    reporter = JsonLinesReporter()
+    image_pool = None
+    if args.image_processes:
+        image_pool = ImageProcessPool(max_workers=args.jobs)
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ResultCache(args.cache_dir, max_size_mb=args.cache_size)
+    scheduler = JobScheduler(max_workers=args.jobs, image_pool=image_pool, cache=cache)
+    converter = FormatConverter()
+    jobs = []
+    invalid = 0
+
+    def submit(source: str, target: str, options: dict):
+        job = ConvertJob(source, target, options)
+        reporter.watch(job)
+        jobs.append(job)
+        fields = {'targets': job.targets} if len(job.targets) > 1 else {}
+        reporter.emit('queued', job=job.job_id, source=source, target=target, **fields)
+        scheduler.submit(job)
+
+    def submit_targets(source: str, targets: List[str], options: dict):
+        # 只需解码一次的目标（音视频由一次 ffmpeg 调用输出，图片共用一次解码）合并为一个任务，其余每个目标一个任务
+        grouped = [target for target in targets if converter.supports_multi_output(source, [target])]
+        if len(grouped) > 1:
+            submit(source, grouped[0], dict(options, extra_targets=grouped[1:]))
+            targets = [target for target in targets if target not in grouped]
+        for target in targets:
+            submit(source, target, options)
+
+    try:
+        if args.watch:
+            watch_folders(args, reporter, submit_targets)
+        for pattern in [] if args.watch else args.inputs:
+            if pattern == '-':
+                for source, targets, options in read_job_stream(sys.stdin, args):
+                    submit_targets(source, targets, options)
+                continue
+            for source, exists in expand_inputs([pattern]):
+                if not exists:
+                    invalid += 1
+                    reporter.emit('error', source=source, error='未找到文件')
+                    continue
+                targets = [build_target(source, fmt, args.output_dir) for fmt in split_formats(args.to)]
+                submit_targets(source, targets, build_options(args))
+        scheduler.wait()
+    except KeyboardInterrupt:
+        reporter.emit('error', error='用户中断，正在取消剩余任务')
+        scheduler.shutdown(cancel_pending=True, wait=True)
+    except ValueError as e:
+        reporter.emit('error', error=str(e))
+        scheduler.shutdown(cancel_pending=True, wait=True)
+        return 2
+    else:
+        scheduler.shutdown(cancel_pending=False, wait=True)
+
+    counts = {state.value: 0 for state in JobState}
+    for job in jobs:
+        counts[job.state.value] += 1
+    fields = {'cache': cache.stats()} if cache is not None else {}
+    reporter.emit('summary', total=len(jobs), invalid=invalid, **counts, **fields)
+
+    if counts[JobState.CANCELLED.value]:
+        return 130
+    finished = counts[JobState.DONE.value] + counts[JobState.SKIPPED.value]
+    return 0 if not invalid and finished == len(jobs) else 1
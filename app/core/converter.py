@@ -2,37 +2,87 @@ import os
 import sys
 import shutil
 import subprocess
-import re
 import logging
-from typing import Callable, Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, Optional
 import time
 import threading
 import tempfile
-from PIL import Image
-from docx import Document
-from pdf2docx import Converter
-import zipfile
-import tarfile
+from concurrent.futures import ThreadPoolExecutor
 
-# 配置详细的日志记录
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # 只输出到控制台
-    ]
-)
+from .image_converter import convert_image
+from .archive_converter import convert_archive
+from .media_info import MediaInfo, probe_media
+from .toolchain import get_toolchain
+from .job_log import JobLog
+from .ffmpeg_progress import FFmpegProgress, FFmpegResult, run_ffmpeg, remove_partial_output
+from .encoding_profiles import (EncodingProfile, get_profile, video_encoder_candidates,
+                                audio_encoder_candidates, audio_format_args, audio_output_args)
 
 flags = 0
 if sys.platform == "win32":
     flags = subprocess.CREATE_NO_WINDOW
 
+# 资源类别
+RESOURCE_FFMPEG = 'ffmpeg'      # ffmpeg 编码，CPU密集且自身多线程
+RESOURCE_IMAGE = 'image'        # PIL 图片处理，耗时短且单线程
+RESOURCE_DOCUMENT = 'document'  # 文档转换，pdf2docx 内存占用大
+RESOURCE_ARCHIVE = 'archive'    # 压缩文件转换，IO密集
+
+# 分段并行编码时每段的最短时长（秒）
+SEGMENT_MIN_SECONDS = 10
+
+# 各容器可以直接封装（-c copy）的编码格式，名称与 ffprobe 的 codec_name 一致
+CONTAINER_CODECS = {
+    'mp4': {
+        'video': {'h264', 'hevc', 'mpeg4', 'av1', 'vp9'},
+        'audio': {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac'},
+    },
+    'm4v': {
+        'video': {'h264', 'hevc', 'mpeg4'},
+        'audio': {'aac', 'ac3', 'eac3', 'alac', 'mp3'},
+    },
+    'mov': {
+        'video': {'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'},
+        'audio': {'aac', 'mp3', 'ac3', 'alac', 'pcm_s16le', 'pcm_s24le'},
+    },
+    'mkv': {
+        'video': {'h264', 'hevc', 'mpeg4', 'mpeg2video', 'vp8', 'vp9', 'av1', 'theora', 'mjpeg', 'prores'},
+        'audio': {'aac', 'mp3', 'ac3', 'eac3', 'dts', 'truehd', 'flac', 'opus', 'vorbis', 'alac',
+                  'pcm_s16le', 'pcm_s24le'},
+    },
+    'webm': {
+        'video': {'vp8', 'vp9', 'av1'},
+        'audio': {'opus', 'vorbis'},
+    },
+    'flv': {
+        'video': {'h264', 'flv1'},
+        'audio': {'aac', 'mp3'},
+    },
+    'avi': {
+        # AVI 中的 H.264 需要 Annex B 码流，MP4/MKV 中的 H.264 不能直接复制
+        'video': {'mpeg4', 'mjpeg', 'msmpeg4v3'},
+        'audio': {'mp3', 'ac3', 'pcm_s16le'},
+    },
+    'wmv': {
+        'video': {'wmv1', 'wmv2', 'wmv3', 'vc1'},
+        'audio': {'wmav1', 'wmav2'},
+    },
+}
+
 class FormatConverter:
     """ 格式转换器 """
     
     def __init__(self):
         self.is_cancelled = False
+        self.options = {}
         self.logger = logging.getLogger(__name__)
+        self.toolchain = get_toolchain()
+        # 由调度器设置，返回当前可给本任务 ffmpeg 使用的线程数，每次启动 ffmpeg 时读取
+        self.thread_budget: Optional[Callable[[], int]] = None
+        # 任务日志，保存外部工具的原始输出，失败或查看详情时才格式化
+        self.job_log = JobLog()
+        # ffmpeg 的速度、帧率、码率等统计信息回调
+        self.stats_callback: Optional[Callable[[FFmpegProgress], None]] = None
         self.converters = {
             # 视频转换器
             ('video', 'video'): self._convert_video_to_video,
@@ -53,6 +103,18 @@ class FormatConverter:
             ('archive', 'archive'): self._convert_archive_to_archive,
         }
         
+        # 转换器占用的资源类别，调度器按类别分别限制并发
+        self.resource_classes = {
+            ('video', 'video'): RESOURCE_FFMPEG,
+            ('video', 'audio'): RESOURCE_FFMPEG,
+            ('audio', 'audio'): RESOURCE_FFMPEG,
+            ('image', 'image'): RESOURCE_IMAGE,
+            ('document', 'document'): RESOURCE_DOCUMENT,
+            ('document', 'pdf'): RESOURCE_DOCUMENT,
+            ('pdf', 'document'): RESOURCE_DOCUMENT,
+            ('archive', 'archive'): RESOURCE_ARCHIVE,
+        }
+        
         # 文件类型映射
         self.type_map = {
             # 视频格式
@@ -81,7 +143,8 @@ class FormatConverter:
             'tar': 'archive', 'gz': 'archive'
         }
         
-    def convert(self, source_file: str, target_file: str, progress_callback: Callable[[int], None] = None) -> bool:
+    def convert(self, source_file: str, target_file: str, progress_callback: Callable[[int], None] = None,
+                options: dict = None) -> bool:
         """
         转换文件格式
         
@@ -89,10 +152,19 @@ class FormatConverter:
             source_file: 源文件路径
             target_file: 目标文件路径
             progress_callback: 进度回调函数，参数为进度值（0-100）
+            options: 转换选项，例如 {'segmented': True} 表示视频分段并行编码，
+                {'profile': 'fastest'} 选择编码预设，
+                {'extra_targets': [...]} 同时输出其他格式，源文件只解码一次，
+                {'max_size': 1280} 或 {'max_size': [1280, 720]} 限制图片输出尺寸，
+                {'memory_limit_mb': 1024} 图片解码的内存上限，超过时 TIFF 按条带处理，
+                {'image_profile': 'small', 'strip_metadata': True} 选择图片编码预设、移除图片元数据，
+                {'sizes': [1280, 640, 320]} 图片按各个最长边输出多个文件，ICO 目标为图标尺寸，
+                {'archive_max_mb': 10240} 压缩文件解压后的总大小上限，另有 archive_max_ratio、archive_max_entries
             
         Returns:
             bool: 转换是否成功
         """
+        self.options = dict(options or {})
         try:
             # 获取文件扩展名
             source_ext = os.path.splitext(source_file)[1][1:].lower()
@@ -108,6 +180,15 @@ class FormatConverter:
             # 创建目标文件所在的目录
             os.makedirs(os.path.dirname(target_file), exist_ok=True)
             
+            # 多个输出只解码一次：音视频由一次 ffmpeg 调用完成，图片交给 convert_image
+            extra_targets = self.options.get('extra_targets') or []
+            if extra_targets:
+                targets = [target_file] + list(extra_targets)
+                if not self.supports_multi_output(source_file, targets):
+                    raise ValueError(f"不支持同时输出这些格式：{', '.join(targets)}")
+                if source_type != 'image':
+                    return self._convert_media_multi(source_file, targets, progress_callback)
+            
             # 根据类型选择转换方法
             if source_type == 'video':
                 if target_type == 'video':
@@ -118,193 +199,158 @@ class FormatConverter:
                 return self._convert_audio_to_audio(source_file, target_file, progress_callback)
             elif source_type == 'image' and target_type == 'image':
                 return self._convert_image_to_image(source_file, target_file, progress_callback)
+            elif source_type == 'archive' and target_type == 'archive':
+                return self._convert_archive_to_archive(source_file, target_file, progress_callback)
             
             raise ValueError(f"不支持的转换类型：{source_type} -> {target_type}")
             
         except Exception as e:
             self.logger.error(f"转换失败：{e}")
+            self.job_log.add(f"转换失败：{e}")
             return False
             
-    def _get_ffmpeg_executable(self, executable_name: str) -> str:
-        """获取ffmpeg可执行文件路径"""
-        try:
-            # 1. 优先尝试在打包环境中查找
-            if hasattr(sys, '_MEIPASS'):
-                meipass_path = os.path.join(sys._MEIPASS, executable_name)
-                if os.path.exists(meipass_path):
-                    self.logger.info(f"在打包目录中找到 {executable_name}: {meipass_path}")
-                    return meipass_path
-            
-            # 2. 尝试在当前目录查找
-            current_dir = os.getcwd()
-            current_path = os.path.join(current_dir, executable_name)
-            if os.path.exists(current_path):
-                self.logger.info(f"在当前目录找到 {executable_name}: {current_path}")
-                return current_path
-                
-            # 3. 尝试在系统PATH中查找
-            which_path = shutil.which(executable_name)
-            if which_path:
-                self.logger.info(f"在系统PATH中找到 {executable_name}: {which_path}")
-                return which_path
-                
-            # 4. 尝试在已知位置查找
-            known_paths = [
-                # 标准bin子目录
-                os.path.join(os.environ.get('ProgramFiles', ''), 'ffmpeg', 'bin', executable_name),
-                os.path.join(os.environ.get('ProgramFiles(x86)', ''), 'ffmpeg', 'bin', executable_name),
-                os.path.join(os.path.expanduser('~'), 'ffmpeg', 'bin', executable_name),
-                f'C:\\ffmpeg\\bin\\{executable_name}',
-                f'D:\\ffmpeg\\bin\\{executable_name}',
-                # 直接在ffmpeg根目录
-                os.path.join(os.environ.get('ProgramFiles', ''), 'ffmpeg', executable_name),
-                os.path.join(os.environ.get('ProgramFiles(x86)', ''), 'ffmpeg', executable_name),
-                os.path.join(os.path.expanduser('~'), 'ffmpeg', executable_name),
-                f'C:\\ffmpeg\\{executable_name}',
-                f'D:\\ffmpeg\\{executable_name}',
-                # 保留原有目录
-                f'D:\\ffmpeg-7.0.2-essentials_build\\bin\\{executable_name}'
-            ]
-            
-            for path in known_paths:
-                if os.path.exists(path):
-                    self.logger.info(f"在已知位置找到 {executable_name}: {path}")
-                    return path
-            
-            # 5. 从环境变量Path中的ffmpeg相关目录查找
-            path_dirs = os.environ.get('Path', '').split(';')
-            for dir_path in path_dirs:
-                if 'ffmpeg' in dir_path.lower():
-                    full_path = os.path.join(dir_path, executable_name)
-                    if os.path.exists(full_path):
-                        self.logger.info(f"在环境变量Path中找到 {executable_name}: {full_path}")
-                        return full_path
-                    
-            # 6. 最后尝试直接使用名称
-            self.logger.warning(f"未找到 {executable_name}，将尝试直接调用")
-            return executable_name
-            
-        except Exception as e:
-            self.logger.error(f"查找 {executable_name} 失败: {str(e)}")
-            return executable_name
+    def supports_multi_output(self, source_file: str, target_files: List[str]) -> bool:
+        """
+        判断能否只解码一次同时输出多个目标：音视频源文件转为音视频格式时由一次 ffmpeg 调用输出，
+        图片转为多个图片格式时共用一次解码
+        """
+        source_type = self.type_map.get(os.path.splitext(source_file)[1][1:].lower())
+        if source_type not in ('video', 'audio', 'image'):
+            return False
+        for target_file in target_files:
+            target_type = self.type_map.get(os.path.splitext(target_file)[1][1:].lower())
+            if (source_type, target_type) not in (('video', 'video'), ('video', 'audio'), ('audio', 'audio'),
+                                                  ('image', 'image')):
+                return False
+        return True
+        
+    def get_resource_class(self, source_file: str, target_file: str) -> str:
+        """获取转换任务的资源类别，未知类型按图片类处理"""
+        source_type = self.type_map.get(os.path.splitext(source_file)[1][1:].lower())
+        target_type = self.type_map.get(os.path.splitext(target_file)[1][1:].lower())
+        return self.resource_classes.get((source_type, target_type), RESOURCE_IMAGE)
             
+    def toolchain_identity(self, source_file: str, targets: List[str], options: dict = None) -> str:
+        """
+        ffmpeg 类任务的输出所依赖的工具链：ffmpeg 版本，以及各视频目标实际选用的视频和音频编码器
+
+        参与转换缓存和增量索引的摘要，升级 ffmpeg 或可用编码器变化后旧的结果不再被复用；
+        其他类别的任务返回空字符串。
+        """
+        if self.get_resource_class(source_file, targets[0]) != RESOURCE_FFMPEG:
+            return ''
+        profile = get_profile((options or {}).get('profile'))
+        parts = [self.toolchain.version()]
+        for target in targets:
+            target_ext = os.path.splitext(target)[1][1:].lower()
+            if self.type_map.get(target_ext) == 'video':
+                parts.append(self.toolchain.pick_encoder(video_encoder_candidates(target_ext, profile))[1])
+                parts.append(self.toolchain.pick_encoder(audio_encoder_candidates(target_ext, profile))[1])
+        return ' | '.join(parts)
+            
+    def _thread_budget(self) -> int:
+        """当前可用的 ffmpeg 线程数，未由调度器管理时使用全部核心"""
+        if self.thread_budget is None:
+            return os.cpu_count() or 1
+        return max(1, self.thread_budget())
+        
+    def _thread_args(self) -> List[str]:
+        """限制 ffmpeg 编码和滤镜线程数的参数，避免多个任务同时运行时线程数远超核心数"""
+        if self.thread_budget is None:
+            return []
+        threads = str(self._thread_budget())
+        return ['-threads', threads, '-filter_threads', threads]
+        
+    def _profile(self) -> EncodingProfile:
+        """当前任务的编码预设"""
+        return get_profile(self.options.get('profile'))
+        
+    def _video_encoder(self, target_ext: str) -> List[str]:
+        """目标容器可用的视频编码参数"""
+        return self.toolchain.pick_encoder(video_encoder_candidates(target_ext, self._profile()))
+        
+    def _audio_encoder(self, target_ext: str) -> List[str]:
+        """目标容器可用的音频编码参数，包括预设的采样率和声道"""
+        profile = self._profile()
+        return self.toolchain.pick_encoder(audio_encoder_candidates(target_ext, profile)) + audio_format_args(profile)
+            
+    def _probe_media(self, source: str) -> MediaInfo:
+        """获取源文件的媒体信息，同一文件未修改时直接使用缓存"""
+        return probe_media(source, self.toolchain.ffprobe)
+        
+    def _run_ffmpeg(self, cmd: List[str], duration: Optional[float] = None,
+                    progress_callback: Callable[[int], None] = None, expected_size: int = 0,
+                    is_cancelled: Callable[[], bool] = None) -> FFmpegResult:
+        """运行 ffmpeg，进度和统计信息分别回调给 progress_callback 和 stats_callback"""
+        return run_ffmpeg(
+            cmd,
+            duration=duration,
+            progress_callback=progress_callback,
+            stats_callback=self.stats_callback,
+            is_cancelled=is_cancelled or (lambda: self.is_cancelled),
+            expected_size=expected_size,
+            log=self.job_log,
+        )
+        
     def _convert_video_to_video(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         """视频转视频"""
         try:
             self.logger.info(f"开始视频转换: {source} -> {target}")
             
-            # 获取ffprobe路径
-            ffprobe_path = self._get_ffmpeg_executable('ffprobe.exe')
-            
-            # 获取视频时长
-            self.logger.debug("正在获取视频时长...")
-            result = subprocess.run(
-                [ffprobe_path, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', source],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                creationflags=flags
-            )
-            duration = float(result.stdout)
+            # 一次 ffprobe 获取时长和流信息，结果有缓存
+            self.logger.debug("正在获取源视频信息...")
+            info = self._probe_media(source)
+            duration = info.duration
             self.logger.info(f"视频时长: {duration}秒")
             
-            # 获取源视频信息
-            self.logger.debug("正在获取源视频信息...")
-            probe_cmd = [ffprobe_path, '-v', 'error', '-show_format', '-show_streams', '-print_format', 'json', source]
-            probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, encoding='utf-8', creationflags=flags)
-            self.logger.debug(f"源视频信息: {probe_result.stdout}")
+            # 按流判断能否直接封装，只重新编码不兼容的流
+            target_ext = os.path.splitext(target)[1][1:].lower()
+            stream_args, copy_video = self._plan_video_streams(info, target_ext)
+            
+            # 分段并行编码，视频流可以直接封装时整体复制更快
+            if self.options.get('segmented') and not copy_video and (duration or 0) >= SEGMENT_MIN_SECONDS * 2:
+                return self._convert_video_segmented(source, target, duration, progress_callback, info.start_time)
             
             # 获取ffmpeg路径
-            ffmpeg_path = self._get_ffmpeg_executable('ffmpeg.exe')
+            ffmpeg_path = self.toolchain.ffmpeg
             
             # 构建转换命令
             cmd = [
                 ffmpeg_path,
                 '-i', source,  # 输入文件
                 '-y',  # 覆盖已存在的文件
-                '-c:v', 'h264',  # 使用 H.264 编码
-                '-preset', 'medium',  # 编码速度预设
-                '-crf', '23',  # 视频质量参数
-                '-c:a', 'aac',  # 音频编码
-                '-b:a', '128k',  # 音频比特率
-                '-movflags', '+faststart',  # 优化网络播放
-                target  # 输出文件
-            ]
-            
-            # 记录完整的命令
-            self.logger.info(f"FFmpeg命令: {' '.join(cmd)}")
+            ] + stream_args
+            if target_ext in ('mp4', 'm4v', 'mov'):
+                cmd += ['-movflags', '+faststart']  # 优化网络播放
+            cmd += self._thread_args()
+            cmd.append(target)  # 输出文件
             
             # 执行转换
-            self.logger.debug("开始执行转换...")
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                encoding='utf-8',
-                creationflags=flags
-            )
-            
-            # 实时获取进度
-            time_pattern = re.compile(r'time=(\d+):(\d+):(\d+\.\d+)')
-            error_buffer = []
-            while True:
-                line = process.stderr.readline()
-                
-                if not line and process.poll() is not None:
-                    # 确保在转换完成时显示100%
-                    if process.returncode == 0 and progress_callback:
-                        progress_callback(100)
-                        self.logger.info("转换完成")
-                    break
-                
-                # 记录FFmpeg的输出信息
-                if line.strip():
-                    self.logger.debug(f"FFmpeg输出: {line.strip()}")
-                    error_buffer.append(line)  # 保存最近的错误信息
-                    if len(error_buffer) > 50:  # 限制缓冲区大小
-                        error_buffer.pop(0)
-                    
-                if self.is_cancelled:
-                    self.logger.info("转换被用户取消")
-                    process.terminate()
-                    process.wait()  # 等待进程完全终止
-                    # 删除未完成的输出文件
-                    try:
-                        if os.path.exists(target):
-                            os.remove(target)
-                            self.logger.debug(f"已删除未完成的输出文件: {target}")
-                    except Exception as e:
-                        self.logger.error(f"删除未完成文件失败: {str(e)}")
-                    return False
-                    
-                match = time_pattern.search(line)
-                if match and progress_callback:
-                    h, m, s = map(float, match.groups())
-                    current_time = h * 3600 + m * 60 + s
-                    progress = min(int(current_time / duration * 100), 99)  # 最多显示99%，留1%给完成时
-                    self.logger.debug(f"当前进度: {progress}% (时间: {current_time:.2f}s/{duration:.2f}s)")
-                    if progress_callback:
-                        progress_callback(progress)
+            result = self._run_ffmpeg(cmd, duration, progress_callback, info.size)
+            if result.cancelled:
+                self.logger.info("转换被用户取消")
+                remove_partial_output(target)
+                return False
             
             # 检查转换结果
-            if process.returncode != 0:
-                stderr_output = '\n'.join(error_buffer)
-                self.logger.error(f"转换失败，FFmpeg返回码: {process.returncode}")
-                self.logger.error(f"错误输出:\n{stderr_output}")
+            if result.returncode != 0:
+                # 完整输出保存在任务日志中，错误信息只取最后几行
+                stderr_output = '\n'.join(result.error.splitlines()[-5:])
+                self.logger.error(f"转换失败，FFmpeg返回码: {result.returncode}")
+                self.logger.debug(f"错误输出:\n{stderr_output}")
                 # 如果转换失败，删除未完成的输出文件
-                try:
-                    if os.path.exists(target):
-                        os.remove(target)
-                        self.logger.debug(f"已删除失败的输出文件: {target}")
-                except Exception as e:
-                    self.logger.error(f"删除未完成文件失败: {str(e)}")
-                    
+                remove_partial_output(target)
+                
                 if stderr_output:
                     raise Exception(stderr_output)
                 else:
                     raise Exception("转换过程中发生未知错误")
             
+            # 确保在转换完成时显示100%
+            if progress_callback:
+                progress_callback(100)
+            self.logger.info("转换完成")
+            
             # 验证输出文件
             self.logger.debug("正在验证输出文件...")
             if os.path.exists(target):
@@ -338,23 +384,232 @@ class FormatConverter:
             else:
                 raise Exception(f"视频转换失败：{error_msg}")
             
+    def _convert_media_multi(self, source: str, targets: List[str],
+                             progress_callback: Callable[[int], None] = None) -> bool:
+        """
+        一次 ffmpeg 调用输出多个目标：源文件只解复用和解码一次，
+        解码后的帧由 ffmpeg 分发给各输出的编码器，能直接复制的流不解码
+        """
+        self.logger.info(f"开始多输出转换: {source} -> {', '.join(targets)}")
+        info = self._probe_media(source)
+        profile = self._profile()
+        cmd = [self.toolchain.ffmpeg, '-i', source, '-y']
+        for target in targets:
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            target_ext = os.path.splitext(target)[1][1:].lower()
+            if self.type_map.get(target_ext) == 'video':
+                stream_args, _ = self._plan_video_streams(info, target_ext)
+                cmd += stream_args
+                if target_ext in ('mp4', 'm4v', 'mov'):
+                    cmd += ['-movflags', '+faststart']
+            else:
+                audio = info.audio_stream
+                cmd += ['-map', f"0:{audio.index}" if audio else '0:a:0', '-vn', '-sn']
+                cmd += audio_output_args(target_ext, profile)
+            cmd += self._thread_args()
+            cmd.append(target)
+        
+        expected_size = info.size * len(targets)
+        result = self._run_ffmpeg(cmd, info.duration, progress_callback, expected_size)
+        if not result.ok:
+            for target in targets:
+                remove_partial_output(target)
+            if result.cancelled:
+                return False
+            self.logger.error(f"多输出转换失败，FFmpeg返回码: {result.returncode}")
+            raise Exception('\n'.join(result.error.splitlines()[-5:]) or "转换过程中发生未知错误")
+        
+        for target in targets:
+            if not os.path.exists(target) or os.path.getsize(target) == 0:
+                raise Exception(f"输出文件不存在或大小为0: {target}")
+        if progress_callback:
+            progress_callback(100)
+        return True
+        
+    def _plan_video_streams(self, info: MediaInfo, target_ext: str) -> Tuple[List[str], bool]:
+        """
+        根据源文件的流信息生成流映射和编码参数
+        
+        Returns:
+            (ffmpeg 参数列表, 视频流是否直接复制)
+        """
+        video_encoder = self._video_encoder(target_ext)
+        audio_encoder = self._audio_encoder(target_ext)
+        
+        # 没有流信息时保持 ffmpeg 默认的流选择，全部重新编码
+        video_stream = info.video_stream
+        audio_stream = info.audio_stream
+        if video_stream is None and audio_stream is None:
+            return video_encoder + audio_encoder, False
+        
+        profile = self._profile()
+        allow_copy = self.options.get('stream_copy', profile.stream_copy)
+        codecs = CONTAINER_CODECS.get(target_ext, {})
+        args = []
+        copy_video = False
+        if video_stream is not None:
+            args += ['-map', f"0:{video_stream.index}"]
+            copy_video = allow_copy and video_stream.codec_name in codecs.get('video', ())
+            args += ['-c:v', 'copy'] if copy_video else video_encoder
+        if audio_stream is not None:
+            args += ['-map', f"0:{audio_stream.index}"]
+            copy_audio = (allow_copy and audio_stream.codec_name in codecs.get('audio', ()) and
+                          profile.audio_matches(audio_stream.sample_rate, audio_stream.channels))
+            args += ['-c:a', 'copy'] if copy_audio else audio_encoder
+        
+        self.job_log.add(
+            f"视频流: {video_stream.codec_name if video_stream else '无'}"
+            f"{'（直接复制）' if copy_video else ''}，"
+            f"音频流: {audio_stream.codec_name if audio_stream else '无'}"
+        )
+        return args, copy_video
+        
+    def _find_keyframes(self, source: str, split_times: List[float], start_time: float = 0.0) -> List[float]:
+        """
+        查找每个分割点之后的第一个关键帧时间，只读取分割点附近的数据包，不解码
+
+        分割点和返回的关键帧时间都从 0 起算，与输入端 -ss 一致；数据包的 pts_time 是绝对时间戳，
+        起始时间戳（start_time）不为 0 的源文件需要换算
+        """
+        ffprobe_path = self.toolchain.ffprobe
+        intervals = ','.join(f"{start_time + t:.3f}%+30" for t in split_times)
+        result = subprocess.run(
+            [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-read_intervals', intervals,
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', source],
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            creationflags=flags
+        )
+        keyframe_times = []
+        for line in result.stdout.splitlines():
+            parts = line.strip().split(',')
+            if len(parts) >= 2 and 'K' in parts[1]:
+                try:
+                    keyframe_times.append(float(parts[0]) - start_time)
+                except ValueError:
+                    continue
+        keyframe_times.sort()
+        
+        keyframes = []
+        for split_time in split_times:
+            candidate = next((t for t in keyframe_times if t >= split_time), None)
+            if candidate is not None and (not keyframes or candidate > keyframes[-1]):
+                keyframes.append(candidate)
+        return keyframes
+        
+    def _convert_video_segmented(self, source: str, target: str, duration: float,
+                                 progress_callback: Callable[[int], None] = None,
+                                 start_time: float = 0.0) -> bool:
+        """
+        分段并行编码：在关键帧处把视频切成多段，各段由独立的 ffmpeg 进程同时编码，
+        最后用 concat 分离器无损拼接视频流，音频在拼接时从源文件一次性编码
+        """
+        cpu_count = os.cpu_count() or 1
+        segment_count = int(self.options.get('segment_count') or cpu_count)
+        segment_count = max(1, min(segment_count, int(duration // SEGMENT_MIN_SECONDS)))
+        split_times = [duration * i / segment_count for i in range(1, segment_count)]
+        keyframes = self._find_keyframes(source, split_times, start_time) if split_times else []
+        if not keyframes:
+            self.logger.info("未找到可用的分割关键帧，改为整体编码")
+            options = dict(self.options, segmented=False)
+            return self.convert(source, target, progress_callback, options)
+        
+        boundaries = [0.0] + keyframes + [None]
+        segments = list(zip(boundaries[:-1], boundaries[1:]))
+        # 同时编码的段数不超过本任务的线程预算，每段启动时按当时的预算分配线程
+        parallel = min(len(segments), self._thread_budget())
+        self.logger.info(f"分段并行编码: {len(segments)} 段，同时编码 {parallel} 段")
+        
+        target_ext = os.path.splitext(target)[1][1:].lower()
+        video_encoder = self._video_encoder(target_ext)
+        audio_encoder = self._audio_encoder(target_ext)
+        ffmpeg_path = self.toolchain.ffmpeg
+        temp_dir = tempfile.mkdtemp(prefix='format_converter_segments_', dir=os.path.dirname(target) or None)
+        segment_times = [0.0] * len(segments)
+        progress_lock = threading.Lock()
+        abort = threading.Event()
+        
+        def report_progress(index: int, seconds: float):
+            with progress_lock:
+                segment_times[index] = seconds
+                encoded = sum(segment_times)
+            if progress_callback:
+                # 拼接阶段占最后的5%
+                progress_callback(min(int(encoded / duration * 95), 95))
+                
+        def encode_segment(index: int) -> str:
+            start, end = segments[index]
+            segment_file = os.path.join(temp_dir, f"segment_{index:04d}.mkv")
+            cmd = [ffmpeg_path, '-v', 'error', '-y', '-ss', f"{start:.6f}", '-i', source]
+            if end is not None:
+                cmd += ['-t', f"{end - start:.6f}"]
+            cmd += ['-map', '0:v:0', '-an', '-sn'] + video_encoder
+            threads = str(max(1, self._thread_budget() // parallel))
+            cmd += ['-threads', threads, '-filter_threads', threads, segment_file]
+            result = run_ffmpeg(
+                cmd,
+                stats_callback=lambda stats: report_progress(index, stats.out_time),
+                is_cancelled=lambda: self.is_cancelled or abort.is_set(),
+                log=self.job_log,
+            )
+            if result.cancelled:
+                raise Exception("转换被用户取消" if self.is_cancelled else "其他分段编码失败")
+            if result.returncode != 0:
+                raise Exception('\n'.join(result.error.splitlines()[-20:]) or f"第 {index + 1} 段编码失败")
+            return segment_file
+        
+        try:
+            with ThreadPoolExecutor(max_workers=parallel) as executor:
+                futures = [executor.submit(encode_segment, i) for i in range(len(segments))]
+                try:
+                    segment_files = [future.result() for future in futures]
+                except Exception:
+                    # 任意一段失败时停止其余各段
+                    abort.set()
+                    raise
+            
+            # 用 concat 分离器拼接视频流，音频从源文件编码一次，避免分段编码造成的音频间隙
+            list_file = os.path.join(temp_dir, 'segments.txt')
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for segment_file in segment_files:
+                    escaped = segment_file.replace('\\', '/').replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            cmd = [
+                ffmpeg_path, '-v', 'error', '-y',
+                '-f', 'concat', '-safe', '0', '-i', list_file,
+                '-i', source,
+                '-map', '0:v:0', '-map', '1:a:0?',
+                '-c:v', 'copy',
+            ] + audio_encoder
+            if target_ext in ('mp4', 'm4v', 'mov'):
+                cmd += ['-movflags', '+faststart']
+            cmd += self._thread_args()
+            cmd.append(target)
+            result = self._run_ffmpeg(cmd)
+            if result.cancelled:
+                remove_partial_output(target)
+                return False
+            if result.returncode != 0:
+                raise Exception(result.error or "拼接分段失败")
+            
+            if progress_callback:
+                progress_callback(100)
+            return True
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            
     def _convert_video_to_audio(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         """视频转音频"""
         try:
-            # 获取ffprobe路径
-            ffprobe_path = self._get_ffmpeg_executable('ffprobe.exe')
-            
-            # 获取视频时长
-            result = subprocess.run(
-                [ffprobe_path, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', source],
-                capture_output=True,
-                text=True,
-                creationflags=flags
-            )
-            duration = float(result.stdout)
+            # 获取视频时长，未知时按音频流在源文件中的占比估算输出大小
+            info = self._probe_media(source)
+            expected_size = 0
+            if info.audio_stream and info.audio_stream.bit_rate and info.bit_rate:
+                expected_size = int(info.size * info.audio_stream.bit_rate / info.bit_rate)
             
             # 获取ffmpeg路径
-            ffmpeg_path = self._get_ffmpeg_executable('ffmpeg.exe')
+            ffmpeg_path = self.toolchain.ffmpeg
             
             # 构建转换命令
             cmd = [
@@ -362,38 +617,21 @@ class FormatConverter:
                 '-i', source,  # 输入文件
                 '-vn',  # 不处理视频
                 '-y',  # 覆盖已存在的文件
-                target  # 输出文件
-            ]
+            ] + audio_output_args(os.path.splitext(target)[1][1:].lower(), self._profile())
+            cmd += self._thread_args()
+            cmd.append(target)  # 输出文件
             
-            # 启动转换进程
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                creationflags=flags
-            )
+            # 执行转换
+            result = self._run_ffmpeg(cmd, info.duration, progress_callback, expected_size)
+            if not result.ok:
+                remove_partial_output(target)
+                if not result.cancelled:
+                    self.logger.error(f"FFmpeg返回码: {result.returncode}，错误输出:\n{result.error}")
+                return False
             
-            # 读取进度
-            time_pattern = re.compile(r'out_time=(\d+):(\d+):(\d+\.\d+)')
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                    
-                if self.is_cancelled:
-                    process.terminate()
-                    return False
-                    
-                match = time_pattern.search(line)
-                if match:
-                    h, m, s = map(float, match.groups())
-                    current_time = h * 3600 + m * 60 + s
-                    progress = min(int(current_time / duration * 100), 100)
-                    if progress_callback:
-                        progress_callback(progress)
-            
-            return process.returncode == 0
+            if progress_callback:
+                progress_callback(100)
+            return True
             
         except Exception as e:
             self.logger.error(f"视频转音频失败：{e}")
@@ -402,58 +640,32 @@ class FormatConverter:
     def _convert_audio_to_audio(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         """音频转音频"""
         try:
-            # 获取ffprobe路径
-            ffprobe_path = self._get_ffmpeg_executable('ffprobe.exe')
-            
-            # 获取音频时长
-            result = subprocess.run(
-                [ffprobe_path, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', source],
-                capture_output=True,
-                text=True,
-                creationflags=flags
-            )
-            duration = float(result.stdout)
+            # 获取音频时长，未知时按输出大小估算进度
+            info = self._probe_media(source)
             
             # 获取ffmpeg路径
-            ffmpeg_path = self._get_ffmpeg_executable('ffmpeg.exe')
+            ffmpeg_path = self.toolchain.ffmpeg
             
             # 构建转换命令
             cmd = [
                 ffmpeg_path,
                 '-i', source,  # 输入文件
                 '-y',  # 覆盖已存在的文件
-                target  # 输出文件
-            ]
+            ] + audio_output_args(os.path.splitext(target)[1][1:].lower(), self._profile())
+            cmd += self._thread_args()
+            cmd.append(target)  # 输出文件
             
-            # 启动转换进程
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                creationflags=flags
-            )
+            # 执行转换
+            result = self._run_ffmpeg(cmd, info.duration, progress_callback, info.size)
+            if not result.ok:
+                remove_partial_output(target)
+                if not result.cancelled:
+                    self.logger.error(f"FFmpeg返回码: {result.returncode}，错误输出:\n{result.error}")
+                return False
             
-            # 读取进度
-            time_pattern = re.compile(r'out_time=(\d+):(\d+):(\d+\.\d+)')
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                    
-                if self.is_cancelled:
-                    process.terminate()
-                    return False
-                    
-                match = time_pattern.search(line)
-                if match:
-                    h, m, s = map(float, match.groups())
-                    current_time = h * 3600 + m * 60 + s
-                    progress = min(int(current_time / duration * 100), 100)
-                    if progress_callback:
-                        progress_callback(progress)
-            
-            return process.returncode == 0
+            if progress_callback:
+                progress_callback(100)
+            return True
             
         except Exception as e:
             self.logger.error(f"音频转换失败：{e}")
@@ -466,9 +678,8 @@ class FormatConverter:
             if progress_callback:
                 progress_callback(100)
             
-            # 使用PIL库进行图片转换
-            with Image.open(source) as img:
-                img.save(target)
+            # 使用PIL库进行图片转换，max_size、sizes、extra_targets 等选项见 convert_image
+            convert_image(source, target, self.options)
                 
             return True
             
@@ -478,6 +689,9 @@ class FormatConverter:
             
     def _convert_document_to_document(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         try:
+            # 文档相关的库导入较慢，用到时再导入
+            from docx import Document
+            
             # 读取源文档
             doc = Document(source)
             
@@ -495,6 +709,7 @@ class FormatConverter:
     def _convert_document_to_pdf(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         try:
             # 使用pdf2docx进行转换
+            from pdf2docx import Converter
             cv = Converter(source)
             cv.convert(target)
             cv.close()
@@ -510,6 +725,7 @@ class FormatConverter:
     def _convert_pdf_to_document(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
         try:
             # 使用pdf2docx进行转换
+            from pdf2docx import Converter
             cv = Converter(source)
             cv.convert(target)
             cv.close()
@@ -523,43 +739,16 @@ class FormatConverter:
             return False
             
     def _convert_archive_to_archive(self, source: str, target: str, progress_callback: Callable[[int], None] = None) -> bool:
+        """压缩文件转压缩文件，成员逐个流式写入目标，不解压到临时目录"""
         try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix='format_converter_temp_')
-            
-            # 解压源文件
-            if source.endswith('.zip'):
-                with zipfile.ZipFile(source, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-            elif source.endswith(('.tar', '.gz')):
-                with tarfile.open(source, 'r:*') as tar_ref:
-                    tar_ref.extractall(temp_dir)
-                    
-            if progress_callback:
-                progress_callback(50)
-                
-            # 压缩为目标格式
-            if target.endswith('.zip'):
-                with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-                    for root, dirs, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, temp_dir)
-                            zip_ref.write(file_path, arcname)
-            elif target.endswith('.tar'):
-                with tarfile.open(target, 'w') as tar_ref:
-                    tar_ref.add(temp_dir, arcname='')
-            elif target.endswith('.gz'):
-                with tarfile.open(target, 'w:gz') as tar_ref:
-                    tar_ref.add(temp_dir, arcname='')
-                    
-            # 清理临时目录
-            shutil.rmtree(temp_dir)
-            
-            if progress_callback:
-                progress_callback(100)
+            written, skipped = convert_archive(source, target, self.options, progress_callback,
+                                              lambda: self.is_cancelled)
+            if skipped:
+                self.job_log.add(f"已写入 {written} 个成员，跳过 {skipped} 个目标格式无法保存或路径不安全的成员")
             return True
             
         except Exception as e:
             self.logger.error(f"压缩文件转换失败: {str(e)}")
+            self.job_log.add(f"压缩文件转换失败: {str(e)}")
+            remove_partial_output(target)
             return False
\ No newline at end of file
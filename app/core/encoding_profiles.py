@@ -0,0 +1,160 @@
+"""
+编码预设模块
+
+按速度和质量的取舍把编码参数分成几档预设，同一预设对不同编码器给出对应的参数，
+转换器从候选编码器中选用当前 ffmpeg 支持的第一个。
+图片预设按目标格式给出 Pillow 的保存参数。
+"""
+from dataclasses import dataclass
+from typing import Dict, List
+
+DEFAULT_PROFILE = 'balanced'
+
+# 不使用码率参数的无损音频格式
+LOSSLESS_AUDIO_FORMATS = {'wav', 'flac'}
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """ 编码预设 """
+    name: str
+    label: str
+    preset: str              # x264 的 -preset
+    crf: int                 # x264 的 CRF
+    vp9_crf: int             # libvpx-vp9 的 CRF
+    vp9_speed: int           # libvpx 的 -cpu-used，越大越快
+    video_bitrate: str       # 不支持 CRF 的编码器使用的码率
+    wmv_quality: int         # wmv2 的 -q:v，越小质量越高
+    audio_bitrate: str
+    flac_level: int          # flac 的 -compression_level
+    sample_rate: int = 0     # 输出采样率，0 表示保持源文件
+    channels: int = 0        # 输出声道数，0 表示保持源文件
+    stream_copy: bool = True  # 编码兼容时是否允许直接复制流
+
+    def audio_matches(self, sample_rate: int, channels: int) -> bool:
+        """源音频是否已符合预设的采样率和声道数，符合时才能直接复制"""
+        return ((not self.sample_rate or self.sample_rate == sample_rate) and
+                (not self.channels or self.channels == channels))
+
+
+ENCODING_PROFILES: Dict[str, EncodingProfile] = {
+    'fastest': EncodingProfile(
+        name='fastest', label='最快（代理文件）', preset='ultrafast', crf=28,
+        vp9_crf=40, vp9_speed=8, video_bitrate='2M', wmv_quality=8,
+        audio_bitrate='96k', flac_level=0, channels=2,
+    ),
+    'balanced': EncodingProfile(
+        name='balanced', label='均衡', preset='medium', crf=23,
+        vp9_crf=32, vp9_speed=4, video_bitrate='4M', wmv_quality=4,
+        audio_bitrate='128k', flac_level=5,
+    ),
+    'archival': EncodingProfile(
+        name='archival', label='高质量（存档）', preset='slow', crf=18,
+        vp9_crf=24, vp9_speed=1, video_bitrate='8M', wmv_quality=2,
+        audio_bitrate='256k', flac_level=8,
+    ),
+    'smallest': EncodingProfile(
+        name='smallest', label='最小体积', preset='veryslow', crf=30,
+        vp9_crf=42, vp9_speed=2, video_bitrate='1M', wmv_quality=12,
+        audio_bitrate='64k', flac_level=8, sample_rate=44100, channels=2,
+        stream_copy=False,
+    ),
+}
+
+
+def get_profile(name: str = None) -> EncodingProfile:
+    """获取编码预设，未知名称使用默认预设"""
+    return ENCODING_PROFILES.get(name or DEFAULT_PROFILE, ENCODING_PROFILES[DEFAULT_PROFILE])
+
+
+def video_encoder_candidates(target_ext: str, profile: EncodingProfile) -> List[List[str]]:
+    """目标容器的候选视频编码参数，按优先级排列，未列出的容器使用 H.264"""
+    if target_ext == 'webm':
+        return [
+            ['-c:v', 'libvpx-vp9', '-crf', str(profile.vp9_crf), '-b:v', '0',
+             '-cpu-used', str(profile.vp9_speed), '-row-mt', '1'],
+            ['-c:v', 'libvpx', '-b:v', profile.video_bitrate, '-cpu-used', str(profile.vp9_speed)],
+        ]
+    if target_ext == 'wmv':
+        return [['-c:v', 'wmv2', '-q:v', str(profile.wmv_quality)]]
+    return [
+        ['-c:v', 'libx264', '-preset', profile.preset, '-crf', str(profile.crf)],
+        ['-c:v', 'libopenh264', '-b:v', profile.video_bitrate],
+        ['-c:v', 'h264_mf', '-b:v', profile.video_bitrate],
+    ]
+
+
+def audio_encoder_candidates(target_ext: str, profile: EncodingProfile) -> List[List[str]]:
+    """视频容器内的候选音频编码参数，未列出的容器使用 AAC"""
+    if target_ext == 'webm':
+        return [['-c:a', 'libopus', '-b:a', profile.audio_bitrate],
+                ['-c:a', 'libvorbis', '-b:a', profile.audio_bitrate]]
+    if target_ext == 'wmv':
+        return [['-c:a', 'wmav2', '-b:a', profile.audio_bitrate]]
+    if target_ext == 'avi':
+        # AVI 不支持 AAC
+        return [['-c:a', 'libmp3lame', '-b:a', profile.audio_bitrate],
+                ['-c:a', 'mp2', '-b:a', profile.audio_bitrate]]
+    return [['-c:a', 'aac', '-b:a', profile.audio_bitrate]]
+
+
+def audio_format_args(profile: EncodingProfile) -> List[str]:
+    """采样率和声道参数"""
+    args = []
+    if profile.sample_rate:
+        args += ['-ar', str(profile.sample_rate)]
+    if profile.channels:
+        args += ['-ac', str(profile.channels)]
+    return args
+
+
+def audio_output_args(target_ext: str, profile: EncodingProfile) -> List[str]:
+    """音频文件输出参数，编码器由 ffmpeg 按扩展名选择，只设置码率、压缩级别、采样率和声道"""
+    if target_ext == 'flac':
+        args = ['-compression_level', str(profile.flac_level)]
+    elif target_ext in LOSSLESS_AUDIO_FORMATS:
+        args = []
+    else:
+        args = ['-b:a', profile.audio_bitrate]
+    return args + audio_format_args(profile)
+
+
+# 图片编码预设：default 保持 Pillow 的默认参数，fast 编码最快，small 文件最小
+DEFAULT_IMAGE_PROFILE = 'default'
+
+IMAGE_PROFILES: Dict[str, str] = {
+    'default': '默认',
+    'fast': '编码最快',
+    'small': '文件最小',
+}
+
+# 各格式在每个预设下传给 Pillow save() 的参数
+IMAGE_SAVE_ARGS: Dict[str, Dict[str, dict]] = {
+    'jpg': {
+        'fast': {'quality': 85, 'optimize': False, 'progressive': False, 'subsampling': 2},
+        'small': {'quality': 80, 'optimize': True, 'progressive': True, 'subsampling': 2},
+    },
+    'png': {
+        'fast': {'compress_level': 1},
+        'small': {'compress_level': 9, 'optimize': True},
+    },
+    'webp': {
+        'fast': {'quality': 80, 'method': 0},
+        'small': {'quality': 75, 'method': 6},
+    },
+    'gif': {
+        'fast': {'optimize': False},
+        'small': {'optimize': True},
+    },
+    'tiff': {
+        'fast': {'compression': 'raw'},
+        'small': {'compression': 'tiff_adobe_deflate'},
+    },
+}
+IMAGE_SAVE_ARGS['jpeg'] = IMAGE_SAVE_ARGS['jpg']
+IMAGE_SAVE_ARGS['tif'] = IMAGE_SAVE_ARGS['tiff']
+
+
+def image_save_args(target_format: str, profile: str = None) -> dict:
+    """目标格式在图片预设下的保存参数，未列出的格式或默认预设返回空字典"""
+    return dict(IMAGE_SAVE_ARGS.get(target_format, {}).get(profile or DEFAULT_IMAGE_PROFILE, {}))
@@ -0,0 +1,204 @@
+"""
+ffmpeg 进度模块
+
+所有 ffmpeg 调用共用的运行和进度读取：通过 -progress pipe:1 按字节读取键值块，
+每块结束（progress=continue/end）时回调一次；stderr 在后台线程中读取，只保留最后若干行用于报错。
+时长未知时按输出文件大小与预计大小之比估算进度。
+"""
+import os
+import sys
+import logging
+import threading
+import subprocess
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .job_log import JobLog
+
+flags = 0
+if sys.platform == "win32":
+    flags = subprocess.CREATE_NO_WINDOW
+
+# 报错时保留的 stderr 行数
+STDERR_TAIL_LINES = 50
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    """解析 "1.5x"、"1234.5kbits/s" 这样的值，"N/A" 或缺失时返回 None"""
+    if not value:
+        return None
+    try:
+        return float(value.rstrip('x').replace('kbits/s', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class FFmpegProgress:
+    """ 一个 -progress 块中的统计信息 """
+    out_time: float = 0.0          # 已输出的时长（秒）
+    frame: int = 0
+    fps: Optional[float] = None
+    speed: Optional[float] = None  # 相对实时的倍速
+    bitrate: Optional[float] = None  # kbit/s
+    total_size: int = 0            # 已写入的字节数
+    finished: bool = False         # progress=end
+
+    @classmethod
+    def from_block(cls, block: Dict[str, str]) -> 'FFmpegProgress':
+        out_time_us = block.get('out_time_us') or block.get('out_time_ms')
+        try:
+            out_time = max(0.0, int(out_time_us) / 1000000)
+        except (TypeError, ValueError):
+            out_time = 0.0
+        try:
+            frame = int(block.get('frame', 0))
+        except ValueError:
+            frame = 0
+        try:
+            total_size = int(block.get('total_size', 0))
+        except ValueError:
+            total_size = 0
+        return cls(
+            out_time=out_time,
+            frame=frame,
+            fps=_parse_float(block.get('fps')),
+            speed=_parse_float(block.get('speed')),
+            bitrate=_parse_float(block.get('bitrate')),
+            total_size=total_size,
+            finished=block.get('progress') == 'end',
+        )
+
+    def percent(self, duration: Optional[float] = None, expected_size: int = 0) -> Optional[int]:
+        """
+        按时长计算进度百分比，时长未知时按输出大小估算，都无法计算时返回 None
+
+        运行中最多返回 99，100 留给调用方在确认成功后设置。
+        """
+        if duration:
+            return max(0, min(int(self.out_time / duration * 100), 99))
+        if expected_size:
+            return max(0, min(int(self.total_size / expected_size * 100), 99))
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            'out_time': round(self.out_time, 3),
+            'frame': self.frame,
+            'fps': self.fps,
+            'speed': self.speed,
+            'bitrate': self.bitrate,
+            'total_size': self.total_size,
+        }
+
+
+@dataclass
+class FFmpegResult:
+    """ ffmpeg 运行结果 """
+    returncode: int
+    cancelled: bool = False
+    stderr_tail: List[bytes] = field(default_factory=list)  # 原始字节，只在报错时解码
+    last_progress: Optional[FFmpegProgress] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.cancelled
+
+    @property
+    def error(self) -> str:
+        return '\n'.join(line.decode('utf-8', errors='replace').strip() for line in self.stderr_tail)
+
+
+def run_ffmpeg(cmd: List[str],
+               duration: Optional[float] = None,
+               progress_callback: Callable[[int], None] = None,
+               stats_callback: Callable[[FFmpegProgress], None] = None,
+               is_cancelled: Callable[[], bool] = None,
+               expected_size: int = 0,
+               log: JobLog = None) -> FFmpegResult:
+    """
+    运行 ffmpeg 并读取进度
+
+    Args:
+        cmd: ffmpeg 命令，第一个元素为可执行文件，-progress 参数会自动加入
+        duration: 输出的预计时长（秒），用于计算进度
+        progress_callback: 进度回调，参数为 0-99 的整数
+        stats_callback: 统计信息回调，每个 -progress 块回调一次
+        is_cancelled: 返回 True 时终止 ffmpeg
+        expected_size: 时长未知时用于估算进度的预计输出大小（字节），通常为源文件大小
+        log: 任务日志，记录命令和 stderr 的原始输出
+    """
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    if log is not None:
+        log.add_command(cmd)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"FFmpeg命令: {' '.join(cmd)}")
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        creationflags=flags
+    )
+
+    # stderr 在后台读取，避免管道写满阻塞 ffmpeg；只保存原始字节，不解码
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for raw in process.stderr:
+            if raw.strip():
+                stderr_tail.append(raw)
+                if log is not None:
+                    log.add(raw)
+
+    stderr_reader = threading.Thread(target=drain_stderr, name='FFmpegStderr', daemon=True)
+    stderr_reader.start()
+
+    cancelled = False
+    last_progress = None
+    last_percent = -1
+    block: Dict[str, str] = {}
+    for raw in process.stdout:
+        if is_cancelled is not None and is_cancelled():
+            cancelled = True
+            process.terminate()
+            break
+        key, sep, value = raw.decode('utf-8', errors='replace').strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value.strip()
+        if key != 'progress':
+            continue
+
+        last_progress = FFmpegProgress.from_block(block)
+        block = {}
+        if stats_callback is not None:
+            stats_callback(last_progress)
+        percent = last_progress.percent(duration, expected_size)
+        if progress_callback is not None and percent is not None and percent != last_percent:
+            last_percent = percent
+            progress_callback(percent)
+
+    process.wait()
+    stderr_reader.join()
+    if cancelled:
+        logger.info("ffmpeg 已被取消")
+    return FFmpegResult(
+        returncode=process.returncode,
+        cancelled=cancelled,
+        stderr_tail=list(stderr_tail),
+        last_progress=last_progress,
+    )
+
+
+def remove_partial_output(target: str):
+    """删除未完成或失败的输出文件"""
+    try:
+        if os.path.exists(target):
+            os.remove(target)
+            logger.debug(f"已删除未完成的输出文件: {target}")
+    except OSError as e:
+        logger.error(f"删除未完成文件失败: {str(e)}")
@@ -0,0 +1,85 @@
+"""
+文件枚举模块
+"""
+import os
+from typing import Callable, Iterable, Iterator, Optional, Set, Tuple
+
+from .format_mapping import can_convert, get_source_formats
+
+
+def get_convertible_extensions(target_format: str) -> Set[str]:
+    """获取可以转换为目标格式的源文件扩展名"""
+    return {fmt for fmt in get_source_formats() if can_convert(fmt, target_format)}
+
+
+def iter_source_files(paths: Iterable[str], extensions: Set[str] = None,
+                      is_cancelled: Callable[[], bool] = None) -> Iterator[Tuple[str, str]]:
+    """
+    逐个枚举文件和文件夹中受支持的源文件，文件夹使用 os.scandir 递归遍历
+    
+    Args:
+        paths: 文件或文件夹路径
+        extensions: 允许的扩展名（小写，不含点号），为空时使用所有支持的源格式
+        is_cancelled: 返回 True 时停止枚举
+        
+    Returns:
+        (文件路径, 相对路径) 的迭代器，相对路径以拖入的文件夹名开头，用于在输出目录中还原目录结构
+    """
+    if extensions is None:
+        extensions = get_source_formats()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            if _extension(path) in extensions:
+                yield path, os.path.basename(path)
+            continue
+        if not os.path.isdir(path):
+            continue
+
+        base_dir = os.path.dirname(path)
+        stack = [path]
+        while stack:
+            if is_cancelled and is_cancelled():
+                return
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    sub_dirs = []
+                    for entry in entries:
+                        try:
+                            # 不跟随符号链接目录，避免循环
+                            if entry.is_dir(follow_symlinks=False):
+                                sub_dirs.append(entry.path)
+                            elif entry.is_file() and _extension(entry.name) in extensions:
+                                yield entry.path, os.path.relpath(entry.path, base_dir)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            # 倒序入栈，使子目录按名称顺序遍历
+            stack.extend(sorted(sub_dirs, reverse=True))
+
+
+def build_target_path(source_file: str, relative_path: str, target_format: str,
+                      output_root: Optional[str] = None, mirror_tree: bool = False) -> str:
+    """
+    生成目标文件路径
+    
+    Args:
+        source_file: 源文件路径
+        relative_path: iter_source_files 返回的相对路径
+        target_format: 目标格式（不含点号）
+        output_root: 输出根目录，为空时保存到源文件所在目录
+        mirror_tree: 是否在输出根目录下还原源目录结构
+    """
+    source_name = os.path.splitext(os.path.basename(source_file))[0]
+    target_name = f"{source_name}.{target_format.lower()}"
+    if not output_root:
+        return os.path.join(os.path.dirname(source_file), target_name)
+    if mirror_tree:
+        return os.path.join(output_root, os.path.dirname(relative_path), target_name)
+    return os.path.join(output_root, target_name)
+
+
+def _extension(path: str) -> str:
+    return os.path.splitext(path)[1][1:].lower()
@@ -161,4 +161,49 @@ def get_target_formats(source_format: str) -> dict:
             if format_list:  # 只添加非空的类别
                 result[FORMAT_CATEGORIES[category]] = format_list
     
-    return result 
\ No newline at end of file
+    return result 
+
+def _format_mappings():
+    return (VIDEO_FORMATS, AUDIO_FORMATS, IMAGE_FORMATS, DOCUMENT_FORMATS)
+
+
+def get_source_formats() -> set:
+    """获取所有支持的源文件格式（不含点号）"""
+    formats = set()
+    for mapping in _format_mappings():
+        formats.update(mapping)
+    return formats
+
+
+def get_all_target_formats() -> dict:
+    """获取所有可转换到的目标格式，按类别分组，用于批量任务选择目标格式"""
+    grouped = {}
+    for mapping in _format_mappings():
+        for targets in mapping.values():
+            for category, format_list in targets.items():
+                grouped.setdefault(category, set()).update(format_list)
+    return {
+        FORMAT_CATEGORIES[category]: sorted(format_list)
+        for category, format_list in grouped.items()
+        if format_list
+    }
+
+
+def can_convert(source_format: str, target_format: str) -> bool:
+    """判断源格式能否转换为目标格式"""
+    target_format = target_format.lower()
+    for format_list in get_target_formats(source_format).values():
+        if target_format in format_list:
+            return True
+    return False
+
+
+def get_format_category(fmt: str) -> str:
+    """获取格式所属的类别（video/audio/image/document），未知格式返回空字符串"""
+    fmt = fmt.lower()
+    for mapping in _format_mappings():
+        for source_format, targets in mapping.items():
+            for category, format_list in targets.items():
+                if fmt in format_list:
+                    return category
+    return ''
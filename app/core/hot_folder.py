@@ -0,0 +1,180 @@
+"""
+监视文件夹模块
+
+把放入收件文件夹的新文件自动交给转换队列。文件的大小和修改时间在一段时间内不再变化后才提交，
+同一文件的多次文件系统事件只对应一个任务。
+
+界面由 QFileSystemWatcher 通知哪些目录有变化（见 app.common.hot_folder_watcher），
+命令行没有 Qt 事件循环，按固定间隔调用 HotFolder.poll()，只重新列出修改时间变化过的目录，
+不重新遍历整个目录树。
+"""
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .file_scanner import get_convertible_extensions
+
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# 目录修改时间距今不足该秒数时仍视为有变化：部分文件系统的时间精度只有 1~2 秒，
+# 同一时间单位内的后续改动不会改变目录的修改时间
+RACY_SECONDS = 2.0
+
+# 下载中、写入中的临时文件
+TEMP_SUFFIXES = ('.tmp', '.part', '.crdownload', '.download', '~')
+
+# 每隔多少秒清理一次已返回但已被删除或移走的文件记录
+PRUNE_SECONDS = 60.0
+
+
+def is_temporary(name: str) -> bool:
+    """隐藏文件、写入中的临时文件和转换器自身的 .partial- 临时输出不作为源文件"""
+    lower = name.lower()
+    return lower.startswith('.') or lower.endswith(TEMP_SUFFIXES) or '.partial-' in lower
+
+
+class StabilityTracker:
+    """ 等待文件停止增长
+
+    add() 登记新出现的文件；poll() 检查登记的文件，大小和修改时间连续 settle_seconds 未变化的文件
+    视为写入完成并返回。已返回的文件只有内容再次变化后才会重新返回，重复的事件不会产生重复任务；
+    已返回的文件被删除或移走（例如转换后移出收件文件夹）后，记录在之后的 poll() 中清理。
+    """
+
+    def __init__(self, settle_seconds: float = DEFAULT_SETTLE_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        # 等待中的文件：路径 -> ((大小, 修改时间), 最近一次变化的时刻)
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        # 已返回的文件：路径 -> 返回时的 (大小, 修改时间)
+        self._done: Dict[str, Tuple[int, int]] = {}
+        self._pruned_at = clock()
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def add(self, path: str):
+        if path in self._pending:
+            return
+        signature = self._signature(path)
+        if signature is None or self._done.get(path) == signature:
+            return
+        self._pending[path] = (signature, self.clock())
+
+    def poll(self, limit: int = None) -> List[str]:
+        """返回已稳定的文件，limit 限制单次返回的数量，其余留到下次"""
+        now = self.clock()
+        ready = []
+        for path, (signature, changed_at) in list(self._pending.items()):
+            current = self._signature(path)
+            if current is None:
+                # 文件在稳定前被删除或移走
+                del self._pending[path]
+            elif current != signature:
+                self._pending[path] = (current, now)
+            elif now - changed_at >= self.settle_seconds and (limit is None or len(ready) < limit):
+                del self._pending[path]
+                self._done[path] = current
+                ready.append(path)
+        if now - self._pruned_at >= PRUNE_SECONDS:
+            # 已返回的文件只在这里按间隔检查一次，不随每次 poll() 逐个 stat
+            self._pruned_at = now
+            for path in [path for path in self._done if not os.path.exists(path)]:
+                del self._done[path]
+        return ready
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+class HotFolder:
+    """ 监视一个文件夹（含子文件夹），产出可以转换为目标格式的新文件
+
+    目录变化由调用方通过 mark_dirty() 通知，或由 poll() 按目录修改时间自行检查；
+    tick() 重新列出有变化的目录、登记新文件，并返回已稳定的 (源文件, 相对路径)，
+    相对路径与 iter_source_files 相同，以监视的文件夹名开头。
+    """
+
+    def __init__(self, root: str, target_formats: Iterable[str], exclude: Iterable[str] = (),
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS, recursive: bool = True):
+        self.root = os.path.abspath(root)
+        self.recursive = recursive
+        target_formats = [fmt.lower().lstrip('.') for fmt in target_formats]
+        self.extensions: Set[str] = set()
+        for fmt in target_formats:
+            self.extensions |= get_convertible_extensions(fmt)
+        # 输出到监视的文件夹时，转换结果本身不能再作为源文件
+        self.extensions -= set(target_formats)
+        # 位于监视范围内的输出目录不监视
+        self.exclude = {os.path.abspath(path) for path in exclude if path}
+        self.tracker = StabilityTracker(settle_seconds)
+        # 已知目录 -> 上次列出时的修改时间
+        self._directories: Dict[str, int] = {}
+        self._dirty: Set[str] = {self.root}
+        self._reported: Set[str] = set()
+
+    def mark_dirty(self, directory: str):
+        """通知目录内容有变化，下次 tick() 时重新列出"""
+        self._dirty.add(os.path.abspath(directory))
+
+    def poll(self, limit: int = None) -> List[Tuple[str, str]]:
+        """没有文件系统通知时使用：把修改时间变化过的目录标记为有变化，再执行 tick()"""
+        now = time.time_ns()
+        for directory, mtime_ns in list(self._directories.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._directories.pop(directory, None)
+                self._reported.discard(directory)
+                continue
+            if current != mtime_ns or now - current < RACY_SECONDS * 1e9:
+                self._dirty.add(directory)
+        return self.tick(limit)
+
+    def tick(self, limit: int = None) -> List[Tuple[str, str]]:
+        """列出有变化的目录并返回已稳定的新文件"""
+        dirty, self._dirty = self._dirty, set()
+        for directory in dirty:
+            self._scan(directory)
+        base_dir = os.path.dirname(self.root)
+        return [(path, os.path.relpath(path, base_dir)) for path in self.tracker.poll(limit)]
+
+    def new_directories(self) -> List[str]:
+        """自上次调用以来新发现的目录，界面据此添加 QFileSystemWatcher 的监视路径"""
+        new = [directory for directory in self._directories if directory not in self._reported]
+        self._reported.update(new)
+        return new
+
+    def _scan(self, directory: str):
+        """列出目录中的文件，新出现的子目录（例如整个文件夹拖入）一并列出"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if current in self.exclude:
+                continue
+            try:
+                mtime_ns = os.stat(current).st_mtime_ns
+                with os.scandir(current) as entries:
+                    entries = list(entries)
+            except OSError:
+                self._directories.pop(current, None)
+                self._reported.discard(current)
+                continue
+            self._directories[current] = mtime_ns
+            for entry in entries:
+                if is_temporary(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and entry.path not in self._directories:
+                            stack.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1][1:].lower() in self.extensions:
+                        self.tracker.add(entry.path)
+                except OSError:
+                    continue
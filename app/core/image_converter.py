@@ -0,0 +1,348 @@
+"""
+图片转换模块
+
+只依赖 PIL，不导入 Qt 及文档相关的库，便于在图片转换子进程中单独导入
+"""
+import os
+import itertools
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageSequence, TiffImagePlugin
+
+from .large_image import convert_large_image, decoded_size, memory_limit
+from .encoding_profiles import image_save_args
+
+# 临时关闭 Pillow 像素数检查时使用，避免多个线程交错保存、恢复后检查一直处于关闭状态
+_pixel_check_lock = threading.Lock()
+
+# 整数倍缩小后至少保留目标尺寸的倍数，余下部分交给高质量重采样
+REDUCE_MARGIN = 2
+
+# 可保存多帧的目标格式，png 保存为 APNG，tiff 保存为多页 TIFF
+ANIMATED_FORMATS = {'gif', 'webp', 'png', 'tiff'}
+
+# JPEG 只能保存这些模式，其他模式（调色板、带透明通道）先转为 RGB
+JPEG_MODES = {'RGB', 'L', 'CMYK'}
+
+# 可写入 EXIF、ICC、XMP 的目标格式
+METADATA_FORMATS = {'jpg', 'jpeg', 'png', 'webp', 'tif', 'tiff'}
+
+# ICO 默认包含的图标边长，与 Pillow 的默认值相同；ICO 单个图标最大 256 像素
+ICO_SIZES = (256, 128, 64, 48, 32, 24, 16)
+ICO_MAX_EDGE = 256
+
+# ICO 中以 PNG 保存的图标可用的模式，其他模式转为 RGBA
+ICO_MODES = {'RGBA', 'RGB', 'LA', 'L', 'P'}
+
+
+def parse_max_size(value) -> Optional[Tuple[int, int]]:
+    """
+    解析尺寸上限，支持 1280、"1280"（最长边）和 "1280x720"、[1280, 720]（宽高边界）
+
+    Returns:
+        (最大宽度, 最大高度)，未设置时返回 None
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        parts = value.lower().replace('*', 'x').split('x')
+        value = [int(part) for part in parts] if len(parts) == 2 else int(parts[0])
+    if isinstance(value, int):
+        value = (value, value)
+    width, height = (int(part) for part in value)
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的尺寸: {value}")
+    return width, height
+
+
+def parse_sizes(value) -> List[int]:
+    """
+    解析多尺寸输出的边长列表，支持 [320, 1280] 和 "320,1280"
+
+    Returns:
+        去重后从大到小排列的最长边列表，未设置时返回空列表
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.replace(' ', '').split(',') if part]
+    elif isinstance(value, int):
+        value = [value]
+    sizes = sorted({int(edge) for edge in value}, reverse=True)
+    if sizes[-1] <= 0:
+        raise ValueError(f"无效的尺寸: {value}")
+    return sizes
+
+
+def rendition_target(target: str, edge: int) -> str:
+    """多尺寸输出中某个尺寸的文件名，例如 photo.webp -> photo-320.webp"""
+    root, ext = os.path.splitext(target)
+    return f"{root}-{edge}{ext}"
+
+
+def image_outputs(target: str, options: dict = None) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+    """
+    图片任务的全部输出 (目标文件, 尺寸上限)
+
+    目标为 target 和 options['extra_targets']；设置了 options['sizes'] 时每个目标按各个边长
+    输出一个文件（见 rendition_target），ICO 目标则把这些边长作为图标尺寸写入同一个文件。
+    """
+    options = options or {}
+    max_size = parse_max_size(options.get('max_size'))
+    sizes = parse_sizes(options.get('sizes'))
+    outputs = []
+    for path in [target] + list(options.get('extra_targets') or []):
+        if sizes and _format_of(path) != 'ico':
+            outputs += [(rendition_target(path, edge), (edge, edge)) for edge in sizes]
+        else:
+            outputs.append((path, max_size))
+    return outputs
+
+
+def _format_of(path: str) -> str:
+    return os.path.splitext(path)[1][1:].lower()
+
+
+def fit_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """按比例缩小到边界以内的尺寸，不放大"""
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def open_scaled(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    把图片缩小到 size
+
+    先用 reduce() 做整数倍的盒式缩小，再用 LANCZOS 重采样到目标尺寸；
+    JPEG 应先调用 draft()（见 convert_image），由解码器直接输出 DCT 缩小后的图像。
+    """
+    if img.mode == 'P':
+        # 调色板图片重采样只能取最近邻，先转为真彩色
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    factor = min(img.width // (size[0] * REDUCE_MARGIN), img.height // (size[1] * REDUCE_MARGIN))
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    return img
+
+
+def iter_frames(img: Image.Image, size: Tuple[int, int] = None) -> Iterator[Image.Image]:
+    """
+    逐帧解码多帧图片，size 不为空时缩小每一帧
+
+    调色板帧统一转为真彩色（GIF 只有第一帧是调色板模式）；带时长的动画帧与上一帧完全相同时
+    只累加时长，不重复输出。任一时刻只持有当前帧和待输出的上一帧。
+    """
+    pending = None
+    pending_bytes = None
+    for frame in ImageSequence.Iterator(img):
+        current = frame.copy()
+        # WebP 等格式在解码后才更新当前帧的时长
+        duration = frame.info.get('duration')
+        if current.mode == 'P':
+            current = current.convert('RGBA' if 'transparency' in current.info else 'RGB')
+        if size:
+            current = open_scaled(current, size)
+        if duration is None:
+            # 多页 TIFF 等没有时长的页面不合并
+            if pending is not None:
+                yield pending
+            pending, pending_bytes = current, None
+            continue
+        current.info['duration'] = duration
+        current_bytes = current.tobytes()
+        if (pending is not None and pending_bytes == current_bytes and
+                pending.mode == current.mode and pending.size == current.size):
+            pending.info['duration'] += duration
+            continue
+        if pending is not None:
+            yield pending
+        pending, pending_bytes = current, current_bytes
+    if pending is not None:
+        yield pending
+
+
+def save_args(img: Image.Image, output_mode: str, target_format: str, options: dict) -> dict:
+    """
+    传给 Pillow save() 的参数：图片预设（options['image_profile']）的编码参数，
+    以及保留或移除（options['strip_metadata']）的 EXIF、ICC、XMP
+    """
+    args = image_save_args(target_format, options.get('image_profile'))
+    if target_format not in METADATA_FORMATS:
+        return args
+    if options.get('strip_metadata'):
+        # 部分编码器会沿用 info 中的 ICC，显式置空
+        args.update(exif=b'', icc_profile=None, xmp=b'')
+        return args
+    for key in ('exif', 'xmp'):
+        if img.info.get(key):
+            args[key] = img.info[key]
+    # 色彩模式改变后原 ICC 不再适用
+    if img.info.get('icc_profile') and output_mode == img.mode:
+        args['icc_profile'] = img.info['icc_profile']
+    return args
+
+
+def save_frames(img: Image.Image, target: str, target_format: str, size: Tuple[int, int] = None,
+                args: dict = None):
+    """
+    逐帧保存多帧图片
+
+    TIFF 用 AppendingTiffWriter 每解码一帧就写入一页，内存只占一帧；GIF、WebP、APNG 交给 Pillow 的
+    save_all，这些编码器需要比较前后帧，会持有去重后的各帧，各帧时长在消费时依次记录。
+    args 为 save_args 生成的保存参数。
+    """
+    args = args or {}
+    frames = iter_frames(img, size)
+    first = next(frames)
+    if target_format == 'tiff':
+        with TiffImagePlugin.AppendingTiffWriter(target, new=True) as writer:
+            for frame in itertools.chain([first], frames):
+                frame.save(writer, format='TIFF', **args)
+                writer.newFrame()
+        return
+
+    durations = [first.info.get('duration', 0)]
+
+    def remaining_frames():
+        for frame in frames:
+            durations.append(frame.info.get('duration', 0))
+            yield frame
+
+    append_images = remaining_frames()
+    if target_format == 'png':
+        # Pillow 的 APNG 编码器会多次遍历 append_images，只能传入列表
+        append_images = list(append_images)
+    first.save(target, save_all=True, append_images=append_images,
+               duration=durations, loop=img.info.get('loop', 0), **args)
+
+
+def scale_from(renditions: List[Image.Image], size: Tuple[int, int]) -> Image.Image:
+    """
+    从已生成的图片中选不小于 size 的最小一张缩小到 size，结果加入 renditions
+
+    多个尺寸按从大到小的顺序生成时，每个尺寸都从上一级中间结果缩小，而不是每次都从原图缩小。
+    """
+    larger = [im for im in renditions if im.width >= size[0] and im.height >= size[1]]
+    source = min(larger, key=lambda im: im.width * im.height) if larger else renditions[0]
+    if source.size == size:
+        return source
+    output = open_scaled(source, size)
+    renditions.append(output)
+    return output
+
+
+def ico_sizes(img_size: Tuple[int, int], options: dict) -> List[Tuple[int, int]]:
+    """
+    ICO 各图标的尺寸，由 options['sizes'] 指定边长，不超过原图
+
+    ICO 无法保存超过 256 像素的图标，这样的边长直接忽略；没有可用的边长时使用 ICO_SIZES。
+    """
+    edges = [edge for edge in parse_sizes(options.get('sizes')) if edge <= ICO_MAX_EDGE]
+    if not edges:
+        edges = ICO_SIZES
+    sizes = []
+    for edge in edges:
+        size = fit_size(img_size, (edge, edge))
+        if size not in sizes:
+            sizes.append(size)
+    return sizes
+
+
+def save_output(img: Image.Image, output: Image.Image, target: str, target_format: str, options: dict):
+    """按目标格式保存一张图片，img 为源图片，用于取元数据"""
+    if target_format in ('jpg', 'jpeg') and output.mode not in JPEG_MODES:
+        output = output.convert('RGB')
+    if options.get('strip_metadata') and hasattr(output, 'tag_v2'):
+        # TIFF 编码器会从源 TIFF 的标签中复制 XMP、IPTC 等信息
+        output = output.copy()
+    output.save(target, **save_args(img, output.mode, target_format, options))
+
+
+def save_ico(renditions: List[Image.Image], target: str, sizes: List[Tuple[int, int]]):
+    """把各尺寸的图标写入一个 ICO 文件，每个尺寸都从上一级缩小"""
+    frames = []
+    for size in sizes:
+        frame = scale_from(renditions, size)
+        frames.append(frame if frame.mode in ICO_MODES else frame.convert('RGBA'))
+    # 传入与各帧尺寸一致的 sizes，Pillow 直接使用这些帧而不再从第一帧缩小
+    frames[0].save(target, format='ICO', sizes=[frame.size for frame in frames], append_images=frames[1:])
+
+
+def open_image(source: str) -> Image.Image:
+    """
+    打开图片但不解码，只读取文件头
+
+    Pillow 按像素数的解压炸弹检查只在这里临时关闭，由 convert_image 按 memory_limit_mb 判断：
+    超过上限的 TIFF 按条带处理，其他格式直接报错。进程中其他地方打开图片时仍有 Pillow 的默认检查。
+    """
+    with _pixel_check_lock:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(source)
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+
+
+def convert_image(source: str, target: str, options: dict = None):
+    """
+    图片转图片，失败时抛出异常
+
+    options 中的 max_size 限制输出尺寸，见 parse_max_size；memory_limit_mb 为解码的内存上限，
+    超过上限的 TIFF 按条带处理，见 large_image；image_profile 和 strip_metadata 见 save_args。
+    extra_targets 和 sizes 指定多个输出（见 image_outputs），源文件只解码一次，
+    各尺寸从大到小依次由上一级缩小得到。
+    多帧源文件转为 GIF、WebP、PNG、TIFF 时保留全部帧，转为其他格式时只保存第一帧
+    """
+    options = options or {}
+    with open_image(source) as img:
+        # 尺寸都按原图计算，draft() 之后 img.size 会变
+        icon_sizes = ico_sizes(img.size, options)
+        outputs = []
+        for path, max_size in image_outputs(target, options):
+            target_format = _format_of(path)
+            if target_format == 'ico':
+                size = icon_sizes[0]
+            else:
+                size = fit_size(img.size, max_size) if max_size else img.size
+            outputs.append((path, target_format, size))
+        # 从大到小生成，较小的尺寸由较大的中间结果缩小
+        outputs.sort(key=lambda output: output[2][0] * output[2][1], reverse=True)
+        largest = outputs[0][2]
+        if img.format == 'JPEG' and largest != img.size:
+            # 解码器按 1/2、1/4、1/8 直接输出 DCT 缩小后的图像，之后的内存估算基于缩小后的尺寸
+            img.draft(img.mode, (largest[0] * REDUCE_MARGIN, largest[1] * REDUCE_MARGIN))
+
+        limit = memory_limit(options)
+        if decoded_size(img) > limit:
+            # 原尺寸的输出逐条带写入，需要缩小的输出共用一次按条带缩小的结果
+            for path, target_format, size in outputs:
+                if size == img.size:
+                    args = image_save_args(target_format, options.get('image_profile'))
+                    convert_large_image(img, path, target_format, size, limit, args)
+            outputs = [output for output in outputs if output[2] != img.size]
+            if not outputs:
+                return
+            renditions = [convert_large_image(img, None, None, outputs[0][2], limit)]
+        else:
+            if getattr(img, 'n_frames', 1) > 1:
+                # 多帧目标逐个保存全部帧，其余目标只用第一帧
+                for path, target_format, size in outputs:
+                    if target_format in ANIMATED_FORMATS:
+                        save_frames(img, path, target_format, size if size != img.size else None,
+                                    save_args(img, img.mode, target_format, options))
+                outputs = [output for output in outputs if output[1] not in ANIMATED_FORMATS]
+                if not outputs:
+                    return
+                img.seek(0)
+            renditions = [img]
+
+        for path, target_format, size in outputs:
+            if target_format == 'ico':
+                save_ico(renditions, path, icon_sizes)
+            else:
+                save_output(img, scale_from(renditions, size), path, target_format, options)
@@ -0,0 +1,136 @@
+"""
+图片转换进程池模块
+
+Pillow 的编码器在保存 WebP、PNG、TIFF 等格式时会长时间持有 GIL，
+线程池中的图片任务几乎只能用满一个核心，因此图片任务可以交给子进程执行。
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from .image_converter import convert_image
+
+# 子进程中的全局取消标志，以及已取消任务的标识（由 Manager 进程共享的字典）
+_cancel_event = None
+_cancelled_jobs = None
+
+
+def _init_worker(cancel_event, cancelled_jobs):
+    """子进程初始化"""
+    global _cancel_event, _cancelled_jobs
+    _cancel_event = cancel_event
+    _cancelled_jobs = cancelled_jobs
+
+
+def _is_cancelled(job_key: str) -> bool:
+    if _cancel_event is not None and _cancel_event.is_set():
+        return True
+    try:
+        return _cancelled_jobs is not None and job_key in _cancelled_jobs
+    except (OSError, EOFError):
+        # Manager 进程已退出，说明进程池正在关闭
+        return True
+
+
+def _convert_chunk(items: List[Tuple[str, str, str, dict]]) -> List[Tuple[bool, str]]:
+    """在子进程中依次转换一块图片，返回每个文件的 (是否成功, 错误信息)"""
+    results = []
+    for job_key, source, target, options in items:
+        if _is_cancelled(job_key):
+            results.append((False, "转换已取消"))
+            continue
+        try:
+            target_dir = os.path.dirname(target)
+            if target_dir:
+                os.makedirs(target_dir, exist_ok=True)
+            convert_image(source, target, options)
+            results.append((True, ''))
+        except Exception as e:
+            results.append((False, str(e)))
+    return results
+
+
+class ImageProcessPool:
+    """ 图片转换进程池，按块分发任务以摊薄进程间通信开销 """
+
+    def __init__(self, max_workers: int = None, chunk_size: int = 16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cancel_event = None
+        self._manager = None
+        self._cancelled_jobs = None
+        self._lock = threading.Lock()
+
+    def chunk_size_for(self, pending: int) -> int:
+        """根据排队数量计算本次分块大小，任务较少时尽量分散到所有进程"""
+        per_worker = -(-pending // self.max_workers)
+        return max(1, min(self.chunk_size, per_worker))
+
+    def submit(self, items: List[Tuple[str, str, str, dict]]) -> Future:
+        """
+        提交一块 (任务标识, 源文件, 目标文件, 转换选项) 列表，Future 的结果为逐个文件的转换结果
+
+        任务标识用于 cancel_job()：子进程在转换每个文件前检查，已取消的任务直接跳过。
+        """
+        with self._lock:
+            if self._executor is None:
+                self._start_executor()
+            try:
+                return self._executor.submit(_convert_chunk, list(items))
+            except BrokenProcessPool:
+                # 子进程异常退出后进程池不可再用，重建后重试一次
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._start_executor()
+                return self._executor.submit(_convert_chunk, list(items))
+
+    def cancel_job(self, job_key: str):
+        """通知子进程跳过该任务尚未开始的文件，块中其他任务的文件照常转换"""
+        with self._lock:
+            if self._cancelled_jobs is None:
+                return
+            try:
+                self._cancelled_jobs[job_key] = True
+            except (OSError, EOFError):
+                pass
+
+    def forget_jobs(self, job_keys: List[str]):
+        """块完成后清除其中任务的取消标记"""
+        with self._lock:
+            if self._cancelled_jobs is None:
+                return
+            for job_key in job_keys:
+                try:
+                    self._cancelled_jobs.pop(job_key, None)
+                except (OSError, EOFError):
+                    return
+
+    def _start_executor(self):
+        # 使用 spawn 启动子进程，避免在带有 Qt 和工作线程的进程中 fork
+        context = multiprocessing.get_context('spawn')
+        self._cancel_event = context.Event()
+        if self._manager is None:
+            self._manager = context.Manager()
+            self._cancelled_jobs = self._manager.dict()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._cancel_event, self._cancelled_jobs)
+        )
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池，未开始的块直接取消，进行中的块在当前文件完成后停止"""
+        with self._lock:
+            if self._executor is None:
+                return
+            self._cancel_event.set()
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+                self._cancelled_jobs = None
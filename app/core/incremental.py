@@ -0,0 +1,118 @@
+"""
+增量转换模块
+
+在输出目录中保存旁路索引（.gsgc-index.db），记录每个输出文件由哪个源文件内容、以什么设置生成。
+重新运行批量转换时，输出已是最新的任务在开始转换前直接跳过，只转换新增或改动过的文件。
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List
+
+from .result_cache import fingerprint, recipe_digest
+
+INDEX_NAME = '.gsgc-index.db'
+
+
+class IncrementalIndex:
+    """ 输出目录的旁路索引
+
+    每个输出文件记录：生成它的源文件的大小、修改时间和内容指纹，转换设置和工具链的摘要（见 recipe_digest），
+    以及输出文件自身的大小和修改时间。输出文件被改动或删除、设置变化、源文件内容变化时都不再是最新。
+    源文件的大小和修改时间未变时不重新计算指纹，只改了修改时间的源文件计算指纹后仍视为最新。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def _connect(self, directory: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(os.path.join(directory, INDEX_NAME), timeout=10)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            ' name TEXT PRIMARY KEY,'
+            ' recipe TEXT NOT NULL,'
+            ' source_size INTEGER NOT NULL,'
+            ' source_mtime_ns INTEGER NOT NULL,'
+            ' source_fingerprint TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        return conn
+
+    @staticmethod
+    def _by_directory(targets: List[str]) -> Dict[str, List[str]]:
+        groups = defaultdict(list)
+        for target in targets:
+            groups[os.path.dirname(os.path.abspath(target))].append(target)
+        return groups
+
+    def is_up_to_date(self, source_file: str, target_file: str, targets: List[str], options: dict,
+                      toolchain: str = '') -> bool:
+        """任务的全部输出是否都由当前的源文件内容以相同设置和工具链生成，且之后未被改动"""
+        try:
+            source_stat = os.stat(source_file)
+            recipe = recipe_digest(target_file, options, toolchain)
+            rows = []
+            for directory, group in self._by_directory(targets).items():
+                if not os.path.exists(os.path.join(directory, INDEX_NAME)):
+                    return False
+                conn = self._connect(directory)
+                try:
+                    for target in group:
+                        row = conn.execute(
+                            'SELECT recipe, source_size, source_mtime_ns, source_fingerprint, size, mtime_ns '
+                            'FROM outputs WHERE name = ?', (os.path.basename(target),)
+                        ).fetchone()
+                        if row is None:
+                            return False
+                        rows.append((target, row))
+                finally:
+                    conn.close()
+
+            source_fingerprint = None
+            for target, (row_recipe, source_size, source_mtime_ns, row_fingerprint, size, mtime_ns) in rows:
+                if row_recipe != recipe:
+                    return False
+                stat = os.stat(target)
+                if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                    return False
+                if source_stat.st_size == source_size and source_stat.st_mtime_ns == source_mtime_ns:
+                    continue
+                if source_fingerprint is None:
+                    source_fingerprint = fingerprint(source_file)
+                if source_fingerprint != row_fingerprint:
+                    return False
+            return True
+        except (OSError, sqlite3.Error) as e:
+            self.logger.debug(f"读取增量索引失败，按需要转换处理: {e}")
+            return False
+
+    def record(self, source_file: str, target_file: str, targets: List[str], options: dict,
+               toolchain: str = ''):
+        """记录任务的各输出文件，失败时只记录日志"""
+        try:
+            source_stat = os.stat(source_file)
+            source_fingerprint = fingerprint(source_file)
+            recipe = recipe_digest(target_file, options, toolchain)
+            now = time.time()
+            with self._lock:
+                for directory, group in self._by_directory(targets).items():
+                    rows = []
+                    for target in group:
+                        stat = os.stat(target)
+                        rows.append((os.path.basename(target), recipe, source_stat.st_size,
+                                     source_stat.st_mtime_ns, source_fingerprint,
+                                     stat.st_size, stat.st_mtime_ns, now))
+                    conn = self._connect(directory)
+                    try:
+                        conn.executemany('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                        conn.commit()
+                    finally:
+                        conn.close()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.error(f"写入增量索引失败: {e}")
@@ -0,0 +1,165 @@
+"""
+任务日志模块
+
+把每个任务的源文件、目标文件、选项和状态记录到 SQLite 中，
+程序关闭或崩溃后重新启动时，可以把排队中和被中断的任务重新加入队列。
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List
+
+# 排队中或运行中（被中断）的任务在重启后需要恢复
+RESUMABLE_STATES = ('queued', 'running')
+
+
+class JobJournal:
+    """ 任务日志，写入先合并到内存，由后台线程按固定间隔批量提交 """
+
+    def __init__(self, db_path: str = None, flush_interval: float = 0.5, retention_days: int = 7):
+        if db_path is None:
+            db_path = os.path.join(os.path.expanduser('~'), '.gsgc', 'jobs.db')
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS jobs ('
+                    ' job_key TEXT PRIMARY KEY,'
+                    ' source TEXT NOT NULL,'
+                    ' target TEXT NOT NULL,'
+                    ' options TEXT NOT NULL,'
+                    ' state TEXT NOT NULL,'
+                    ' error TEXT NOT NULL,'
+                    ' created_at REAL NOT NULL,'
+                    ' updated_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)')
+                # 清理早已结束的任务，避免日志无限增长
+                placeholders = ','.join('?' * len(RESUMABLE_STATES))
+                conn.execute(
+                    f'DELETE FROM jobs WHERE state NOT IN ({placeholders}) AND updated_at < ?',
+                    (*RESUMABLE_STATES, time.time() - retention_days * 86400)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as e:
+            # 日志文件损坏或无法写入时不影响转换，本次运行不记录任务，也不恢复未完成的任务
+            self.logger.warning(f"任务日志不可用，本次运行不记录任务: {e}")
+            self.db_path = None
+            self._closed = True
+            self._writer = None
+            return
+
+        self._writer = threading.Thread(target=self._writer_loop, name='JobJournalWriter', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        # WAL 模式下写入不阻塞读取，synchronous=NORMAL 在 WAL 下仍能保证崩溃后数据库一致
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def record(self, job):
+        """记录任务的当前状态，同一任务的多次更新在提交前会合并"""
+        row = (
+            job.job_key,
+            job.source_file,
+            job.target_file,
+            json.dumps(job.options, ensure_ascii=False, sort_keys=True),
+            job.state.value,
+            job.error or '',
+            time.time(),
+        )
+        with self._lock:
+            if self._closed:
+                return
+            self._pending[job.job_key] = row
+
+    def pending_jobs(self) -> List[dict]:
+        """读取排队中和被中断的任务，按提交顺序返回，日志不可用时返回空列表"""
+        if self.db_path is None:
+            return []
+        self.flush()
+        try:
+            conn = self._connect()
+            try:
+                placeholders = ','.join('?' * len(RESUMABLE_STATES))
+                rows = conn.execute(
+                    f'SELECT job_key, source, target, options, state FROM jobs '
+                    f'WHERE state IN ({placeholders}) ORDER BY created_at',
+                    RESUMABLE_STATES
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.logger.error(f"读取任务日志失败: {e}")
+            return []
+        jobs = []
+        for job_key, source, target, options, state in rows:
+            try:
+                options = json.loads(options)
+            except ValueError:
+                options = {}
+            jobs.append({
+                'job_key': job_key,
+                'source': source,
+                'target': target,
+                'options': options,
+                'state': state,
+            })
+        return jobs
+
+    def flush(self):
+        """立即提交所有未写入的记录"""
+        with self._lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+        if not rows or self.db_path is None:
+            return
+        conn = None
+        try:
+            conn = self._connect()
+            conn.executemany(
+                'INSERT INTO jobs (job_key, source, target, options, state, error, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(job_key) DO UPDATE SET '
+                ' source = excluded.source, target = excluded.target, options = excluded.options,'
+                ' state = excluded.state, error = excluded.error, updated_at = excluded.updated_at',
+                [row + (row[-1],) for row in rows]
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"写入任务日志失败: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """提交剩余记录并停止记录，之后的状态变化不再写入"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stop.set()
+        self._writer.join()
+        self.flush()
+
+    def _writer_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
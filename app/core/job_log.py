@@ -0,0 +1,66 @@
+"""
+任务日志捕获模块
+
+每个任务一个有界的环形缓冲区，保存 ffmpeg 等外部工具的原始输出和关键事件，
+写入时不解码也不格式化，只在任务失败或用户查看详情时才转换为文本。
+全局日志的级别和格式只由程序入口通过 configure_logging 设置，导入本包不会修改全局日志配置。
+"""
+import os
+import time
+import logging
+from collections import deque
+from typing import List, Union
+
+# 设置日志级别的环境变量，例如 GSGC_LOG_LEVEL=DEBUG
+LOG_LEVEL_ENV = 'GSGC_LOG_LEVEL'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level: str = None, default: str = 'WARNING'):
+    """
+    配置全局日志，只应由程序入口调用
+
+    优先级：参数 level > 环境变量 GSGC_LOG_LEVEL > default
+    """
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or default).upper()
+    if level not in LOG_LEVELS:
+        level = default.upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+
+
+class JobLog:
+    """ 单个任务的有界日志，超出容量时丢弃最早的记录 """
+
+    def __init__(self, max_entries: int = 500):
+        self._entries = deque(maxlen=max_entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, line: Union[bytes, str]):
+        """记录一行原始输出或事件，可在任意线程调用"""
+        self._entries.append((time.time(), line))
+
+    def add_command(self, cmd: List[str]):
+        """记录执行的命令，格式化时才拼接"""
+        self._entries.append((time.time(), tuple(cmd)))
+
+    def _format_entry(self, entry) -> str:
+        timestamp, line = entry
+        if isinstance(line, tuple):
+            line = '$ ' + ' '.join(line)
+        elif isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        clock = time.strftime('%H:%M:%S', time.localtime(timestamp))
+        return f"{clock} {line.rstrip()}"
+
+    def tail(self, count: int = 20) -> List[str]:
+        """最后 count 条记录的文本"""
+        entries = list(self._entries)[-count:]
+        return [self._format_entry(entry) for entry in entries]
+
+    def format(self) -> str:
+        """全部记录的文本"""
+        return '\n'.join(self._format_entry(entry) for entry in list(self._entries))
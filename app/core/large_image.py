@@ -0,0 +1,379 @@
+"""
+大图片模块
+
+解码后超过内存上限的图片按条带（连续的若干行）处理：只读取文件头中的尺寸和 TIFF 条带/分块的位置，
+每次解码一个条带；输出 TIFF、PNG 时逐条带写入，缩小输出时逐条带缩小后拼接，内存占用与图片尺寸无关。
+只依赖 PIL 和标准库，可在图片转换子进程中导入。
+"""
+import io
+import math
+import zlib
+import struct
+import itertools
+from typing import Iterator, List, Tuple
+
+from PIL import Image, TiffImagePlugin
+
+# 单个任务解码图片的默认内存上限
+DEFAULT_MEMORY_LIMIT_MB = 1024
+
+# 一个条带最多占内存上限的比例，其余留给格式转换和编码器的缓冲
+BAND_MEMORY_FRACTION = 4
+
+# 输出 TIFF 每个 strip 的目标大小（未压缩）
+STRIP_BYTES = 1024 * 1024
+
+# 经典 TIFF 的偏移量为 32 位，预计超过该大小时写为 BigTIFF
+CLASSIC_TIFF_LIMIT = 2 ** 32 - 2 ** 26
+
+# TIFF 标签
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+
+# 流式 PNG 支持的模式：(颜色类型, 每像素字节数)
+PNG_MODES = {'L': (0, 1), 'RGB': (2, 3), 'LA': (4, 2), 'RGBA': (6, 4)}
+
+
+def memory_limit(options: dict = None) -> int:
+    """任务的内存上限（字节），options['memory_limit_mb'] 未设置时使用默认值"""
+    limit_mb = (options or {}).get('memory_limit_mb') or DEFAULT_MEMORY_LIMIT_MB
+    return int(float(limit_mb) * 1024 * 1024)
+
+
+def pixel_bytes(mode: str) -> int:
+    """Pillow 内部存储一个像素占用的字节数"""
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+
+def decoded_size(img: Image.Image) -> int:
+    """按文件头中的尺寸和模式估算解码后占用的内存，不解码"""
+    return img.width * img.height * pixel_bytes(img.mode)
+
+
+def _band_rows(width: int, mode: str, limit: int, alignment: int = 1) -> int:
+    """内存上限内一个条带的行数，按 alignment 对齐"""
+    rows = max(1, limit // BAND_MEMORY_FRACTION // max(1, width * pixel_bytes(mode)))
+    return max(alignment, rows // alignment * alignment)
+
+
+class TiffBandReader:
+    """
+    按条带解码单页 TIFF
+
+    未压缩的条带直接按行读取；压缩的条带或分块按原样取出，连同原文件的标签重新封装为
+    只含这一段的小 TIFF，交给 libtiff 解码，因此支持 LZW、Deflate、JPEG 等所有 libtiff 支持的压缩。
+    """
+
+    def __init__(self, img: TiffImagePlugin.TiffImageFile):
+        self.img = img
+        self.tags = img.tag_v2
+        self.width, self.height = img.size
+        self.tiled = TILE_OFFSETS in self.tags
+        if self.tiled:
+            self.block_rows = self.tags[TILE_LENGTH]
+            self.offsets = self.tags[TILE_OFFSETS]
+            self.byte_counts = self.tags[TILE_BYTE_COUNTS]
+            self.tiles_across = math.ceil(self.width / self.tags[TILE_WIDTH])
+        else:
+            self.block_rows = self.tags.get(ROWS_PER_STRIP, self.height)
+            self.offsets = self.tags[STRIP_OFFSETS]
+            self.byte_counts = self.tags[STRIP_BYTE_COUNTS]
+            self.tiles_across = 1
+        self.raw = self.tags.get(COMPRESSION, 1) == 1 and not self.tiled
+
+    @staticmethod
+    def supports(img: Image.Image) -> bool:
+        """是否为可按条带读取的 TIFF：单平面存储，带有条带或分块位置"""
+        if img.format != 'TIFF':
+            return False
+        tags = img.tag_v2
+        return (tags.get(PLANAR_CONFIGURATION, 1) == 1 and
+                (STRIP_OFFSETS in tags or TILE_OFFSETS in tags))
+
+    @property
+    def alignment(self) -> int:
+        """条带行数需要对齐的行数，未压缩的条带可以从任意行开始"""
+        return 1 if self.raw else self.block_rows
+
+    def bands(self, rows: int) -> Iterator[Tuple[int, Image.Image]]:
+        """依次返回 (起始行, 条带图片)，rows 会向下对齐到 alignment"""
+        rows = max(self.alignment, rows // self.alignment * self.alignment)
+        for y in range(0, self.height, rows):
+            yield y, self.read(y, min(rows, self.height - y))
+
+    def read(self, y: int, rows: int) -> Image.Image:
+        """解码从第 y 行开始的 rows 行，压缩数据的 y 必须对齐到 block_rows"""
+        if self.raw:
+            return self._read_raw(y, rows)
+        return self._read_blocks(y, rows)
+
+    def _read_raw(self, y: int, rows: int) -> Image.Image:
+        bits = self.tags.get(BITS_PER_SAMPLE, (1,))
+        bits = sum(bits) if isinstance(bits, tuple) else bits * self.tags.get(SAMPLES_PER_PIXEL, 1)
+        stride = (self.width * bits + 7) // 8
+        chunks = []
+        fp = self.img.fp
+        row = y
+        while row < y + rows:
+            strip = row // self.block_rows
+            strip_end = min((strip + 1) * self.block_rows, y + rows)
+            fp.seek(self.offsets[strip] + (row - strip * self.block_rows) * stride)
+            chunks.append(fp.read((strip_end - row) * stride))
+            row = strip_end
+        rawmode = self.img.tile[0].args[0]
+        return Image.frombuffer(self.img.mode, (self.width, rows), b''.join(chunks), 'raw', rawmode, 0, 1)
+
+    def _read_blocks(self, y: int, rows: int) -> Image.Image:
+        first = y // self.block_rows * self.tiles_across
+        last = math.ceil((y + rows) / self.block_rows) * self.tiles_across
+        fp = self.img.fp
+        chunks = []
+        for index in range(first, min(last, len(self.offsets))):
+            fp.seek(self.offsets[index])
+            chunks.append(fp.read(self.byte_counts[index]))
+
+        header = self._header()
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(ifh=header)
+        for tag, value in self.tags.items():
+            ifd[tag] = value
+            ifd.tagtype[tag] = self.tags.tagtype[tag]
+        ifd[IMAGE_LENGTH] = rows
+        relative_offsets = tuple(itertools.accumulate([0] + [len(chunk) for chunk in chunks[:-1]]))
+        counts = tuple(len(chunk) for chunk in chunks)
+        if self.tiled:
+            # 分块偏移不会被 tobytes 调整，先算出 IFD 的长度再填入绝对偏移
+            ifd[TILE_BYTE_COUNTS] = counts
+            ifd[TILE_OFFSETS] = relative_offsets
+            data_start = len(header) + len(ifd.tobytes(len(header)))
+            ifd[TILE_OFFSETS] = tuple(data_start + offset for offset in relative_offsets)
+        else:
+            # StripOffsets 由 tobytes 自动加上数据区的起始位置，这里只填相对偏移
+            ifd[STRIP_BYTE_COUNTS] = counts
+            ifd[STRIP_OFFSETS] = relative_offsets
+        data = header + ifd.tobytes(len(header)) + b''.join(chunks)
+
+        with Image.open(io.BytesIO(data)) as band:
+            band.load()
+            return band.copy()
+
+    def _header(self) -> bytes:
+        prefix = self.tags._prefix
+        endian = '<' if prefix == b'II' else '>'
+        if self.tags._bigtiff:
+            return prefix + struct.pack(endian + 'HHHQ', 43, 8, 0, 16)
+        return prefix + struct.pack(endian + 'HI', 42, 8)
+
+
+class StripTiffWriter:
+    """
+    逐条带写入单页 TIFF
+
+    每个条带由 Pillow 编码为独立的小 TIFF，取出其中压缩好的 strip 追加到输出文件；
+    strip 数量在开始时已知，文件开头预留 IFD 的位置，全部写完后回填。
+    """
+
+    def __init__(self, path: str, size: Tuple[int, int], mode: str, compression: str = 'tiff_deflate'):
+        self.path = path
+        self.width, self.height = size
+        self.mode = mode
+        self.compression = compression
+        row_bytes = max(1, self.width * pixel_bytes(mode))
+        self.rows_per_strip = max(1, min(self.height, STRIP_BYTES // row_bytes))
+        self.strip_count = math.ceil(self.height / self.rows_per_strip)
+        self.bigtiff = self.width * self.height * pixel_bytes(mode) > CLASSIC_TIFF_LIMIT
+        self.offsets: List[int] = []
+        self.byte_counts: List[int] = []
+        self.template = None
+        self.data_start = 0
+        self.file = open(path, 'wb')
+
+    @property
+    def alignment(self) -> int:
+        """写入的条带行数需要是 rows_per_strip 的整数倍（最后一个条带除外）"""
+        return self.rows_per_strip
+
+    def write(self, band: Image.Image):
+        buffer = io.BytesIO()
+        band.save(buffer, format='TIFF', compression=self.compression,
+                  tiffinfo={ROWS_PER_STRIP: self.rows_per_strip})
+        data = buffer.getvalue()
+        with Image.open(io.BytesIO(data)) as encoded:
+            tags = encoded.tag_v2
+            if self.template is None:
+                self._start(tags)
+            for offset, count in zip(tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]):
+                self.offsets.append(self.file.tell() - self.data_start)
+                self.byte_counts.append(count)
+                self.file.write(data[offset:offset + count])
+
+    def _start(self, tags):
+        """根据第一个条带的标签预留文件头和 IFD"""
+        self.template = tags
+        self.file.write(b'\0' * len(self._header()) + b'\0' * len(self._ifd_bytes()))
+        self.data_start = self.file.tell()
+
+    def _header(self) -> bytes:
+        if self.bigtiff:
+            return b'II' + struct.pack('<HHHQ', 43, 8, 0, 16)
+        return b'II' + struct.pack('<HI', 42, 8)
+
+    def _ifd_bytes(self) -> bytes:
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(ifh=self._header())
+        for tag, value in self.template.items():
+            if tag in (STRIP_OFFSETS, STRIP_BYTE_COUNTS):
+                continue
+            ifd[tag] = value
+            ifd.tagtype[tag] = self.template.tagtype[tag]
+        ifd[IMAGE_WIDTH] = self.width
+        ifd[IMAGE_LENGTH] = self.height
+        ifd.tagtype[IMAGE_WIDTH] = ifd.tagtype[IMAGE_LENGTH] = 4
+        ifd[ROWS_PER_STRIP] = self.rows_per_strip
+        ifd.tagtype[ROWS_PER_STRIP] = 4
+        offsets = self.offsets or [0] * self.strip_count
+        counts = self.byte_counts or [0] * self.strip_count
+        offset_type = 16 if self.bigtiff else 4
+        ifd[STRIP_OFFSETS] = tuple(offsets)
+        ifd.tagtype[STRIP_OFFSETS] = offset_type
+        ifd[STRIP_BYTE_COUNTS] = tuple(counts)
+        ifd.tagtype[STRIP_BYTE_COUNTS] = offset_type
+        return ifd.tobytes(len(self._header()))
+
+    def finish(self):
+        """全部条带写完后回填文件头和 IFD"""
+        if len(self.offsets) != self.strip_count:
+            raise ValueError(f"写入的 strip 数量不符: {len(self.offsets)}/{self.strip_count}")
+        self.file.seek(0)
+        self.file.write(self._header() + self._ifd_bytes())
+
+    def close(self):
+        """关闭文件；写入中途出错时不调用 finish()，只关闭，不掩盖原来的异常"""
+        self.file.close()
+
+
+class StreamingPngWriter:
+    """ 逐条带写入 8 位 PNG，各行使用 Sub 滤波后交给 zlib 增量压缩 """
+
+    def __init__(self, path: str, size: Tuple[int, int], mode: str, compress_level: int = 6):
+        if mode not in PNG_MODES:
+            raise ValueError(f"流式 PNG 不支持 {mode} 模式")
+        self.width, self.height = size
+        self.mode = mode
+        self.color_type, self.bpp = PNG_MODES[mode]
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(path, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, self.color_type, 0, 0, 0))
+
+    @property
+    def alignment(self) -> int:
+        return 1
+
+    def write(self, band: Image.Image):
+        import numpy as np
+        rows = np.frombuffer(band.tobytes(), dtype=np.uint8).reshape(band.height, -1)
+        # Sub 滤波：每个字节减去左侧像素的同一通道，行首加滤波类型 1
+        filtered = np.empty((band.height, rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:self.bpp + 1] = rows[:, :self.bpp]
+        filtered[:, self.bpp + 1:] = rows[:, self.bpp:] - rows[:, :-self.bpp]
+        self._idat(self.compressor.compress(filtered.tobytes()))
+
+    def _idat(self, data: bytes):
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.file.write(struct.pack('>I', len(data)) + kind + data)
+        self.file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def finish(self):
+        self._idat(self.compressor.flush())
+        self._chunk(b'IEND', b'')
+
+    def close(self):
+        self.file.close()
+
+
+def _band_mode(mode: str, target_format: str) -> str:
+    """条带需要转换成的模式，None 表示保持"""
+    if mode == 'P':
+        return 'RGBA'
+    if mode == '1':
+        return 'L'
+    if target_format == 'png' and mode not in PNG_MODES:
+        return 'RGB'
+    return mode
+
+
+def downscale(reader: TiffBandReader, size: Tuple[int, int], limit: int,
+              reduce_margin: int = 2) -> Image.Image:
+    """逐条带整数倍缩小后拼接，再用 LANCZOS 重采样到 size"""
+    mode = _band_mode(reader.img.mode, '')
+    factor = max(1, min(reader.width // (size[0] * reduce_margin), reader.height // (size[1] * reduce_margin)))
+    # 取 2 的幂，条带行数（通常也是 2 的幂或其倍数）对齐到缩小倍数时不会被放大太多
+    factor = 1 << (factor.bit_length() - 1)
+    alignment = reader.alignment * factor // math.gcd(reader.alignment, factor)
+    canvas = Image.new(mode, (math.ceil(reader.width / factor), math.ceil(reader.height / factor)))
+    for y, band in reader.bands(_band_rows(reader.width, reader.img.mode, limit, alignment)):
+        if band.mode != mode:
+            band = band.convert(mode)
+        canvas.paste(band.reduce(factor) if factor > 1 else band, (0, y // factor))
+    if canvas.size != size:
+        canvas = canvas.resize(size, Image.LANCZOS)
+    return canvas
+
+
+def convert_large_image(img: Image.Image, target: str, target_format: str,
+                        size: Tuple[int, int], limit: int, args: dict = None) -> Image.Image:
+    """
+    转换解码后超过内存上限的图片，流式写入的文件不保留元数据
+
+    Args:
+        img: 已打开但未解码的图片
+        size: 输出尺寸，与原尺寸相同表示不缩小
+        limit: 内存上限（字节）
+        args: 图片预设的保存参数，流式写入时使用其中的 compression 或 compress_level
+
+    Returns:
+        缩小后的图片，由调用方按普通图片保存；已流式写入目标文件时返回 None
+    """
+    limit_mb = limit // (1024 * 1024)
+    if not TiffBandReader.supports(img):
+        raise ValueError(f"图片解码后约 {decoded_size(img) // (1024 * 1024)} MB，超过内存上限 {limit_mb} MB，"
+                         f"只有 TIFF 可以分条带处理")
+    reader = TiffBandReader(img)
+    if size != img.size:
+        return downscale(reader, size, limit)
+
+    args = args or {}
+    mode = _band_mode(img.mode, target_format)
+    if target_format in ('tif', 'tiff'):
+        writer = StripTiffWriter(target, img.size, mode, args.get('compression', 'tiff_deflate'))
+    elif target_format == 'png':
+        writer = StreamingPngWriter(target, img.size, mode, args.get('compress_level', 6))
+    else:
+        raise ValueError(f"{target_format.upper()} 不支持流式写入，超过内存上限 {limit_mb} MB 的图片"
+                         f"请转换为 TIFF、PNG 或设置输出尺寸")
+    try:
+        alignment = reader.alignment * writer.alignment // math.gcd(reader.alignment, writer.alignment)
+        for _, band in reader.bands(_band_rows(reader.width, mode, limit, alignment)):
+            writer.write(band if band.mode == mode else band.convert(mode))
+        writer.finish()
+    finally:
+        writer.close()
+    return None
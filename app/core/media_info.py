@@ -0,0 +1,282 @@
+"""
+媒体信息模块
+
+一次 ffprobe 调用得到完整的格式和流信息，结果按 (路径, 大小, 修改时间) 缓存到磁盘，
+转换器、新建任务对话框和进度计算共用同一份信息，重复加入相同文件时无需再次启动 ffprobe。
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+import subprocess
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+flags = 0
+if sys.platform == "win32":
+    flags = subprocess.CREATE_NO_WINDOW
+
+
+def _to_int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class StreamInfo:
+    """ 单个媒体流的信息 """
+    index: int
+    codec_type: str
+    codec_name: str = ''
+    width: int = 0
+    height: int = 0
+    frame_rate: float = 0.0
+    sample_rate: int = 0
+    channels: int = 0
+    bit_rate: int = 0
+    attached_pic: bool = False
+
+    @classmethod
+    def from_probe(cls, data: dict) -> 'StreamInfo':
+        frame_rate = 0.0
+        rate = data.get('avg_frame_rate') or data.get('r_frame_rate') or ''
+        if '/' in rate:
+            num, den = rate.split('/', 1)
+            if _to_float(den):
+                frame_rate = (_to_float(num) or 0.0) / _to_float(den)
+        return cls(
+            index=_to_int(data.get('index')),
+            codec_type=data.get('codec_type', ''),
+            codec_name=data.get('codec_name', ''),
+            width=_to_int(data.get('width')),
+            height=_to_int(data.get('height')),
+            frame_rate=frame_rate,
+            sample_rate=_to_int(data.get('sample_rate')),
+            channels=_to_int(data.get('channels')),
+            bit_rate=_to_int(data.get('bit_rate')),
+            attached_pic=bool(data.get('disposition', {}).get('attached_pic')),
+        )
+
+
+@dataclass
+class MediaInfo:
+    """ 媒体文件信息 """
+    path: str
+    size: int
+    mtime: float
+    duration: Optional[float] = None
+    # 容器的起始时间戳，MPEG-TS 和部分相机拍摄的 MOV 不从 0 开始
+    start_time: float = 0.0
+    format_name: str = ''
+    bit_rate: int = 0
+    streams: List[StreamInfo] = field(default_factory=list)
+
+    @property
+    def video_stream(self) -> Optional[StreamInfo]:
+        """第一个视频流，不包括封面图片"""
+        return next((st for st in self.streams if st.codec_type == 'video' and not st.attached_pic), None)
+
+    @property
+    def audio_stream(self) -> Optional[StreamInfo]:
+        """第一个音频流"""
+        return next((st for st in self.streams if st.codec_type == 'audio'), None)
+
+    @classmethod
+    def from_probe(cls, path: str, size: int, mtime: float, data: dict) -> 'MediaInfo':
+        fmt = data.get('format', {})
+        return cls(
+            path=path,
+            size=size,
+            mtime=mtime,
+            duration=_to_float(fmt.get('duration')),
+            start_time=_to_float(fmt.get('start_time')) or 0.0,
+            format_name=fmt.get('format_name', ''),
+            bit_rate=_to_int(fmt.get('bit_rate')),
+            streams=[StreamInfo.from_probe(st) for st in data.get('streams', [])],
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MediaInfo':
+        data = dict(data)
+        if 'start_time' not in data:
+            # 加入 start_time 之前缓存的结果，重新获取
+            raise ValueError("缓存的媒体信息缺少 start_time")
+        data['streams'] = [StreamInfo(**st) for st in data.get('streams', [])]
+        return cls(**data)
+
+    def summary(self) -> str:
+        """用于界面显示的简要信息"""
+        parts = []
+        if self.duration:
+            minutes, seconds = divmod(int(self.duration), 60)
+            hours, minutes = divmod(minutes, 60)
+            parts.append(f"{hours:d}:{minutes:02d}:{seconds:02d}")
+        video = self.video_stream
+        if video:
+            parts.append(f"{video.codec_name} {video.width}x{video.height}")
+            if video.frame_rate:
+                parts.append(f"{video.frame_rate:.3g}fps")
+        audio = self.audio_stream
+        if audio:
+            parts.append(f"{audio.codec_name} {audio.sample_rate}Hz")
+        return '，'.join(parts)
+
+
+class ProbeCache:
+    """ ffprobe 结果的磁盘缓存，源文件大小或修改时间变化后自动失效 """
+
+    def __init__(self, db_path: str = None, retention_days: int = 90):
+        if db_path is None:
+            db_path = os.path.join(os.path.expanduser('~'), '.gsgc', 'probe_cache.db')
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self._memory: Dict[str, MediaInfo] = {}
+        self._lock = threading.Lock()
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS probes ('
+                    ' path TEXT PRIMARY KEY,'
+                    ' size INTEGER NOT NULL,'
+                    ' mtime REAL NOT NULL,'
+                    ' data TEXT NOT NULL,'
+                    ' accessed REAL NOT NULL)'
+                )
+                conn.execute('DELETE FROM probes WHERE accessed < ?', (time.time() - retention_days * 86400,))
+                conn.commit()
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as e:
+            # 缓存不可用时只使用内存缓存
+            self.logger.warning(f"媒体信息缓存不可用: {e}")
+            self.db_path = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def get(self, path: str, size: int, mtime: float) -> Optional[MediaInfo]:
+        with self._lock:
+            info = self._memory.get(path)
+        if info is not None and info.size == size and info.mtime == mtime:
+            return info
+        if self.db_path is None:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    'SELECT data FROM probes WHERE path = ? AND size = ? AND mtime = ?',
+                    (path, size, mtime)
+                ).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE probes SET accessed = ? WHERE path = ?', (time.time(), path))
+                    conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"读取媒体信息缓存失败: {e}")
+            return None
+        if row is None:
+            return None
+        try:
+            info = MediaInfo.from_dict(json.loads(row[0]))
+        except (ValueError, TypeError):
+            return None
+        with self._lock:
+            self._memory[path] = info
+        return info
+
+    def put(self, info: MediaInfo):
+        with self._lock:
+            self._memory[info.path] = info
+        if self.db_path is None:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO probes (path, size, mtime, data, accessed) VALUES (?, ?, ?, ?, ?)',
+                    (info.path, info.size, info.mtime, json.dumps(info.to_dict()), time.time())
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"写入媒体信息缓存失败: {e}")
+
+
+_default_cache: Optional[ProbeCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_probe_cache() -> ProbeCache:
+    """获取进程内共用的媒体信息缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ProbeCache()
+        return _default_cache
+
+
+def _file_key(path: str) -> Tuple[str, int, float]:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime
+
+
+def probe_media(path: str, ffprobe_path: str = 'ffprobe', cache: ProbeCache = None) -> MediaInfo:
+    """
+    获取媒体文件信息，优先使用缓存
+
+    Args:
+        path: 媒体文件路径
+        ffprobe_path: ffprobe 可执行文件路径
+        cache: 媒体信息缓存，默认使用进程内共用的缓存
+
+    Raises:
+        Exception: ffprobe 执行失败或无法解析输出
+    """
+    if cache is None:
+        cache = get_probe_cache()
+    abs_path, size, mtime = _file_key(path)
+    info = cache.get(abs_path, size, mtime)
+    if info is not None:
+        return info
+
+    result = subprocess.run(
+        [ffprobe_path, '-v', 'error', '-show_format', '-show_streams', '-print_format', 'json', path],
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        creationflags=flags
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip() or "无法读取媒体信息")
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        raise Exception("无法解析媒体信息")
+    info = MediaInfo.from_probe(abs_path, size, mtime, data)
+    cache.put(info)
+    return info
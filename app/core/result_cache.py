@@ -0,0 +1,316 @@
+"""
+转换结果缓存模块
+
+以源文件内容指纹、目标格式和转换选项为键，把转换结果保存在磁盘上。
+相同的输入以相同的设置再次转换时，直接把缓存的结果放到目标位置，不再重新编码。
+缓存按总大小上限以最近最少使用（LRU）的顺序淘汰。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+# 缓存格式版本，转换参数的默认值变化时递增，使旧的缓存失效
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_SIZE_MB = 2048
+
+# 不超过该大小的源文件计算完整哈希，更大的文件均匀抽取若干块计算
+FULL_HASH_BYTES = 1024 * 1024
+SAMPLE_COUNT = 16
+SAMPLE_BYTES = 64 * 1024
+
+# 不影响输出内容、不参与缓存键的选项；额外目标只按扩展名参与
+VOLATILE_OPTIONS = {'extra_targets', 'memory_limit_mb', 'incremental',
+                    'archive_max_mb', 'archive_max_ratio', 'archive_max_entries'}
+
+# Linux 的 FICLONE ioctl，在 Btrfs、XFS 等文件系统上创建共享数据块的副本
+FICLONE = 0x40049409
+
+
+def fingerprint(path: str) -> str:
+    """
+    源文件的内容指纹：文件大小加上内容的 blake2b 哈希
+
+    小文件哈希全部内容；大文件哈希均匀分布的 SAMPLE_COUNT 块（包含开头和结尾），
+    只读取约 1 MB，不受文件大小影响。
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= FULL_HASH_BYTES:
+            digest.update(f.read())
+        else:
+            step = (size - SAMPLE_BYTES) / (SAMPLE_COUNT - 1)
+            for index in range(SAMPLE_COUNT):
+                f.seek(int(index * step))
+                digest.update(f.read(SAMPLE_BYTES))
+    return f"{size:x}-{digest.hexdigest()}"
+
+
+def recipe_digest(target_file: str, options: dict = None, toolchain: str = '') -> str:
+    """
+    各目标的扩展名和影响输出的选项的摘要，相同摘要的转换对同一源文件得到相同的结果
+
+    toolchain 为生成输出的外部工具的标识（见 FormatConverter.toolchain_identity），
+    升级 ffmpeg 或可用的编码器变化后摘要随之改变。
+    """
+    options = options or {}
+    extensions = [os.path.splitext(path)[1].lower()
+                  for path in [target_file] + list(options.get('extra_targets') or [])]
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'targets': extensions,
+        'options': {key: value for key, value in options.items() if key not in VOLATILE_OPTIONS},
+        'toolchain': toolchain,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def cache_key(source_file: str, target_file: str, options: dict = None, toolchain: str = '') -> str:
+    """由源文件指纹和 recipe_digest 计算缓存键"""
+    payload = f"{fingerprint(source_file)}:{recipe_digest(target_file, options, toolchain)}"
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def _reflink(source: str, target: str) -> bool:
+    """尝试创建共享数据块的副本（reflink），文件系统不支持时返回 False"""
+    if sys.platform != 'linux':
+        return False
+    import fcntl
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+def place_file(source: str, target: str) -> str:
+    """
+    把 source 放到 target，依次尝试 reflink、硬链接和复制
+
+    先写入同目录下的临时文件再替换 target，中途失败不会留下不完整的目标文件。
+
+    Returns:
+        使用的方式：'reflink'、'hardlink' 或 'copy'
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        # 已是同一个文件（上次硬链接的结果），rename 到同一文件的另一个链接不会生效
+        return 'hardlink'
+    temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if _reflink(source, temp):
+            method = 'reflink'
+        else:
+            try:
+                os.link(source, temp)
+                method = 'hardlink'
+            except OSError:
+                # 跨文件系统或不支持硬链接
+                shutil.copyfile(source, temp)
+                method = 'copy'
+        os.replace(temp, target)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return method
+
+
+class ResultCache:
+    """ 转换结果缓存，结果文件保存在 cache_dir/objects 下，索引保存在 SQLite 中
+
+    硬链接得到的输出文件与缓存文件是同一个文件，命中时会核对缓存文件的大小和修改时间，
+    不一致（输出文件被原地修改过）时丢弃该条缓存。
+    缓存目录或索引无法使用（例如 index.db 已损坏）时记录日志，本次运行不使用缓存，转换照常进行。
+    """
+
+    def __init__(self, cache_dir: str = None, max_size_mb: int = DEFAULT_CACHE_SIZE_MB):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.gsgc', 'cache')
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.db_path = os.path.join(cache_dir, 'index.db')
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.available = True
+
+        try:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS entries ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' files TEXT NOT NULL,'
+                    ' size INTEGER NOT NULL,'
+                    ' created_at REAL NOT NULL,'
+                    ' last_used REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)')
+                # 大小上限调小后，打开时就淘汰超出的部分
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"转换缓存不可用，本次运行不使用缓存: {e}")
+            self.available = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _object_path(self, key: str, index: int, target: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], f"{key}.{index}{os.path.splitext(target)[1].lower()}")
+
+    def fetch(self, key: str, targets: List[str]) -> bool:
+        """
+        缓存命中时把结果放到各目标位置
+
+        Returns:
+            是否命中；未命中、缓存文件已失效或读取缓存出错时返回 False，目标文件保持不变
+        """
+        if not self.available:
+            self._count('misses')
+            return False
+        conn = None
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT files FROM entries WHERE key = ?', (key,)).fetchone()
+            files = json.loads(row[0]) if row else None
+            if files is None or len(files) != len(targets) or not self._is_intact(files):
+                if files is not None:
+                    self.logger.info(f"缓存已失效，丢弃: {key}")
+                    self._remove_entry(conn, key, files)
+                    conn.commit()
+                self._count('misses')
+                return False
+            for item, target in zip(files, targets):
+                target_dir = os.path.dirname(target)
+                if target_dir:
+                    os.makedirs(target_dir, exist_ok=True)
+                place_file(item['path'], target)
+            conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            conn.commit()
+        except (OSError, sqlite3.Error, ValueError) as e:
+            self.logger.error(f"读取转换缓存失败: {e}")
+            self._count('misses')
+            return False
+        finally:
+            if conn is not None:
+                conn.close()
+        self._count('hits')
+        return True
+
+    def store(self, key: str, targets: List[str]):
+        """保存转换结果，之后按大小上限淘汰最久未使用的条目，失败时只记录日志"""
+        if not self.available or any(not os.path.isfile(target) for target in targets):
+            return
+        size = sum(os.path.getsize(target) for target in targets)
+        if size > self.max_bytes:
+            return
+        files = []
+        try:
+            for index, target in enumerate(targets):
+                path = self._object_path(key, index, target)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                place_file(target, path)
+                stat = os.stat(path)
+                files.append({'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+            now = time.time()
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO entries (key, files, size, created_at, last_used) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (key, json.dumps(files, ensure_ascii=False), size, now, now)
+                    )
+                    self._evict(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.error(f"写入转换缓存失败: {e}")
+            return
+        self._count('stores')
+
+    def clear(self):
+        """清空缓存"""
+        if not self.available:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM entries')
+                conn.commit()
+            finally:
+                conn.close()
+            shutil.rmtree(self.objects_dir, ignore_errors=True)
+            os.makedirs(self.objects_dir, exist_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        """本次运行的命中、未命中、写入、淘汰次数，以及缓存的条目数和总大小，索引无法读取时后两项为 0"""
+        entries = size = 0
+        if self.available:
+            try:
+                conn = self._connect()
+                try:
+                    entries, size = conn.execute(
+                        'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                self.logger.error(f"读取转换缓存失败: {e}")
+        with self._lock:
+            return dict(self._stats, entries=entries, size=size, max_size=self.max_bytes)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _is_intact(self, files: List[dict]) -> bool:
+        for item in files:
+            try:
+                stat = os.stat(item['path'])
+            except OSError:
+                return False
+            if stat.st_size != item['size'] or stat.st_mtime_ns != item['mtime_ns']:
+                return False
+        return True
+
+    def _remove_entry(self, conn: sqlite3.Connection, key: str, files: Optional[List[dict]]):
+        conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        for item in files or []:
+            try:
+                os.remove(item['path'])
+            except OSError:
+                pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        """调用方需持有 self._lock"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, files, size in conn.execute(
+                'SELECT key, files, size FROM entries ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove_entry(conn, key, json.loads(files))
+            total -= size
+            self._stats['evictions'] += 1
@@ -0,0 +1,474 @@
+"""
+任务调度模块
+"""
+import os
+import uuid
+import itertools
+import logging
+import threading
+from collections import deque
+from concurrent.futures import wait as wait_futures
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .converter import (FormatConverter, RESOURCE_FFMPEG, RESOURCE_IMAGE,
+                        RESOURCE_DOCUMENT, RESOURCE_ARCHIVE)
+from .image_pool import ImageProcessPool
+from .image_converter import image_outputs
+from .format_mapping import get_format_category
+from .job_journal import JobJournal
+from .job_log import JobLog
+from .result_cache import ResultCache, cache_key
+from .incremental import IncrementalIndex
+
+
+class JobState(Enum):
+    """ 任务状态 """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    SKIPPED = 'skipped'      # 增量模式下输出已是最新，未转换
+
+    @property
+    def is_finished(self) -> bool:
+        return self in (JobState.DONE, JobState.FAILED, JobState.CANCELLED, JobState.SKIPPED)
+
+
+def job_targets(target_file: str, options: dict) -> List[str]:
+    """任务的全部输出文件，多输出任务的其他目标在 options['extra_targets'] 中，图片多尺寸输出见 image_outputs"""
+    if options.get('sizes') and get_format_category(os.path.splitext(target_file)[1][1:]) == 'image':
+        return [path for path, _ in image_outputs(target_file, options)]
+    return [target_file] + list(options.get('extra_targets') or [])
+
+
+def partial_path(path: str, token: str) -> str:
+    """转换时写入的临时文件名，与目标同目录并保留扩展名，转换器仍按扩展名选择格式"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial-{token}{ext}"
+
+
+class ConvertJob:
+    """ 转换任务，由调度器执行，界面只观察其状态 """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, source_file: str, target_file: str, options: dict = None, job_key: str = None):
+        self.job_id = next(ConvertJob._ids)
+        # 跨进程持久的任务标识，用于任务日志
+        self.job_key = job_key or uuid.uuid4().hex
+        self.source_file = source_file
+        self.target_file = target_file
+        self.options = dict(options or {})
+        self.state = JobState.QUEUED
+        self.progress = 0
+        # ffmpeg 任务最近一次的统计信息（fps、speed、bitrate 等）
+        self.stats: dict = {}
+        self.error = ''
+        # 任务的外部工具输出和关键事件，失败或查看详情时才格式化
+        self.log = JobLog()
+        self.is_cancelled = False
+        # 结果是否取自转换缓存，以及未命中时写入缓存使用的键
+        self.cached = False
+        self.cache_key = ''
+        # 生成输出的工具链标识（见 FormatConverter.toolchain_identity），首次使用时计算
+        self.toolchain: Optional[str] = None
+        self.resource_class = ''
+        self.converter: Optional[FormatConverter] = None
+        self._sequence = 0
+        self._state_listeners: List[Callable[['ConvertJob'], None]] = []
+        self._progress_listeners: List[Callable[['ConvertJob', int], None]] = []
+
+    @property
+    def targets(self) -> List[str]:
+        """任务的全部输出文件，见 job_targets"""
+        return job_targets(self.target_file, self.options)
+
+    def staging(self) -> Tuple[str, dict]:
+        """
+        转换时实际使用的目标文件和选项：各输出先写入临时文件名（见 partial_path），
+        全部成功后再改名为目标文件，中断或失败时不会留下看似完成的半成品
+        """
+        token = self.job_key[:8]
+        options = dict(self.options)
+        if options.get('extra_targets'):
+            options['extra_targets'] = [partial_path(target, token) for target in options['extra_targets']]
+        return partial_path(self.target_file, token), options
+
+    def add_state_listener(self, listener: Callable[['ConvertJob'], None]):
+        """注册状态监听器，在工作线程中回调"""
+        self._state_listeners.append(listener)
+
+    def add_progress_listener(self, listener: Callable[['ConvertJob', int], None]):
+        """注册进度监听器，在工作线程中回调"""
+        self._progress_listeners.append(listener)
+
+    def _set_state(self, state: JobState, error: str = ''):
+        self.state = state
+        self.error = error
+        for listener in list(self._state_listeners):
+            listener(self)
+
+    def _report_stats(self, stats):
+        self.stats = stats.to_dict()
+
+    def _report_progress(self, value: int):
+        self.progress = value
+        for listener in list(self._progress_listeners):
+            listener(self, value)
+
+
+def default_resource_limits() -> Dict[str, int]:
+    """按CPU核心数计算各资源类别的默认并发上限"""
+    cpu_count = os.cpu_count() or 1
+    return {
+        RESOURCE_FFMPEG: max(1, cpu_count // 2),
+        RESOURCE_IMAGE: cpu_count,
+        RESOURCE_DOCUMENT: max(1, min(2, cpu_count // 4)),
+        RESOURCE_ARCHIVE: 2,
+    }
+
+
+class JobScheduler:
+    """ 任务调度器：任务按资源类别分队排队，每个类别单独限制并发数
+
+    传入 image_pool 时图片任务按块交给子进程执行，图片类别的并发数即同时在途的块数；
+    传入 journal 时每个任务的状态变化都会写入任务日志；
+    传入 cache 时先查询转换缓存，命中的任务不再转换，成功的结果写入缓存。
+    选项中设置了 incremental 的任务在开始转换前由工作线程检查输出目录的增量索引，输出已是最新时直接跳过。
+    """
+
+    def __init__(self, max_workers: int = None, limits: Dict[str, int] = None,
+                 image_pool: ImageProcessPool = None, journal: JobJournal = None,
+                 cache: ResultCache = None):
+        self.logger = logging.getLogger(__name__)
+        self.image_pool = image_pool
+        self.journal = journal
+        self.cache = cache
+        self.incremental = IncrementalIndex()
+        self.limits = default_resource_limits()
+        if image_pool is not None:
+            self.limits[RESOURCE_IMAGE] = image_pool.max_workers
+        if limits:
+            self.limits.update(limits)
+        self.max_workers = max_workers or sum(self.limits.values())
+        self.cpu_count = os.cpu_count() or 1
+        self._queues: Dict[str, deque] = {}
+        self._running = set()
+        self._running_by_class: Dict[str, int] = {}
+        self._sequence = itertools.count()
+        self._worker_ids = itertools.count(1)
+        self._workers: List[threading.Thread] = []
+        self._idle_workers = 0
+        self._is_shutdown = False
+        self._cond = threading.Condition()
+        self._classifier = FormatConverter()
+
+    def submit(self, job: ConvertJob) -> ConvertJob:
+        """提交任务，任务进入所属资源类别的队列"""
+        if not job.resource_class:
+            job.resource_class = self._classifier.get_resource_class(job.source_file, job.target_file)
+        with self._cond:
+            if self._is_shutdown:
+                raise RuntimeError("调度器已关闭")
+            if self.journal is not None:
+                self.journal.record(job)
+                job.add_state_listener(self.journal.record)
+            job._sequence = next(self._sequence)
+            self._queues.setdefault(job.resource_class, deque()).append(job)
+            self._ensure_worker()
+            self._cond.notify()
+        return job
+
+    def cancel(self, job: ConvertJob):
+        """取消任务，排队中的任务直接移出队列，运行中的任务通知转换器停止"""
+        with self._cond:
+            job.is_cancelled = True
+            if job.converter is not None:
+                job.converter.is_cancelled = True
+            if job.state == JobState.RUNNING and job.resource_class == RESOURCE_IMAGE and self.image_pool is not None:
+                # 已交给子进程的块中，该任务尚未开始的文件跳过
+                self.image_pool.cancel_job(job.job_key)
+            try:
+                self._queues.get(job.resource_class, deque()).remove(job)
+            except ValueError:
+                return
+            self._cond.notify_all()
+        job._set_state(JobState.CANCELLED)
+
+    def pending_count(self) -> int:
+        """排队中的任务数"""
+        with self._cond:
+            return self._pending_count()
+
+    def running_count(self) -> int:
+        """运行中的任务数"""
+        with self._cond:
+            return len(self._running)
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待所有任务结束，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending_count() and not self._running, timeout)
+
+    def shutdown(self, cancel_pending: bool = True, wait: bool = True):
+        """关闭调度器"""
+        with self._cond:
+            self._is_shutdown = True
+            pending = [job for queue in self._queues.values() for job in queue] if cancel_pending else []
+            running = list(self._running)
+            self._cond.notify_all()
+        for job in pending:
+            self.cancel(job)
+        if cancel_pending:
+            for job in running:
+                self.cancel(job)
+        if wait:
+            for worker in list(self._workers):
+                worker.join()
+        if self.image_pool is not None:
+            self.image_pool.shutdown(wait=wait)
+
+    def ffmpeg_thread_budget(self) -> int:
+        """
+        每个运行中的 ffmpeg 任务可用的线程数
+
+        其他类别的运行中任务各按占用一个核心计算，剩余核心由 ffmpeg 任务平分。
+        转换器在每次启动 ffmpeg 进程时读取，任务开始或结束后新启动的进程（例如分段编码的后续分段）
+        按新的预算运行。
+        """
+        with self._cond:
+            ffmpeg_jobs = self._running_by_class.get(RESOURCE_FFMPEG, 0)
+            other_jobs = sum(count for resource_class, count in self._running_by_class.items()
+                             if resource_class != RESOURCE_FFMPEG)
+        cores = max(1, self.cpu_count - other_jobs)
+        return max(1, cores // max(1, ffmpeg_jobs))
+
+    # 以下方法调用方需持有 self._cond
+
+    def _pending_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _available_slots(self, resource_class: str) -> int:
+        return self.limits.get(resource_class, 1) - self._running_by_class.get(resource_class, 0)
+
+    def _dispatchable_count(self) -> int:
+        count = sum(
+            min(len(queue), max(0, self._available_slots(resource_class)))
+            for resource_class, queue in self._queues.items()
+        )
+        return min(count, self.max_workers - len(self._running))
+
+    def _next_jobs(self) -> List[ConvertJob]:
+        """取出有空闲配额的类别中最早提交的任务，进程池模式下图片任务整块取出"""
+        if len(self._running) >= self.max_workers:
+            return []
+        candidates = [
+            (resource_class, queue) for resource_class, queue in self._queues.items()
+            if queue and self._available_slots(resource_class) > 0
+        ]
+        if not candidates:
+            return []
+        resource_class, queue = min(candidates, key=lambda item: item[1][0]._sequence)
+        if resource_class == RESOURCE_IMAGE and self.image_pool is not None:
+            count = self.image_pool.chunk_size_for(len(queue))
+            return [queue.popleft() for _ in range(min(count, len(queue)))]
+        return [queue.popleft()]
+
+    def _ensure_worker(self):
+        if self._dispatchable_count() <= self._idle_workers or len(self._workers) >= self.max_workers:
+            return
+        worker = threading.Thread(
+            target=self._worker_loop,
+            name=f"ConvertWorker-{next(self._worker_ids)}",
+            daemon=True
+        )
+        self._workers.append(worker)
+        worker.start()
+
+    def _worker_loop(self):
+        try:
+            self._work()
+        finally:
+            # 线程退出后不再占用 max_workers 的名额，仍有任务时补充新的工作线程
+            with self._cond:
+                self._workers.remove(threading.current_thread())
+                if not self._is_shutdown:
+                    self._ensure_worker()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle_workers += 1
+                jobs = self._next_jobs()
+                while not jobs:
+                    if self._is_shutdown and not self._pending_count():
+                        self._idle_workers -= 1
+                        return
+                    self._cond.wait()
+                    jobs = self._next_jobs()
+                self._idle_workers -= 1
+                resource_class = jobs[0].resource_class
+                self._running.update(jobs)
+                self._running_by_class[resource_class] = self._running_by_class.get(resource_class, 0) + 1
+                if self.image_pool is None or resource_class != RESOURCE_IMAGE:
+                    jobs[0].converter = FormatConverter()
+                    jobs[0].converter.job_log = jobs[0].log
+                    if resource_class == RESOURCE_FFMPEG:
+                        jobs[0].converter.thread_budget = self.ffmpeg_thread_budget
+                        jobs[0].converter.stats_callback = jobs[0]._report_stats
+
+            try:
+                if jobs[0].converter is None:
+                    self._run_image_chunk(jobs)
+                else:
+                    self._run_job(jobs[0])
+            except Exception as e:
+                # 缓存、索引等意外错误只让本次取出的任务失败，工作线程继续处理后续任务
+                self.logger.error(f"任务执行失败: {e}")
+                for job in jobs:
+                    if not job.state.is_finished:
+                        job.log.add(f"任务执行失败: {e}")
+                        job._set_state(JobState.FAILED, str(e))
+            finally:
+                with self._cond:
+                    self._running.difference_update(jobs)
+                    self._running_by_class[resource_class] -= 1
+                    self._cond.notify_all()
+
+    def _skip_up_to_date(self, job: ConvertJob) -> bool:
+        """增量模式下输出已是最新时把任务标记为跳过，在工作线程中调用，需要读取源文件和索引"""
+        if not job.options.get('incremental') or not self.incremental.is_up_to_date(
+                job.source_file, job.target_file, job.targets, job.options, self._toolchain_identity(job)):
+            return False
+        job.log.add("输出已是最新，跳过转换")
+        job._set_state(JobState.SKIPPED)
+        return True
+
+    def _fetch_cached(self, job: ConvertJob) -> bool:
+        """查询转换缓存，命中时结果已放到目标位置，未命中时记下缓存键供转换成功后写入"""
+        if self.cache is None:
+            return False
+        try:
+            job.cache_key = cache_key(job.source_file, job.target_file, job.options,
+                                      self._toolchain_identity(job))
+        except OSError as e:
+            self.logger.warning(f"计算缓存键失败: {e}")
+            return False
+        if self.cache.fetch(job.cache_key, job.targets):
+            job.cached = True
+            job.log.add("命中转换缓存，未重新转换")
+            job._report_progress(100)
+            return True
+        # 转换先写入临时文件再替换目标（见 ConvertJob.staging），不会原地覆盖与缓存共用数据的旧输出；
+        # 转换失败或取消时旧输出保持不变
+        return False
+
+    def _record_outputs(self, job: ConvertJob):
+        """任务完成后把结果写入转换缓存，增量模式下记录到输出目录的索引"""
+        if self.cache is not None and job.cache_key and not job.cached:
+            self.cache.store(job.cache_key, job.targets)
+        if job.options.get('incremental'):
+            self.incremental.record(job.source_file, job.target_file, job.targets, job.options,
+                                    self._toolchain_identity(job))
+
+    def _toolchain_identity(self, job: ConvertJob) -> str:
+        if job.toolchain is None:
+            job.toolchain = self._classifier.toolchain_identity(job.source_file, job.targets, job.options)
+        return job.toolchain
+
+    def _commit_outputs(self, job: ConvertJob, staged: Tuple[str, dict]):
+        """把临时文件逐个改名为目标文件"""
+        for partial, target in zip(job_targets(*staged), job.targets):
+            os.replace(partial, target)
+
+    def _discard_outputs(self, staged: Tuple[str, dict]):
+        """删除失败或取消后残留的临时文件"""
+        for partial in job_targets(*staged):
+            if not os.path.exists(partial):
+                continue
+            try:
+                os.remove(partial)
+            except OSError as e:
+                self.logger.error(f"删除临时输出文件失败: {e}")
+
+    def _run_job(self, job: ConvertJob):
+        staged = job.staging()
+        try:
+            if self._skip_up_to_date(job):
+                return
+            job._set_state(JobState.RUNNING)
+            if self._fetch_cached(job):
+                self._record_outputs(job)
+                job._set_state(JobState.DONE)
+                return
+            success = job.converter.convert(
+                job.source_file,
+                staged[0],
+                job._report_progress,
+                staged[1]
+            )
+            if job.is_cancelled:
+                job._set_state(JobState.CANCELLED)
+            elif success:
+                self._commit_outputs(job, staged)
+                self._record_outputs(job)
+                job._set_state(JobState.DONE)
+            else:
+                job._set_state(JobState.FAILED, "转换失败")
+        except Exception as e:
+            self.logger.error(f"任务执行失败: {e}")
+            job.log.add(f"任务执行失败: {e}")
+            if job.is_cancelled:
+                job._set_state(JobState.CANCELLED)
+            else:
+                job._set_state(JobState.FAILED, str(e))
+        finally:
+            self._discard_outputs(staged)
+
+    def _run_image_chunk(self, jobs: List[ConvertJob]):
+        """把一块图片任务交给进程池，并按逐个文件的结果更新任务状态"""
+        jobs = [job for job in jobs if not self._skip_up_to_date(job)]
+        for job in jobs:
+            job._set_state(JobState.RUNNING)
+        hits = [job for job in jobs if self._fetch_cached(job)]
+        for job in hits:
+            self._record_outputs(job)
+            job._set_state(JobState.DONE)
+        jobs = [job for job in jobs if not job.cached]
+        if not jobs:
+            return
+        staged = [job.staging() for job in jobs]
+        try:
+            future = self.image_pool.submit([(job.job_key, job.source_file, target, options)
+                                             for job, (target, options) in zip(jobs, staged)])
+
+            # 等待期间如果整块任务都被取消，尝试撤回尚未开始的块
+            while not wait_futures([future], timeout=0.2).done:
+                if all(job.is_cancelled for job in jobs) and future.cancel():
+                    break
+
+            results = future.result()
+        except Exception as e:
+            # 块被撤回、进程池已关闭或子进程异常退出
+            results = [(False, str(e) or "转换已取消")] * len(jobs)
+        self.image_pool.forget_jobs([job.job_key for job in jobs if job.is_cancelled])
+
+        for job, job_staged, (success, error) in zip(jobs, staged, results):
+            if success and not job.is_cancelled:
+                try:
+                    self._commit_outputs(job, job_staged)
+                except OSError as e:
+                    success, error = False, f"保存输出文件失败: {e}"
+            self._discard_outputs(job_staged)
+            if job.is_cancelled:
+                job._set_state(JobState.CANCELLED)
+            elif success:
+                self._record_outputs(job)
+                job._report_progress(100)
+                job._set_state(JobState.DONE)
+            else:
+                self.logger.error(f"图片转换失败：{job.source_file}: {error}")
+                job.log.add(f"图片转换失败：{error}")
+                job._set_state(JobState.FAILED, error or "转换失败")
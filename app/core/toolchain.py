@@ -0,0 +1,246 @@
+"""
+工具链模块
+
+进程内共用的 ffmpeg/ffprobe 查找结果和能力列表。可执行文件只查找一次，
+之后每次使用时检查文件的修改时间，文件被替换或删除后才重新查找；
+ffmpeg 支持的编码器、封装格式和滤镜也只查询一次，转换器据此选择可用的编码器。
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+flags = 0
+if sys.platform == "win32":
+    flags = subprocess.CREATE_NO_WINDOW
+
+# 未找到可执行文件时，间隔多久后重新查找（秒）
+MISSING_RETRY_SECONDS = 30
+
+# ffmpeg 能力列表对应的命令行参数
+CAPABILITY_KINDS = ('encoders', 'muxers', 'filters')
+
+
+def _executable_name(name: str) -> str:
+    if sys.platform == "win32" and not name.lower().endswith('.exe'):
+        return name + '.exe'
+    return name
+
+
+def _candidate_dirs() -> List[str]:
+    """按优先级返回 PATH 之外需要查找的目录"""
+    dirs = []
+    # 打包环境
+    if hasattr(sys, '_MEIPASS'):
+        dirs.append(sys._MEIPASS)
+    # 程序目录和当前目录
+    dirs.append(os.path.dirname(os.path.abspath(sys.argv[0])) if sys.argv and sys.argv[0] else '')
+    dirs.append(os.getcwd())
+    return [d for d in dirs if d]
+
+
+def _known_dirs() -> List[str]:
+    """常见的 ffmpeg 安装位置，在 PATH 中找不到时使用"""
+    home = os.path.expanduser('~')
+    if sys.platform == "win32":
+        program_files = [os.environ.get('ProgramFiles', ''), os.environ.get('ProgramFiles(x86)', '')]
+        dirs = []
+        for base in program_files + [home]:
+            if base:
+                dirs += [os.path.join(base, 'ffmpeg', 'bin'), os.path.join(base, 'ffmpeg')]
+        dirs += ['C:\\ffmpeg\\bin', 'D:\\ffmpeg\\bin', 'C:\\ffmpeg', 'D:\\ffmpeg',
+                 'D:\\ffmpeg-7.0.2-essentials_build\\bin']
+        return dirs
+    return ['/usr/local/bin', '/usr/bin', '/opt/homebrew/bin', '/opt/local/bin',
+            os.path.join(home, 'ffmpeg', 'bin'), os.path.join(home, 'bin')]
+
+
+def _parse_capabilities(output: str) -> Set[str]:
+    """
+    解析 ffmpeg -encoders/-muxers/-filters 的输出
+
+    每行格式为 "标志 名称 说明"，说明行（"标志 = 含义"）和标题行被跳过，
+    封装格式的名称可能是逗号分隔的多个别名。
+    """
+    names = set()
+    for line in output.splitlines():
+        tokens = line.split()
+        if len(tokens) < 2 or tokens[1] == '=' or tokens[0].endswith(':'):
+            continue
+        for name in tokens[1].split(','):
+            names.add(name)
+    return names
+
+
+class Toolchain:
+    """ ffmpeg/ffprobe 的路径和能力缓存，线程安全 """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # 名称 -> (路径, 修改时间)，未找到时修改时间为 None，路径为名称本身
+        self._tools: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._missing_since: Dict[str, float] = {}
+        # (路径, 修改时间, 类别) -> 名称集合
+        self._capabilities: Dict[Tuple[str, float, str], Set[str]] = {}
+        # (路径, 修改时间) -> 版本信息
+        self._versions: Dict[Tuple[str, float], str] = {}
+
+    def resolve(self, name: str) -> str:
+        """
+        获取可执行文件路径，name 为 'ffmpeg' 或 'ffprobe'，Windows 下自动补全 .exe
+
+        找不到时返回名称本身，交给系统在调用时报错。
+        """
+        name = os.path.splitext(name)[0] if name.lower().endswith('.exe') else name
+        with self._lock:
+            cached = self._tools.get(name)
+            if cached is not None:
+                path, mtime = cached
+                if mtime is None:
+                    if time.monotonic() - self._missing_since.get(name, 0) < MISSING_RETRY_SECONDS:
+                        return path
+                else:
+                    try:
+                        if os.stat(path).st_mtime == mtime:
+                            return path
+                    except OSError:
+                        pass
+                    self.logger.info(f"{name} 已变化，重新查找")
+
+            path = self._search(name)
+            if path is None:
+                self.logger.warning(f"未找到 {name}，将尝试直接调用")
+                self._tools[name] = (_executable_name(name), None)
+                self._missing_since[name] = time.monotonic()
+                return _executable_name(name)
+            self._tools[name] = (path, os.stat(path).st_mtime)
+            self.logger.info(f"找到 {name}: {path}")
+            return path
+
+    def _search(self, name: str) -> Optional[str]:
+        executable = _executable_name(name)
+        for dir_path in _candidate_dirs():
+            path = os.path.join(dir_path, executable)
+            if os.path.isfile(path):
+                return path
+        path = shutil.which(executable)
+        if path:
+            return os.path.abspath(path)
+        for dir_path in _known_dirs():
+            path = os.path.join(dir_path, executable)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+        return None
+
+    @property
+    def ffmpeg(self) -> str:
+        return self.resolve('ffmpeg')
+
+    @property
+    def ffprobe(self) -> str:
+        return self.resolve('ffprobe')
+
+    def capabilities(self, kind: str) -> Set[str]:
+        """获取 ffmpeg 支持的编码器、封装格式或滤镜名称，查询失败时返回空集合"""
+        if kind not in CAPABILITY_KINDS:
+            raise ValueError(f"未知的能力类别: {kind}")
+        ffmpeg_path = self.ffmpeg
+        with self._lock:
+            mtime = self._tools.get('ffmpeg', (None, None))[1]
+            if mtime is None:
+                return set()
+            key = (ffmpeg_path, mtime, kind)
+            names = self._capabilities.get(key)
+            if names is not None:
+                return names
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, '-hide_banner', f'-{kind}'],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                creationflags=flags
+            )
+            names = _parse_capabilities(result.stdout) if result.returncode == 0 else set()
+        except OSError as e:
+            self.logger.warning(f"查询 ffmpeg {kind} 失败: {e}")
+            names = set()
+        with self._lock:
+            # ffmpeg 被替换后旧的能力列表不再有效
+            for old_key in [k for k in self._capabilities if k[2] == kind and k[:2] != key[:2]]:
+                del self._capabilities[old_key]
+            self._capabilities[key] = names
+        return names
+
+    def version(self) -> str:
+        """ffmpeg -version 第一行中版本号的部分，例如 "ffmpeg version 7.0.2"，无法获取时返回空字符串"""
+        ffmpeg_path = self.ffmpeg
+        with self._lock:
+            mtime = self._tools.get('ffmpeg', (None, None))[1]
+            if mtime is None:
+                return ''
+            key = (ffmpeg_path, mtime)
+            version = self._versions.get(key)
+            if version is not None:
+                return version
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, '-version'],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                creationflags=flags
+            )
+            lines = result.stdout.splitlines() if result.returncode == 0 else []
+            version = lines[0].split(' Copyright')[0].strip() if lines else ''
+        except OSError as e:
+            self.logger.warning(f"查询 ffmpeg 版本失败: {e}")
+            version = ''
+        with self._lock:
+            self._versions = {key: version}
+        return version
+
+    def has_encoder(self, encoder: str) -> bool:
+        return encoder in self.capabilities('encoders')
+
+    def has_muxer(self, muxer: str) -> bool:
+        return muxer in self.capabilities('muxers')
+
+    def has_filter(self, filter_name: str) -> bool:
+        return filter_name in self.capabilities('filters')
+
+    def pick_encoder(self, candidates: Iterable[List[str]]) -> List[str]:
+        """
+        从候选编码参数中选出第一个当前 ffmpeg 支持的
+
+        每个候选是以 ['-c:v', 编码器名, ...] 开头的参数列表；
+        无法查询编码器列表时返回第一个候选。
+        """
+        candidates = list(candidates)
+        encoders = self.capabilities('encoders')
+        if encoders:
+            for args in candidates:
+                if args[1] in encoders:
+                    return args
+            self.logger.warning(f"ffmpeg 不支持候选编码器 {[args[1] for args in candidates]}，使用第一个")
+        return candidates[0]
+
+
+_toolchain: Optional[Toolchain] = None
+_toolchain_lock = threading.Lock()
+
+
+def get_toolchain() -> Toolchain:
+    """获取进程内共用的工具链"""
+    global _toolchain
+    with _toolchain_lock:
+        if _toolchain is None:
+            _toolchain = Toolchain()
+        return _toolchain
@@ -1,5 +1,5 @@
 import os
-from PySide6.QtCore import Qt, Signal, QPoint, QPropertyAnimation, QSize
+from PySide6.QtCore import Qt, Signal, QPoint, QPropertyAnimation, QSize, QThread
 from PySide6.QtGui import QColor, QMouseEvent
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, 
                              QLabel, QFileDialog, QFrame, QWidget,
@@ -9,10 +9,37 @@ from qfluentwidgets import (FluentIcon as FIF,
                           InfoBar, InfoBarPosition,
                           isDarkTheme, FluentStyleSheet,
                           RadioButton, LineEdit,
-                          SubtitleLabel)
+                          SubtitleLabel, CheckBox, FlowLayout, ScrollArea)
 
-from app.core.format_mapping import get_target_formats
+from app.core.format_mapping import (get_target_formats, get_all_target_formats, get_format_category,
+                                     VIDEO_FORMATS, AUDIO_FORMATS)
 from ..core.converter import FormatConverter
+from ..core.media_info import probe_media
+from ..core.toolchain import get_toolchain
+from ..core.encoding_profiles import (ENCODING_PROFILES, DEFAULT_PROFILE,
+                                      IMAGE_PROFILES, DEFAULT_IMAGE_PROFILE)
+from ..core.image_converter import ICO_SIZES
+
+
+# 图片输出尺寸预设（最长边像素）
+IMAGE_SIZE_PRESETS = (3840, 2560, 1920, 1280, 640, 320)
+
+
+class MediaProbeThread(QThread):
+    """ 在后台读取音视频文件信息，避免 ffprobe 阻塞界面 """
+    
+    probed = Signal(str, str)  # 发送文件路径和信息摘要
+    
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        
+    def run(self):
+        try:
+            summary = probe_media(self.file_path, get_toolchain().ffprobe).summary()
+        except Exception:
+            summary = ''
+        self.probed.emit(self.file_path, summary)
 
 class CustomTitleBar(QWidget):
     """自定义标题栏"""
@@ -49,19 +76,23 @@ class CustomTitleBar(QWidget):
 class AddTaskDialog(QDialog):
     """新建转换任务对话框"""
     
-    taskCreated = Signal(str, str)  # 发送源文件路径和目标文件路径
+    taskCreated = Signal(str, str, dict)  # 发送源文件路径、目标文件路径和转换选项
+    batchCreated = Signal(list, str, str, bool, dict)  # 发送源路径列表、目标格式、输出根目录（空为源文件目录）、是否保留目录结构和转换选项
+    watchCreated = Signal(str, str, str, bool, dict)  # 发送监视的文件夹，其余参数与 batchCreated 相同
     _instance = None
     _initialized = False
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.source_file = None
+        self.source_paths = []
         self.target_file = None
+        self.probeThread = None
         
         # 设置无边框窗口
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Window)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
-        self.setFixedSize(480, 550)  # 稍微增加高度
+        self.setFixedSize(480, 550)  # 选项较多，放在可滚动区域中，高度适应 768 像素的屏幕
         
         # 设置模态
         self.setModal(True)
@@ -119,6 +150,16 @@ class AddTaskDialog(QDialog):
         self.content_layout.setContentsMargins(24, 24, 24, 24)
         self.content_layout.setSpacing(16)
         
+        # 文件、格式和保存选项放在可滚动区域中，底部按钮固定显示
+        self.optionsScrollArea = ScrollArea(self.content_widget)
+        self.optionsScrollArea.setWidgetResizable(True)
+        self.optionsScrollArea.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.optionsScrollArea.setStyleSheet("QScrollArea { border: none; }")
+        self.optionsWidget = QWidget()
+        self.options_layout = QVBoxLayout(self.optionsWidget)
+        self.options_layout.setContentsMargins(0, 0, 12, 0)
+        self.options_layout.setSpacing(16)
+        
         # 添加文件选择区域
         self.fileGroup = QWidget(self.content_widget)
         self.fileLayout = QVBoxLayout(self.fileGroup)
@@ -135,6 +176,11 @@ class AddTaskDialog(QDialog):
         self.selectFileButton.clicked.connect(self.selectFile)
         self.fileButtonLayout.addWidget(self.selectFileButton)
         
+        self.selectFolderButton = PushButton("选择文件夹", self.fileGroup)
+        self.selectFolderButton.setIcon(FIF.FOLDER_ADD)
+        self.selectFolderButton.clicked.connect(self.selectFolder)
+        self.fileButtonLayout.addWidget(self.selectFolderButton)
+        
         self.fileButtonLayout.addStretch()
         self.fileLayout.addLayout(self.fileButtonLayout)
         
@@ -143,7 +189,13 @@ class AddTaskDialog(QDialog):
         self.filePathLabel.setWordWrap(True)
         self.fileLayout.addWidget(self.filePathLabel)
         
-        self.content_layout.addWidget(self.fileGroup)
+        # 音视频文件信息显示
+        self.mediaInfoLabel = QLabel(self.fileGroup)
+        self.mediaInfoLabel.setWordWrap(True)
+        self.mediaInfoLabel.setVisible(False)
+        self.fileLayout.addWidget(self.mediaInfoLabel)
+        
+        self.options_layout.addWidget(self.fileGroup)
         
         # 添加格式选择区域
         self.formatGroup = QWidget(self.content_widget)
@@ -159,7 +211,85 @@ class AddTaskDialog(QDialog):
         self.formatComboBox.setEnabled(False)
         self.formatLayout.addWidget(self.formatComboBox)
         
-        self.content_layout.addWidget(self.formatGroup)
+        # 音视频编码预设
+        self.profileWidget = QWidget(self.formatGroup)
+        self.profileLayout = QHBoxLayout(self.profileWidget)
+        self.profileLayout.setContentsMargins(0, 0, 0, 0)
+        self.profileLayout.addWidget(QLabel("编码预设", self.profileWidget))
+        self.profileComboBox = ComboBox(self.profileWidget)
+        for profile in ENCODING_PROFILES.values():
+            self.profileComboBox.addItem(profile.label, userData=profile.name)
+        self.profileComboBox.setCurrentIndex(list(ENCODING_PROFILES).index(DEFAULT_PROFILE))
+        self.profileLayout.addWidget(self.profileComboBox, 1)
+        self.profileWidget.setVisible(False)
+        self.formatLayout.addWidget(self.profileWidget)
+        
+        # 图片输出尺寸
+        self.imageSizeWidget = QWidget(self.formatGroup)
+        self.imageSizeLayout = QHBoxLayout(self.imageSizeWidget)
+        self.imageSizeLayout.setContentsMargins(0, 0, 0, 0)
+        self.imageSizeLayout.addWidget(QLabel("输出尺寸", self.imageSizeWidget))
+        self.imageSizeComboBox = ComboBox(self.imageSizeWidget)
+        self.imageSizeComboBox.addItem("原始尺寸", userData=0)
+        for edge in IMAGE_SIZE_PRESETS:
+            self.imageSizeComboBox.addItem(f"最长边 {edge} 像素", userData=edge)
+        self.imageSizeLayout.addWidget(self.imageSizeComboBox, 1)
+        self.imageSizeWidget.setVisible(False)
+        self.formatLayout.addWidget(self.imageSizeWidget)
+        
+        # 图片多尺寸输出，每个勾选的尺寸一个文件；ICO 目标为文件中包含的图标尺寸
+        self.imageSizesWidget = QWidget(self.formatGroup)
+        self.imageSizesLayout = QVBoxLayout(self.imageSizesWidget)
+        self.imageSizesLayout.setContentsMargins(0, 0, 0, 0)
+        self.imageSizesLayout.setSpacing(4)
+        self.imageSizesLabel = QLabel(self.imageSizesWidget)
+        self.imageSizesLayout.addWidget(self.imageSizesLabel)
+        self.imageSizesFlow = QWidget(self.imageSizesWidget)
+        self.imageSizesFlowLayout = FlowLayout(self.imageSizesFlow)
+        self.imageSizesFlowLayout.setContentsMargins(0, 0, 0, 0)
+        self.imageSizesLayout.addWidget(self.imageSizesFlow)
+        self.imageSizeCheckBoxes = []
+        self.imageSizesEdges = ()
+        self.imageSizesWidget.setVisible(False)
+        self.formatLayout.addWidget(self.imageSizesWidget)
+        
+        # 图片编码预设
+        self.imageProfileWidget = QWidget(self.formatGroup)
+        self.imageProfileLayout = QHBoxLayout(self.imageProfileWidget)
+        self.imageProfileLayout.setContentsMargins(0, 0, 0, 0)
+        self.imageProfileLayout.addWidget(QLabel("编码偏好", self.imageProfileWidget))
+        self.imageProfileComboBox = ComboBox(self.imageProfileWidget)
+        for name, label in IMAGE_PROFILES.items():
+            self.imageProfileComboBox.addItem(label, userData=name)
+        self.imageProfileLayout.addWidget(self.imageProfileComboBox, 1)
+        self.imageProfileWidget.setVisible(False)
+        self.formatLayout.addWidget(self.imageProfileWidget)
+        
+        # 图片元数据
+        self.stripMetadataCheckBox = CheckBox("移除元数据（EXIF、ICC）", self.formatGroup)
+        self.stripMetadataCheckBox.setVisible(False)
+        self.formatLayout.addWidget(self.stripMetadataCheckBox)
+        
+        # 视频编码选项
+        self.segmentedCheckBox = CheckBox("分段并行编码（适合较长的视频）", self.formatGroup)
+        self.segmentedCheckBox.setVisible(False)
+        self.formatLayout.addWidget(self.segmentedCheckBox)
+        
+        # 同时输出的其他格式，源文件只解码一次
+        self.extraFormatsWidget = QWidget(self.formatGroup)
+        self.extraFormatsLayout = QVBoxLayout(self.extraFormatsWidget)
+        self.extraFormatsLayout.setContentsMargins(0, 0, 0, 0)
+        self.extraFormatsLayout.setSpacing(4)
+        self.extraFormatsLayout.addWidget(QLabel("同时输出", self.extraFormatsWidget))
+        self.extraFormatsFlow = QWidget(self.extraFormatsWidget)
+        self.extraFormatsFlowLayout = FlowLayout(self.extraFormatsFlow)
+        self.extraFormatsFlowLayout.setContentsMargins(0, 0, 0, 0)
+        self.extraFormatsLayout.addWidget(self.extraFormatsFlow)
+        self.extraFormatCheckBoxes = []
+        self.extraFormatsWidget.setVisible(False)
+        self.formatLayout.addWidget(self.extraFormatsWidget)
+        
+        self.options_layout.addWidget(self.formatGroup)
         
         # 添加保存位置选择区域
         self.saveGroup = QWidget(self.content_widget)
@@ -195,8 +325,25 @@ class AddTaskDialog(QDialog):
         self.browseButton.setEnabled(False)
         self.customLocationLayout.addWidget(self.browseButton)
         
+        # 批量任务时在自定义位置下还原源目录结构
+        self.mirrorTreeCheckBox = CheckBox("保留目录结构", self.customLocationWidget)
+        self.mirrorTreeCheckBox.setChecked(True)
+        self.mirrorTreeCheckBox.setEnabled(False)
+        self.mirrorTreeCheckBox.setVisible(False)
+        self.customLocationLayout.addWidget(self.mirrorTreeCheckBox)
+        self.customLocationLayout.addStretch()
+        
         self.saveButtonLayout.addWidget(self.customLocationWidget)
         
+        # 增量转换：输出已是最新时跳过
+        self.incrementalCheckBox = CheckBox("跳过已是最新的输出（增量转换）", self.saveGroup)
+        self.saveButtonLayout.addWidget(self.incrementalCheckBox)
+        
+        # 选择单个文件夹时可持续监视，新放入的文件自动转换
+        self.watchFolderCheckBox = CheckBox("持续监视该文件夹，自动转换新放入的文件", self.saveGroup)
+        self.watchFolderCheckBox.setVisible(False)
+        self.saveButtonLayout.addWidget(self.watchFolderCheckBox)
+        
         self.saveLayout.addLayout(self.saveButtonLayout)
         
         # 保存路径显示
@@ -204,9 +351,11 @@ class AddTaskDialog(QDialog):
         self.savePathLabel.setWordWrap(True)
         self.saveLayout.addWidget(self.savePathLabel)
         
-        self.content_layout.addWidget(self.saveGroup)
+        self.options_layout.addWidget(self.saveGroup)
         
-        self.content_layout.addStretch()
+        self.options_layout.addStretch()
+        self.optionsScrollArea.setWidget(self.optionsWidget)
+        self.content_layout.addWidget(self.optionsScrollArea, 1)
         
         # 添加底部按钮
         self.buttonLayout = QHBoxLayout()
@@ -234,6 +383,7 @@ class AddTaskDialog(QDialog):
         self.sameAsSourceButton.toggled.connect(self._on_save_location_changed)
         self.customLocationButton.toggled.connect(self._on_save_location_changed)
         self.formatComboBox.currentTextChanged.connect(self.updateConfirmButton)
+        self.formatComboBox.currentTextChanged.connect(self.updateOptionWidgets)
         self.confirmButton.clicked.disconnect()  # 断开之前的连接
         self.confirmButton.clicked.connect(self.createTask)
         
@@ -365,27 +515,47 @@ class AddTaskDialog(QDialog):
         self._fadeOutAndClose('reject')
         
     def selectFile(self):
-        """选择源文件"""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """选择源文件，可多选"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
             "选择文件",
             os.path.expanduser("~"),
             "所有文件 (*.*)"
         )
         
-        if file_path:
-            self.setSourceFile(file_path)
+        if len(file_paths) == 1:
+            self.setSourceFile(file_paths[0])
+        elif file_paths:
+            self.setSourcePaths(file_paths)
+            
+    def selectFolder(self):
+        """选择源文件夹"""
+        dir_path = QFileDialog.getExistingDirectory(
+            self,
+            "选择文件夹",
+            os.path.expanduser("~")
+        )
+        
+        if dir_path:
+            self.setSourcePaths([dir_path])
             
     def setSourceFile(self, file_path):
-        """设置源文件"""
+        """设置源文件，文件夹按批量任务处理"""
+        if os.path.isdir(file_path):
+            self.setSourcePaths([file_path])
+            return
         if not os.path.isfile(file_path):
             return
             
         self.source_file = file_path
+        self.source_paths = []
+        self.mirrorTreeCheckBox.setVisible(False)
+        self.watchFolderCheckBox.setVisible(False)
         self.filePathLabel.setText(file_path)
         
         # 更新格式选择
         ext = os.path.splitext(file_path)[1][1:]
+        self.probeMediaInfo(file_path, ext)
         format_groups = get_target_formats(ext)
         
         if format_groups:
@@ -414,14 +584,70 @@ class AddTaskDialog(QDialog):
             self.formatComboBox.setEnabled(False)
             self.confirmButton.setEnabled(False)
             
+    def probeMediaInfo(self, file_path, ext):
+        """音视频文件在后台读取时长、分辨率等信息，转换时直接使用缓存的结果"""
+        self.mediaInfoLabel.setVisible(False)
+        if ext.lower() not in VIDEO_FORMATS and ext.lower() not in AUDIO_FORMATS:
+            return
+        self.mediaInfoLabel.setText("正在读取媒体信息...")
+        self.mediaInfoLabel.setVisible(True)
+        self.probeThread = MediaProbeThread(file_path, self)
+        self.probeThread.probed.connect(self._onMediaProbed)
+        self.probeThread.finished.connect(self.probeThread.deleteLater)
+        self.probeThread.start()
+        
+    def _onMediaProbed(self, file_path, summary):
+        # 读取期间换了源文件时忽略旧结果
+        if file_path != self.source_file:
+            return
+        self.mediaInfoLabel.setText(summary or "无法读取媒体信息")
+        
+    def setSourcePaths(self, paths):
+        """设置多个源文件或文件夹，文件夹在确认后于后台递归枚举"""
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return
+        if len(paths) == 1 and os.path.isfile(paths[0]):
+            self.setSourceFile(paths[0])
+            return
+            
+        self.source_file = None
+        self.source_paths = paths
+        folder_count = sum(1 for path in paths if os.path.isdir(path))
+        file_count = len(paths) - folder_count
+        self.filePathLabel.setText(
+            f"已选择 {file_count} 个文件、{folder_count} 个文件夹，"
+            f"将转换其中所有可转换为目标格式的文件"
+        )
+        self.mirrorTreeCheckBox.setVisible(True)
+        self.watchFolderCheckBox.setVisible(len(paths) == 1 and os.path.isdir(paths[0]))
+        self.mediaInfoLabel.setVisible(False)
+        
+        # 批量任务的源格式未知，列出所有目标格式
+        self.formatComboBox.clear()
+        for category, formats in get_all_target_formats().items():
+            self.formatComboBox.addItem(f"---{category}---")
+            for fmt in formats:
+                self.formatComboBox.addItem(fmt.upper())
+        self.formatComboBox.setEnabled(True)
+        
+        if self.sameAsSourceButton.isChecked():
+            self.savePathLabel.setText("与各源文件相同")
+        self.updateConfirmButton()
+            
     def _on_save_location_changed(self, checked):
         """保存位置选项改变时的处理"""
+        self.mirrorTreeCheckBox.setEnabled(self.customLocationButton.isChecked())
         if self.sameAsSourceButton.isChecked():
             self.browseButton.setEnabled(False)
             if self.source_file:
                 self.useSameLocation()
+            elif self.source_paths:
+                self.savePathLabel.setText("与各源文件相同")
         else:
             self.browseButton.setEnabled(True)
+            if self.savePathLabel.text() == "与各源文件相同":
+                self.savePathLabel.setText("")
             if not self.savePathLabel.text():
                 self.savePathLabel.setText("请选择保存位置")
         
@@ -450,21 +676,113 @@ class AddTaskDialog(QDialog):
             
     def updateConfirmButton(self):
         """更新确认按钮状态"""
+        has_source = bool(self.source_file) or bool(self.source_paths)
         has_save_path = (
-            (self.sameAsSourceButton.isChecked() and self.source_file) or
+            (self.sameAsSourceButton.isChecked() and has_source) or
             (self.customLocationButton.isChecked() and self.savePathLabel.text() != "请选择保存位置")
         )
         
         self.confirmButton.setEnabled(
-            bool(self.source_file) and
+            has_source and
             bool(self.formatComboBox.currentText()) and
             has_save_path and
             not self.formatComboBox.currentText().startswith('---')
         ) 
         
+    def updateOptionWidgets(self):
+        """根据目标格式显示对应的转换选项"""
+        target_category = get_format_category(self.formatComboBox.currentText())
+        self.segmentedCheckBox.setVisible(target_category == 'video')
+        self.profileWidget.setVisible(target_category in ('video', 'audio'))
+        self.imageSizeWidget.setVisible(target_category == 'image')
+        self.imageProfileWidget.setVisible(target_category == 'image')
+        self.stripMetadataCheckBox.setVisible(target_category == 'image')
+        self.updateImageSizes()
+        self.updateExtraFormats()
+        
+    def updateImageSizes(self):
+        """图片目标列出多尺寸输出的边长，ICO 目标列出图标尺寸并默认全部勾选"""
+        target_format = self.formatComboBox.currentText().lower()
+        if get_format_category(target_format) != 'image':
+            self.imageSizesWidget.setVisible(False)
+            return
+        edges = ICO_SIZES if target_format == 'ico' else IMAGE_SIZE_PRESETS
+        self.imageSizesWidget.setVisible(True)
+        if edges == self.imageSizesEdges:
+            return
+        self.imageSizesEdges = edges
+        for box in self.imageSizeCheckBoxes:
+            self.imageSizesFlowLayout.removeWidget(box)
+            box.deleteLater()
+        self.imageSizeCheckBoxes = []
+        self.imageSizesLabel.setText("图标尺寸" if target_format == 'ico' else "多尺寸输出（每个尺寸一个文件）")
+        for edge in edges:
+            box = CheckBox(str(edge), self.imageSizesFlow)
+            box.setChecked(target_format == 'ico')
+            self.imageSizesFlowLayout.addWidget(box)
+            self.imageSizeCheckBoxes.append(box)
+        
+    def getImageSizes(self) -> list:
+        """勾选的多尺寸输出边长"""
+        if self.imageSizesWidget.isHidden():
+            return []
+        return [int(box.text()) for box in self.imageSizeCheckBoxes if box.isChecked()]
+        
+    def updateExtraFormats(self):
+        """单个源文件时列出可同时输出的其他格式：音视频源文件为其他音视频格式，图片为其他图片格式"""
+        checked = {box.text().lower() for box in self.extraFormatCheckBoxes if box.isChecked()}
+        for box in self.extraFormatCheckBoxes:
+            self.extraFormatsFlowLayout.removeWidget(box)
+            box.deleteLater()
+        self.extraFormatCheckBoxes = []
+        
+        target_format = self.formatComboBox.currentText().lower()
+        target_category = get_format_category(target_format)
+        group = ('image',) if target_category == 'image' else ('video', 'audio')
+        formats = []
+        if self.source_file and target_category in ('video', 'audio', 'image'):
+            ext = os.path.splitext(self.source_file)[1][1:]
+            for category, format_list in get_target_formats(ext).items():
+                formats += [fmt for fmt in format_list
+                            if fmt != target_format and get_format_category(fmt) in group]
+        for fmt in formats:
+            box = CheckBox(fmt.upper(), self.extraFormatsFlow)
+            box.setChecked(fmt in checked)
+            self.extraFormatsFlowLayout.addWidget(box)
+            self.extraFormatCheckBoxes.append(box)
+        self.extraFormatsWidget.setVisible(bool(formats))
+        
+    def getExtraFormats(self) -> list:
+        """勾选的同时输出格式"""
+        if self.extraFormatsWidget.isHidden():
+            return []
+        return [box.text().lower() for box in self.extraFormatCheckBoxes if box.isChecked()]
+        
+    def getOptions(self) -> dict:
+        """获取转换选项"""
+        options = {}
+        target_category = get_format_category(self.formatComboBox.currentText())
+        if target_category == 'video' and self.segmentedCheckBox.isChecked():
+            options['segmented'] = True
+        if target_category in ('video', 'audio'):
+            options['profile'] = self.profileComboBox.currentData()
+        if target_category == 'image' and self.imageSizeComboBox.currentData():
+            options['max_size'] = self.imageSizeComboBox.currentData()
+        if target_category == 'image':
+            if self.imageProfileComboBox.currentData() != DEFAULT_IMAGE_PROFILE:
+                options['image_profile'] = self.imageProfileComboBox.currentData()
+            if self.stripMetadataCheckBox.isChecked():
+                options['strip_metadata'] = True
+            sizes = self.getImageSizes()
+            if sizes:
+                options['sizes'] = sizes
+        if self.incrementalCheckBox.isChecked():
+            options['incremental'] = True
+        return options
+        
     def createTask(self):
         """创建转换任务"""
-        if not self.source_file:
+        if not self.source_file and not self.source_paths:
             return
             
         # 获取目标格式
@@ -472,6 +790,24 @@ class AddTaskDialog(QDialog):
         if not target_format or target_format.startswith('---'):
             return
             
+        # 批量任务交给任务列表在后台枚举文件
+        if self.source_paths:
+            output_root = ''
+            if self.customLocationButton.isChecked():
+                output_root = self.savePathLabel.text()
+                if not output_root or output_root == "请选择保存位置":
+                    return
+            mirror_tree = bool(output_root) and self.mirrorTreeCheckBox.isChecked()
+            if not self.watchFolderCheckBox.isHidden() and self.watchFolderCheckBox.isChecked():
+                # 监视模式下已有的文件也由监视器在稳定后加入队列
+                self.watchCreated.emit(self.source_paths[0], target_format, output_root,
+                                       mirror_tree, self.getOptions())
+            else:
+                self.batchCreated.emit(self.source_paths, target_format, output_root,
+                                       mirror_tree, self.getOptions())
+            self.accept()
+            return
+            
         # 获取保存路径
         if self.sameAsSourceButton.isChecked():
             save_dir = os.path.dirname(self.source_file)
@@ -484,8 +820,13 @@ class AddTaskDialog(QDialog):
         source_name = os.path.splitext(os.path.basename(self.source_file))[0]
         self.target_file = os.path.join(save_dir, f"{source_name}.{target_format}")
         
+        options = self.getOptions()
+        extra_formats = self.getExtraFormats()
+        if extra_formats:
+            options['extra_targets'] = [os.path.join(save_dir, f"{source_name}.{fmt}") for fmt in extra_formats]
+        
         # 发送信号
-        self.taskCreated.emit(self.source_file, self.target_file)
+        self.taskCreated.emit(self.source_file, self.target_file, options)
         
         # 关闭对话框
         self.accept() 
@@ -150,13 +150,23 @@ class MainWindow(FluentWindow):
             
     def dropEvent(self, event):
         files = [url.toLocalFile() for url in event.mimeData().urls()]
+        files = [file for file in files if file]
         if files:
             dialog = AddTaskDialog(parent=self)
             dialog.resize(self.size())
-            dialog.setSourceFile(files[0])
-            dialog.taskCreated.connect(self.taskInterface.addConvertTask)
+            # 单个文件沿用原有流程，多个文件或文件夹按批量任务处理
+            if len(files) == 1:
+                dialog.setSourceFile(files[0])
+            else:
+                dialog.setSourcePaths(files)
+            self.taskInterface.connectAddTaskDialog(dialog)
             dialog.exec()
 
+    def closeEvent(self, event):
+        """关闭窗口时保存任务日志并停止所有任务"""
+        self.taskInterface.shutdown()
+        super().closeEvent(event)
+
     def init_theme_settings(self):
         """初始化主题设置"""
         # 创建主题选择下拉框
@@ -8,7 +8,7 @@ from qfluentwidgets import isDarkTheme
 from qfluentwidgets.common.config import (ConfigItem, QConfig, 
                                         OptionsConfigItem, OptionsValidator)
 
-from ..common.config_manager import ThemeMode, config_manager
+from ..common.config_manager import ThemeMode, config_manager, CACHE_SIZE_OPTIONS, LOG_LEVEL_OPTIONS
 from ..common.theme_helper import set_theme_mode
 from ..common.autostart_manager import autostart_manager
 from app.view.ffmpeg_installer import FFmpegInstaller
@@ -286,6 +286,26 @@ class SettingInterface(ScrollArea):
             parent=self.scrollWidget
         )
         
+        # 转换结果缓存大小
+        self.cacheSizeCard = ComboBoxSettingCard(
+            configItem=config_manager.cache_size,
+            icon=FIF.SAVE,
+            title='转换结果缓存',
+            content='相同文件以相同设置再次转换时直接复用结果，下次启动时生效',
+            texts=list(CACHE_SIZE_OPTIONS.values()),
+            parent=self.scrollWidget
+        )
+        
+        # 日志级别
+        self.logLevelCard = ComboBoxSettingCard(
+            configItem=config_manager.log_level,
+            icon=FIF.DEVELOPER_TOOLS,
+            title='日志级别',
+            content='记录到日志的最低级别，环境变量 GSGC_LOG_LEVEL 会在启动时覆盖该设置',
+            texts=list(LOG_LEVEL_OPTIONS.values()),
+            parent=self.scrollWidget
+        )
+        
         # 检测FFmpeg按钮
         self.checkFFmpegCard = PushSettingCard(
             text="检测",
@@ -321,6 +341,8 @@ class SettingInterface(ScrollArea):
         # 基本设置组
         self.basicGroup = SettingCardGroup(self.tr('基本设置'), self.scrollWidget)
         self.basicGroup.addSettingCard(self.autostartCard)
+        self.basicGroup.addSettingCard(self.cacheSizeCard)
+        self.basicGroup.addSettingCard(self.logLevelCard)
         self.basicGroup.addSettingCard(self.checkFFmpegCard)
         self.basicGroup.addSettingCard(self.uninstallFFmpegCard)
         
@@ -333,6 +355,7 @@ class SettingInterface(ScrollArea):
         # 连接信号
         self.themeCard.comboBox.currentIndexChanged.connect(self.onThemeModeChanged)
         self.autostartCard.switchButton.checkedChanged.connect(self.onAutostartChanged)
+        self.logLevelCard.comboBox.currentIndexChanged.connect(self.onLogLevelChanged)
         self.checkFFmpegCard.button.clicked.connect(self.onCheckFFmpegClicked)
         self.uninstallFFmpegCard.button.clicked.connect(self.onUninstallFFmpegClicked)
         
@@ -351,6 +374,10 @@ class SettingInterface(ScrollArea):
         theme_modes = [ThemeMode.LIGHT, ThemeMode.DARK, ThemeMode.SYSTEM]
         set_theme_mode(theme_modes[index])
         
+    def onLogLevelChanged(self, index):
+        """ 日志级别改变的处理函数 """
+        config_manager.set_log_level(list(LOG_LEVEL_OPTIONS)[index])
+        
     def onAutostartChanged(self, checked):
         """ 开机自启设置改变的处理函数 """
         try:
@@ -1,65 +1,121 @@
 import os
+import logging
+from collections import deque
 from PySide6.QtWidgets import (QWidget, QFrame, QHBoxLayout, QVBoxLayout, 
                           QSpacerItem, QSizePolicy, QLabel, QMainWindow)
-from PySide6.QtCore import Qt, Signal, QThread
+from PySide6.QtCore import Qt, Signal, QObject, QThread, QTimer
 from qfluentwidgets import (FluentIcon as FIF,
                           ScrollArea, ProgressBar,
                           PushButton, InfoBar,
                           InfoBarPosition, ExpandLayout,
-                          BodyLabel, isDarkTheme)
+                          BodyLabel, isDarkTheme,
+                          MessageBoxBase, SubtitleLabel, PlainTextEdit)
 
-from ..core.converter import FormatConverter
+from ..core.scheduler import ConvertJob, JobScheduler, JobState
+from ..core.image_pool import ImageProcessPool
+from ..core.job_journal import JobJournal
+from ..core.result_cache import ResultCache
+from ..core.file_scanner import get_convertible_extensions, iter_source_files, build_target_path
+from ..common.progress_hub import ProgressHub
+from ..common.config_manager import config_manager
+from ..common.hot_folder_watcher import HotFolderWatcher
 from .add_task_interface import AddTaskDialog
 
 
-class ConvertTask(QThread):
-    progressUpdated = Signal(int)
-    completed = Signal()
-    error = Signal(str)
+# 任务状态显示文本
+JOB_STATE_TEXT = {
+    JobState.QUEUED.value: "排队中",
+    JobState.RUNNING.value: "转换中",
+    JobState.DONE.value: "已完成",
+    JobState.FAILED.value: "失败",
+    JobState.CANCELLED.value: "已取消",
+    JobState.SKIPPED.value: "已是最新",
+}
+
+# 每个定时器间隔最多创建的任务卡片数，以及同时存在的卡片数上限；
+# 超过上限时移除最早的成功完成的卡片，失败的卡片保留
+CARD_BATCH_SIZE = 20
+MAX_TASK_CARDS = 200
+
+
+class JobObserver(QObject):
+    """ 将工作线程中的任务状态回调转发为 Qt 信号，进度由 ProgressHub 批量发送 """
+    stateChanged = Signal(str)
+
+    def __init__(self, job: ConvertJob, parent=None):
+        super().__init__(parent)
+        self.job = job
+        job.add_state_listener(lambda _job: self.stateChanged.emit(_job.state.value))
+
+
+class FileScanThread(QThread):
+    """ 在后台递归枚举拖入的文件和文件夹，分批发出找到的 (源文件, 目标文件) """
+    filesFound = Signal(list)
+    
+    BATCH_SIZE = 100
     
-    def __init__(self, source_file, target_file):
-        super().__init__()
-        self.source_file = source_file
-        self.target_file = target_file
+    def __init__(self, paths, target_format, output_root='', mirror_tree=False, parent=None):
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.target_format = target_format
+        self.output_root = output_root
+        self.mirror_tree = mirror_tree
         self.is_cancelled = False
-        self.converter = FormatConverter()
         
     def run(self):
-        try:
-            # 执行转换
-            success = self.converter.convert(
-                self.source_file,
-                self.target_file,
-                self.progressUpdated.emit
+        extensions = get_convertible_extensions(self.target_format)
+        batch = []
+        for source_file, relative_path in iter_source_files(
+                self.paths, extensions, lambda: self.is_cancelled):
+            target_file = build_target_path(
+                source_file, relative_path, self.target_format,
+                self.output_root, self.mirror_tree
             )
-            
-            if success and not self.is_cancelled:
-                self.completed.emit()
-            elif not success and not self.is_cancelled:
-                self.error.emit("转换失败")
-                
-        except Exception as e:
-            if not self.is_cancelled:
-                self.error.emit(str(e))
+            batch.append((source_file, target_file))
+            if len(batch) >= self.BATCH_SIZE:
+                self.filesFound.emit(batch)
+                batch = []
+        if batch and not self.is_cancelled:
+            self.filesFound.emit(batch)
             
     def cancel(self):
         self.is_cancelled = True
-        self.converter.is_cancelled = True
+
+
+class JobLogDialog(MessageBoxBase):
+    """ 任务详情对话框，打开时才格式化任务日志 """
+
+    def __init__(self, job: ConvertJob, parent=None):
+        super().__init__(parent)
+        self.titleLabel = SubtitleLabel("任务详情", self)
+        self.logEdit = PlainTextEdit(self)
+        self.logEdit.setReadOnly(True)
+        text = job.log.format() or "暂无日志"
+        if job.error:
+            text = f"错误: {job.error}\n\n{text}"
+        self.logEdit.setPlainText(text)
+        self.logEdit.setMinimumSize(560, 320)
+        self.viewLayout.addWidget(self.titleLabel)
+        self.viewLayout.addWidget(self.logEdit)
+        self.yesButton.setText("关闭")
+        self.cancelButton.hide()
 
 
 class TaskCard(QWidget):
-    def __init__(self, source_file, target_file, parent=None):
+    def __init__(self, job: ConvertJob, scheduler: JobScheduler, parent=None):
         super().__init__(parent)
-        self.source_file = source_file
-        self.target_file = target_file
+        self.job = job
+        self.scheduler = scheduler
+        self.source_file = job.source_file
+        self.target_file = job.target_file
         
-        # 创建转换任务
-        self.task = ConvertTask(source_file, target_file)
-        self.task.progressUpdated.connect(self.updateProgress)
-        self.task.completed.connect(self.onCompleted)
-        self.task.error.connect(self.onError)
+        # 观察调度器中的任务状态
+        self.observer = JobObserver(job, self)
+        self.observer.stateChanged.connect(self.onStateChanged)
         
         self.initUI()
+        # 卡片可能在任务开始甚至结束后才创建
+        self.showState(self.job.state.value)
         
     def initUI(self):
         layout = QVBoxLayout(self)
@@ -78,35 +134,71 @@ class TaskCard(QWidget):
         infoLayout.addWidget(arrowLabel)
         
         # 目标文件名
-        targetLabel = QLabel(os.path.basename(self.target_file))
+        targetName = os.path.basename(self.target_file)
+        if len(self.job.targets) > 1:
+            targetName += f" 等 {len(self.job.targets)} 个"
+        targetLabel = QLabel(targetName)
         infoLayout.addWidget(targetLabel)
         
         infoLayout.addStretch()
         
+        # 任务状态
+        self.stateLabel = QLabel(JOB_STATE_TEXT[self.job.state.value])
+        infoLayout.addWidget(self.stateLabel)
+        
         # 取消按钮
         self.cancelButton = PushButton("取消", self)
         self.cancelButton.setIcon(FIF.CANCEL)
         self.cancelButton.clicked.connect(self.cancelTask)
         infoLayout.addWidget(self.cancelButton)
         
+        # 详情按钮
+        self.detailButton = PushButton("详情", self)
+        self.detailButton.setIcon(FIF.INFO)
+        self.detailButton.clicked.connect(self.showDetails)
+        infoLayout.addWidget(self.detailButton)
+        
         layout.addLayout(infoLayout)
         
         # 进度条
         self.progressBar = ProgressBar(self)
-        self.progressBar.setValue(0)
+        self.progressBar.setValue(self.job.progress)
         layout.addWidget(self.progressBar)
         
-        # 开始转换
-        self.task.start()
-        
     def updateProgress(self, value):
-        self.progressBar.setValue(value)
+        if value != self.progressBar.value():
+            self.progressBar.setValue(value)
+        # ffmpeg 任务在状态后显示编码速度
+        speed = self.job.stats.get('speed')
+        if speed and self.job.state == JobState.RUNNING:
+            self.stateLabel.setText(f"{JOB_STATE_TEXT[JobState.RUNNING.value]} {speed:.2f}x")
+        
+    def showState(self, state: str):
+        """按任务状态更新标签、进度条和按钮，不弹出提示"""
+        self.stateLabel.setText(JOB_STATE_TEXT[state])
+        if state == JobState.DONE.value and self.job.cached:
+            self.stateLabel.setText("已完成（缓存）")
+        if state in (JobState.DONE.value, JobState.SKIPPED.value):
+            self.progressBar.setValue(100)
+            self.cancelButton.setText("完成")
+            self.cancelButton.setIcon(FIF.COMPLETED)
+            self.cancelButton.setEnabled(False)
+        elif state == JobState.FAILED.value:
+            self.cancelButton.setText("失败")
+            self.cancelButton.setEnabled(False)
+        elif state == JobState.CANCELLED.value:
+            self.cancelButton.setText("已取消")
+            self.cancelButton.setEnabled(False)
+        
+    def onStateChanged(self, state: str):
+        """任务状态变化，增量模式下输出已是最新的任务不逐个弹出提示"""
+        self.showState(state)
+        if state == JobState.DONE.value:
+            self.onCompleted()
+        elif state == JobState.FAILED.value:
+            self.onError(self.job.error)
         
     def onCompleted(self):
-        self.progressBar.setValue(100)
-        self.cancelButton.setText("完成")
-        self.cancelButton.setIcon(FIF.COMPLETED)
-        self.cancelButton.setEnabled(False)
         InfoBar.success(
             title='转换完成',
             content=f"文件已保存到: {self.target_file}",
@@ -129,8 +221,12 @@ class TaskCard(QWidget):
             parent=self
         )
         
+    def showDetails(self):
+        """显示任务日志"""
+        JobLogDialog(self.job, self.window()).exec()
+        
     def cancelTask(self):
-        self.task.cancel()
+        self.scheduler.cancel(self.job)
         self.cancelButton.setText("已取消")
         self.cancelButton.setEnabled(False)
         InfoBar.warning(
@@ -150,6 +246,37 @@ class TaskInterface(ScrollArea):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setObjectName("taskInterface")
+        
+        # 正在枚举文件的后台线程
+        self.scanThreads = []
+        
+        # 正在监视的文件夹
+        self.hotFolderWatchers = []
+        
+        # 任务日志，程序关闭或崩溃后可恢复未完成的任务
+        self.journal = JobJournal()
+        
+        # 进度由 ProgressHub 汇总，每帧最多刷新一次界面
+        self.taskCards = {}
+        
+        # 任务提交后立即进入调度器，卡片由定时器分批创建，大量文件同时加入时界面不会卡住
+        self.pendingCardJobs = deque()
+        # 没有显示卡片（卡片创建前已完成或已被移除）的成功任务数
+        self.hiddenFinishedCount = 0
+        self.cardTimer = QTimer(self)
+        self.cardTimer.setInterval(30)
+        self.cardTimer.timeout.connect(self._createPendingCards)
+        self.progressHub = ProgressHub(parent=self)
+        self.progressHub.progressBatch.connect(self._onProgressBatch)
+        
+        # 转换结果缓存，相同的源文件以相同设置再次转换时直接复用结果
+        cache_size = config_manager.get_cache_size()
+        self.cache = ResultCache(max_size_mb=cache_size) if cache_size else None
+        
+        # 所有转换任务共享同一个调度器，按资源类别分别限制并发数，
+        # 图片任务分块交给子进程池执行
+        self.scheduler = JobScheduler(image_pool=ImageProcessPool(), journal=self.journal, cache=self.cache)
+        
         self.scrollWidget = QWidget()
         self.scrollWidget.setObjectName("scrollWidget")
         self.vBoxLayout = QVBoxLayout(self.scrollWidget)
@@ -182,6 +309,13 @@ class TaskInterface(ScrollArea):
         self.addTaskButton.clicked.connect(self.showAddTaskDialog)
         self.titleButtonLayout.addWidget(self.addTaskButton)
         
+        # 停止监视文件夹按钮，有监视中的文件夹时显示
+        self.stopWatchButton = PushButton("停止监视", self)
+        self.stopWatchButton.setIcon(FIF.CLOSE)
+        self.stopWatchButton.clicked.connect(self.stopWatching)
+        self.stopWatchButton.setVisible(False)
+        self.titleButtonLayout.addWidget(self.stopWatchButton)
+        
         self.titleButtonLayout.addStretch()
         self.headerLayout.addLayout(self.titleButtonLayout)
         
@@ -190,6 +324,11 @@ class TaskInterface(ScrollArea):
             "在这里管理您的转换任务。您可以添加、删除和查看任务的进度。", self)
         self.headerLayout.addWidget(self.descriptionLabel)
         
+        # 未显示卡片的任务数
+        self.pendingCardsLabel = BodyLabel(self)
+        self.pendingCardsLabel.setVisible(False)
+        self.headerLayout.addWidget(self.pendingCardsLabel)
+        
         # 添加分隔线
         self.separator = QFrame(self)
         self.separator.setFrameShape(QFrame.Shape.HLine)
@@ -205,6 +344,9 @@ class TaskInterface(ScrollArea):
         # 设置样式
         self.updateStyle()
         
+        # 界面显示后再恢复上次未完成的任务
+        QTimer.singleShot(0, self.restoreUnfinishedTasks)
+        
     def updateStyle(self):
         # 设置整个页面背景色和标题
         if isDarkTheme():
@@ -232,10 +374,165 @@ class TaskInterface(ScrollArea):
         while parent and not isinstance(parent, QMainWindow):
             parent = parent.parentWidget()
         dialog = AddTaskDialog(parent=parent)
-        dialog.taskCreated.connect(self.addConvertTask)
+        self.connectAddTaskDialog(dialog)
         dialog.exec()
+
+    def connectAddTaskDialog(self, dialog: AddTaskDialog):
+        """把新建任务对话框的单个任务、批量任务和监视文件夹信号连接到本界面"""
+        dialog.taskCreated.connect(self.addConvertTask)
+        dialog.batchCreated.connect(self.addBatchTasks)
+        dialog.watchCreated.connect(self.addWatchFolder)
         
-    def addConvertTask(self, source_file, target_file):
+    def addConvertTask(self, source_file, target_file, options=None):
         """添加转换任务"""
-        task_card = TaskCard(source_file, target_file, self.scrollWidget)
-        self.vBoxLayout.addWidget(task_card) 
\ No newline at end of file
+        self.submitJob(ConvertJob(source_file, target_file, options))
+        
+    def submitJob(self, job: ConvertJob):
+        """把任务提交给调度器，卡片稍后分批创建"""
+        self.progressHub.watch(job)
+        self.scheduler.submit(job)
+        self.pendingCardJobs.append(job)
+        if not self.cardTimer.isActive():
+            self.cardTimer.start()
+        
+    def _createPendingCards(self):
+        """
+        每次最多创建 CARD_BATCH_SIZE 个卡片，卡片数达到上限时先移除最早的成功完成的卡片；
+        创建前已成功完成的任务不再创建卡片，只计入汇总
+        """
+        created = 0
+        while self.pendingCardJobs and created < CARD_BATCH_SIZE:
+            job = self.pendingCardJobs[0]
+            if job.state.is_finished and job.state != JobState.FAILED:
+                self.pendingCardJobs.popleft()
+                self.hiddenFinishedCount += 1
+                continue
+            if len(self.taskCards) >= MAX_TASK_CARDS and not self._removeFinishedCard():
+                break
+            self.pendingCardJobs.popleft()
+            task_card = TaskCard(job, self.scheduler, self.scrollWidget)
+            self.taskCards[job.job_id] = task_card
+            self.vBoxLayout.addWidget(task_card)
+            created += 1
+        if not self.pendingCardJobs:
+            self.cardTimer.stop()
+        self._updatePendingCardsLabel()
+        
+    def _updatePendingCardsLabel(self):
+        parts = []
+        if self.hiddenFinishedCount:
+            parts.append(f"已完成 {self.hiddenFinishedCount} 个任务（未逐个显示）")
+        if self.pendingCardJobs:
+            parts.append(f"另有 {len(self.pendingCardJobs)} 个任务已在队列中，稍后显示")
+        self.pendingCardsLabel.setText("；".join(parts))
+        self.pendingCardsLabel.setVisible(bool(parts))
+            
+    def _removeFinishedCard(self) -> bool:
+        for job_id, task_card in self.taskCards.items():
+            if task_card.job.state.is_finished and task_card.job.state != JobState.FAILED:
+                del self.taskCards[job_id]
+                self.vBoxLayout.removeWidget(task_card)
+                task_card.deleteLater()
+                self.hiddenFinishedCount += 1
+                return True
+        return False
+        
+    def _onProgressBatch(self, batch):
+        for job_id, value in batch.items():
+            task_card = self.taskCards.get(job_id)
+            if task_card is not None:
+                task_card.updateProgress(value)
+        
+    def restoreUnfinishedTasks(self):
+        """重新加入上次关闭或崩溃时排队中和被中断的任务，已完成的任务不再重复转换"""
+        try:
+            unfinished = self.journal.pending_jobs()
+        except Exception as e:
+            logging.error(f"读取任务日志失败: {str(e)}")
+            return
+        restored = 0
+        known_keys = {task_card.job.job_key for task_card in self.taskCards.values()}
+        known_keys.update(job.job_key for job in self.pendingCardJobs)
+        for item in unfinished:
+            # 界面显示前已经提交的任务也在日志中，不能重复加入
+            if item['job_key'] in known_keys:
+                continue
+            job = ConvertJob(item['source'], item['target'], item['options'], job_key=item['job_key'])
+            if not os.path.isfile(job.source_file):
+                # 源文件已不存在，记为失败以免每次启动都尝试恢复
+                job.state = JobState.FAILED
+                job.error = "源文件不存在"
+                self.journal.record(job)
+                continue
+            self.submitJob(job)
+            restored += 1
+        if restored:
+            InfoBar.info(
+                title='已恢复任务',
+                content=f"已重新加入 {restored} 个上次未完成的转换任务",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            
+    def shutdown(self):
+        """关闭时先停止记录任务日志，使未完成的任务在下次启动时恢复，再停止所有任务"""
+        for scan_thread in list(self.scanThreads):
+            scan_thread.cancel()
+        self.stopWatching()
+        self.journal.close()
+        self.cardTimer.stop()
+        self.progressHub.stop()
+        self.scheduler.shutdown(cancel_pending=True, wait=False)
+        
+    def addBatchTasks(self, paths, target_format, output_root='', mirror_tree=False, options=None):
+        """批量添加转换任务，文件夹在后台枚举，找到的文件边枚举边加入队列"""
+        scan_thread = FileScanThread(paths, target_format, output_root, mirror_tree, self)
+        scan_thread.filesFound.connect(lambda pairs: self._onFilesFound(pairs, options))
+        scan_thread.finished.connect(lambda: self._onScanFinished(scan_thread))
+        self.scanThreads.append(scan_thread)
+        scan_thread.start()
+        
+    def _onFilesFound(self, pairs, options=None):
+        for source_file, target_file in pairs:
+            self.addConvertTask(source_file, target_file, options)
+            
+    def addWatchFolder(self, folder, target_format, output_root='', mirror_tree=False, options=None):
+        """监视文件夹，新放入的文件写入完成后自动转换，已是最新的输出不重复转换"""
+        options = dict(options or {}, incremental=True)
+        watcher = HotFolderWatcher(folder, target_format, exclude=[output_root], parent=self)
+        watcher.filesReady.connect(
+            lambda files: self._onWatchedFiles(files, target_format, output_root, mirror_tree, options))
+        self.hotFolderWatchers.append(watcher)
+        self.stopWatchButton.setText(f"停止监视（{len(self.hotFolderWatchers)}）")
+        self.stopWatchButton.setVisible(True)
+        watcher.start()
+        InfoBar.info(
+            title='正在监视文件夹',
+            content=f"放入 {folder} 的文件将自动转换为 {target_format.upper()}",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=3000,
+            parent=self
+        )
+        
+    def _onWatchedFiles(self, files, target_format, output_root, mirror_tree, options):
+        for source_file, relative_path in files:
+            target_file = build_target_path(source_file, relative_path, target_format, output_root, mirror_tree)
+            self.addConvertTask(source_file, target_file, options)
+            
+    def stopWatching(self):
+        """停止监视所有文件夹，已加入队列的任务继续转换"""
+        for watcher in self.hotFolderWatchers:
+            watcher.stop()
+            watcher.deleteLater()
+        self.hotFolderWatchers = []
+        self.stopWatchButton.setVisible(False)
+        
+    def _onScanFinished(self, scan_thread):
+        if scan_thread in self.scanThreads:
+            self.scanThreads.remove(scan_thread)
+        scan_thread.deleteLater()
@@ -2,6 +2,7 @@ import sys
 import os
 import subprocess
 import logging
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from PySide6.QtGui import QColor
 from PySide6.QtCore import QThread, Signal, QTimer
@@ -10,12 +11,11 @@ from qfluentwidgets import MessageBox
 from app.view.main_window import MainWindow
 from app.view.ffmpeg_installer import FFmpegInstaller
 from app.common.theme_helper import apply_theme
+from app.common.config_manager import config_manager
+from app.core.job_log import configure_logging
 
-# 配置日志记录
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# 配置日志记录：环境变量 GSGC_LOG_LEVEL 优先，其次是设置中的日志级别
+configure_logging(default=config_manager.get_log_level())
 
 flags = 0
 if sys.platform == "win32":
@@ -66,6 +66,8 @@ class FFmpegCheckThread(QThread):
             self.ffmpeg_missing.emit()
 
 if __name__ == '__main__':
+    # 打包后的程序启动图片转换子进程时需要
+    multiprocessing.freeze_support()
     try:
         logging.info('应用程序启动')
         